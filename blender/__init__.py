@@ -1,9 +1,16 @@
-import bpy, os
+import bpy, os, time
 from bpy.app.handlers import persistent
-from uuid import uuid4
 
 from .build import AssetBuilder
+from .fetch import *
+from .publish import *
+from .async_publish import *
+from .tagging import *
+from .leaks import leak_tracker
+from .selection import *
+from .versioning import *
 from .layers import *
+from .utils import *
 
 bl_info = {
 	"name": "Shitgrid Pipeline",
@@ -32,25 +39,6 @@ def setup_asset_library() -> None:
 	sg_lib = prefs.filepaths.asset_libraries[-1]
 	sg_lib.name = lib_name
 
-def tag_data(data, name: str, layer: str, version: int) -> None:
-	"""
-	Tags a data block with custom data.\n
-	This is used to associate everything with an asset, layer and version.\n
-	`sg_id` is used for matching. Try to avoid duplicate IDs.\n
-	When IDs are duplicated, it links by order.
-	"""
-	old_name = data.get("sg_asset")
-	old_layer = data.get("sg_layer")
-	if not old_name:
-		# New data, set all properties
-		data["sg_asset"] = name
-		data["sg_layer"] = layer
-		data["sg_version"] = version
-		data["sg_id"] = str(uuid4())
-	elif old_name == name and old_layer == layer:
-		# Updated data, change version
-		data["sg_version"] = version
-
 class Preferences(bpy.types.AddonPreferences):
 	"""Preferences for this addon"""
 	bl_idname = __name__
@@ -62,12 +50,18 @@ class Preferences(bpy.types.AddonPreferences):
 	make_folder: bpy.props.BoolProperty(name="Make asset folder if missing", default=True)
 	# Whether to show developer options on UI
 	dev_mode: bpy.props.BoolProperty(name="Developer Mode", default=True)
+	# Threads used for proximity transfers, zero uses every core
+	workers: bpy.props.IntProperty(name="Transfer Threads", default=0, min=0, description="Threads used for proximity transfers (0 uses every core, 1 uses the single threaded search)")
+	# Whether to record data blocks and memory left behind by each layer
+	track_leaks: bpy.props.BoolProperty(name="Track Leaks", default=False, description="Report data blocks and memory left behind by each layer, slows updates down")
 
 	def draw(self, context):
 		layout = self.layout
 		layout.prop(self, "database")
 		layout.prop(self, "dev_mode")
 		layout.prop(self, "make_folder")
+		layout.prop(self, "workers")
+		layout.prop(self, "track_leaks")
 
 class Update_Item(bpy.types.PropertyGroup):
 	"""Properties for items displayed in the update list"""
@@ -82,15 +76,23 @@ class Properties(bpy.types.PropertyGroup):
 	# Publish properties
 	publish_layer: bpy.props.EnumProperty(name="Layer", items=layer_menu)
 	publish_asset: bpy.props.StringProperty(name="Asset Name")
+	publish_async: bpy.props.BoolProperty(name="Publish in Background", default=True, description="Save a local snapshot and let a background Blender copy it to the database")
+	publish_slim: bpy.props.BoolProperty(name="Slim Publish", default=False, description="Only save data blocks tagged for this asset, instead of the whole file")
 
 	# Fetch properties
 	fetch_asset: bpy.props.StringProperty(name="Asset Name")
+	fetch_link: bpy.props.BoolProperty(name="Link (Read-only)", default=False, description="Link builds instead of appending them, make objects editable when needed")
+	fetch_compare: bpy.props.BoolProperty(name="Compare with Append", default=False, description="Also append linked builds into temporary data, to report the memory and file size linking saves")
+	fetch_batch: bpy.props.StringProperty(name="Assets", description="Assets separated by commas, pin versions with @, eg. tree, rock@3")
 
 	# Update properties
 	show_update_list: bpy.props.BoolProperty(default=False)
 	update_items: bpy.props.CollectionProperty(type=Update_Item)
 	update_transform: bpy.props.BoolProperty(name="Update Transform", default=True)
 
+	# Inspect properties
+	inspect_grouped: bpy.props.BoolProperty(name="Group by Layer", default=False, description="Count blocks per asset and layer instead of listing each one")
+
 	# Developer properties
 	dev_build_layer: bpy.props.EnumProperty(name="Layer", items=layer_menu)
 	dev_build_version: bpy.props.IntProperty(name="Version", default=1)
@@ -99,6 +101,9 @@ def get_transfer_settings(props: Properties):
 	"""Builds transfer settings from UI panel properties"""
 	settings = TransferSettings()
 	settings.update_transform = props.update_transform
+	prefs = get_preferences()
+	settings.cache_folder = os.path.join(prefs.database, "cache")
+	settings.workers = prefs.workers
 	return settings
 
 class Publish_Operator(bpy.types.Operator):
@@ -131,31 +136,37 @@ class Publish_Operator(bpy.types.Operator):
 			os.umask(0)
 			os.mkdir(layer_folder)
 
-		# Up version number based on file index in subfolder
-		version = len([p for p in os.listdir(layer_folder) if p.endswith(".blend")]) + 1
-
+		# Claim the next version, other artists and builds might be publishing too
 		# Name is "asset_layer_v001.blend" for now
-		file_name = f"{props.publish_asset}_{props.publish_layer}_v{version:03d}.blend"
-		path = os.path.join(layer_folder, file_name)
+		(version, path) = reserve_version(layer_folder, f"{props.publish_asset}_{props.publish_layer}")
 
 		# I'm using custom data to associate data blocks with an asset, version and layer
-		# First tag all collections and objects which haven't already been tagged
-		root = context.scene.collection
-		for col in root.children_recursive:
-			tag_data(col, props.publish_asset, props.publish_layer, version)
-		for obj in root.all_objects:
-			tag_data(obj, props.publish_asset, props.publish_layer, version)
-
-		# Next tag sub-object data blocks
-		for data_type in layer_lookup[props.publish_layer].trigger_update:
-			for block in getattr(bpy.data, data_type):
-				tag_data(block, props.publish_asset, props.publish_layer, version)
+		# Tag all collections, objects and sub-object data blocks in one pass
+		blocks = collect_blocks(context.scene, layer_lookup[props.publish_layer].trigger_update)
+		report = tag_blocks(blocks, props.publish_asset, props.publish_layer, version)
+		print_tag_report(report)
+		selection_cache.invalidate()
+
+		data_types = layer_lookup[props.publish_layer].trigger_update
+		if props.publish_async:
+			# Copying to the database and the manifest happen in a headless Blender
+			job = start_publish(props.publish_asset, props.publish_layer, version, path, props.publish_slim, data_types)
+			self.report({"INFO"}, f"Publishing {job} in the background")
+			return {"FINISHED"}
 
 		# Save a copy in the "wip" folder, this copy should never be touched!
-		bpy.ops.wm.save_as_mainfile(filepath=path, check_existing=True, copy=True)
+		if props.publish_slim:
+			# Only the asset's data blocks, builds and updates load these
+			write_atomic(path, lambda temp_path: write_slim(temp_path, context.scene, props.publish_asset, data_types))
+			reduction = describe_reduction(os.path.getsize(path))
+		else:
+			write_atomic(path, lambda temp_path: bpy.ops.wm.save_as_mainfile(filepath=temp_path, copy=True))
+		release_version(path)
 
 		# Would be nice to add a popup for this
 		success_msg = f"Published {props.publish_asset} {props.publish_layer} version {version}!"
+		if props.publish_slim:
+			success_msg += f" {reduction}"
 		self.report({"INFO"}, success_msg)
 
 		return {"FINISHED"}
@@ -172,8 +183,34 @@ class Publish_Panel(bpy.types.Panel):
 		layout = self.layout
 		layout.prop(props, "publish_asset")
 		layout.prop(props, "publish_layer")
+		layout.prop(props, "publish_slim")
+		layout.prop(props, "publish_async")
 		layout.operator(Publish_Operator.bl_idname, icon="EXPORT")
 
+		# Background publishes
+		if not jobs:
+			return
+		box = layout.box()
+		for job in jobs:
+			row = box.row()
+			if job.error:
+				row.label(text=f"{job}: {job.stage}", icon="ERROR")
+				box.label(text=f"Snapshot kept at {job.snapshot}")
+			elif job.done:
+				row.label(text=f"{job}: {job.stage}", icon="CHECKMARK")
+			else:
+				row.label(text=f"{job}: {job.stage} ({job.progress:.0%})", icon="TIME")
+		box.operator(Clear_Publish_Jobs_Operator.bl_idname, icon="X")
+
+class Clear_Publish_Jobs_Operator(bpy.types.Operator):
+	"""Remove finished background publishes from the list"""
+	bl_idname = "pipeline.clear_publish_jobs"
+	bl_label = "Clear Finished"
+
+	def execute(self, context):
+		clear_finished()
+		return {"FINISHED"}
+
 def get_updates() -> "dict[str, list[Any]]":
 	"""Builds a list of layer updates per asset"""
 	prefs = bpy.context.preferences.addons[__name__].preferences
@@ -202,11 +239,38 @@ def get_updates() -> "dict[str, list[Any]]":
 					continue
 
 				current = block.get("sg_version")
-				latest = len([p for p in os.listdir(folder) if p.endswith(".blend")])
+				latest = latest_published(folder)
 				if latest > current and layer not in updates[asset]:
 					updates[asset].append(layer)
 	return updates
 
+def apply_updates(updates: "dict[str, list[str]]", settings: TransferSettings, index: Optional[SceneIndex]=None) -> "list[dict[str, Any]]":
+	"""
+	Applies outdated layers per asset, in the order from `get_updates`.\n
+	Returns the asset, layer, time and error of each layer, failed layers don't stop the rest.
+	"""
+	# Scan the scene once for every asset
+	index = index or SceneIndex()
+	results = []
+	for asset, layers in updates.items():
+		# Avoid rebuilding material data in other layers
+		settings.replacing_materials = LayerMaterials.folder in layers
+
+		builder = AssetBuilder(asset)
+		for layer in layers:
+			start = time.perf_counter()
+			error = ""
+			try:
+				builder.process(layer_lookup[layer], settings, -1, index)
+			except Exception as err:
+				error = str(err)
+			results.append({"asset": asset, "layer": layer, "seconds": time.perf_counter() - start, "error": error})
+	if leak_tracker.enabled():
+		print(leak_tracker.report())
+	# Tags changed without telling the depsgraph
+	selection_cache.invalidate()
+	return results
+
 class Check_Updates_Operator(bpy.types.Operator):
 	"""Check if asset updates are available"""
 	bl_idname = "pipeline.check_updates"
@@ -246,23 +310,14 @@ class Update_Operator(bpy.types.Operator):
 		props = context.scene.sg_props
 		settings = get_transfer_settings(props)
 		try:
-			for item in props.update_items:
-				# Skip unchecked items
-				if not item.checked or not item.outdated:
-					continue
-				# Avoid rebuilding material data in other layers
-				replacing_mats = LayerMaterials.folder in [layer.name for layer in item.layers]
-				settings.replacing_materials = replacing_mats
-
-				# This assumes correct layer ordering from Check_Updates
-				builder = AssetBuilder(item.asset)
-				for layer in item.layers:
-					layer_obj = layer_lookup[layer.name]
-					try:
-						builder.process(layer_obj, settings, -1)
-					except Exception as err:
-						self.report({"WARNING"}, str(err))
-
+			# Skip unchecked items, this assumes correct layer ordering from Check_Updates
+			items = [item for item in props.update_items if item.checked and item.outdated]
+			updates = {item.asset: [layer.name for layer in item.layers] for item in items}
+			for result in apply_updates(updates, settings):
+				if result["error"]:
+					self.report({"WARNING"}, result["error"])
+
+			for item in items:
 				item.name = f"{item.asset} (Up to date)"
 				item.layers.clear()
 				item.outdated = False
@@ -362,21 +417,46 @@ class Fetch_Operator(bpy.types.Operator):
 				except Exception as err:
 					self.report({"WARNING"}, str(err))
 		else:
-			# Sort by name to retrieve correct version order
-			versions = sorted([os.path.join(build_folder, f) for f in os.listdir(build_folder) if f.endswith(".blend")])
-			if not versions:
+			report = fetch_builds([(props.fetch_asset, 0)], link=props.fetch_link, compare=props.fetch_compare)
+			if report.missing:
 				self.report({"ERROR"}, f"Builds for '{props.fetch_asset}' don't exist yet!")
 				return {"CANCELLED"}
+			self.report({"INFO"}, str(report))
+
+		return {"FINISHED"}
 
-			# Assume top collection is the root we need to import
-			latest_path = versions[-1]
-			with bpy.data.libraries.load(latest_path, link=False) as (source_data, target_data):
-				target_data.collections = [source_data.collections[0]]
+class Batch_Fetch_Operator(bpy.types.Operator):
+	"""Fetch many asset builds at once, loading each build file once"""
+	bl_idname = "pipeline.batch_fetch"
+	bl_label = "Fetch Assets"
+	bl_options = {"REGISTER", "UNDO"}
 
-			# Add to our Scene Collection
-			for col in target_data.collections:
-				context.scene.collection.children.link(col)
+	def execute(self, context):
+		props = context.scene.sg_props
+		requests = parse_fetch_list(props.fetch_batch)
+		if not requests:
+			self.report({"ERROR_INVALID_INPUT"}, "Please type in some assets!")
+			return {"CANCELLED"}
 
+		report = fetch_builds(requests, link=props.fetch_link, compare=props.fetch_compare)
+		if report.missing:
+			self.report({"WARNING"}, f"Builds don't exist yet for: {', '.join(report.missing)}")
+		self.report({"INFO"}, str(report))
+		print(report)
+		return {"FINISHED"}
+
+class Make_Editable_Operator(bpy.types.Operator):
+	"""Override the selected linked objects so they can be edited"""
+	bl_idname = "pipeline.make_editable"
+	bl_label = "Make Editable"
+	bl_options = {"REGISTER", "UNDO"}
+
+	def execute(self, context):
+		editable = make_editable(context.selected_objects, context)
+		if not editable:
+			self.report({"WARNING"}, "No linked builds selected!")
+			return {"CANCELLED"}
+		self.report({"INFO"}, f"Made {len(editable)} objects editable")
 		return {"FINISHED"}
 
 class Fetch_Panel(bpy.types.Panel):
@@ -391,6 +471,12 @@ class Fetch_Panel(bpy.types.Panel):
 		layout = self.layout
 		layout.prop(props, "fetch_asset")
 		layout.operator(Fetch_Operator.bl_idname, icon="IMPORT")
+		layout.prop(props, "fetch_batch")
+		layout.operator(Batch_Fetch_Operator.bl_idname, icon="IMPORT")
+		layout.prop(props, "fetch_link")
+		if props.fetch_link:
+			layout.prop(props, "fetch_compare")
+		layout.operator(Make_Editable_Operator.bl_idname, icon="LIBRARY_DATA_OVERRIDE")
 
 class Dev_Build_Operator(bpy.types.Operator):
 	"""Build the asset layer by adding, removing and updating data"""
@@ -413,6 +499,18 @@ class Dev_Build_Operator(bpy.types.Operator):
 			self.report({"ERROR"}, str(err))
 			return {"CANCELLED"}
 
+class Leak_Report_Operator(bpy.types.Operator):
+	"""Print data blocks and memory left behind by each layer since the last report"""
+	bl_idname = "pipeline.leak_report"
+	bl_label = "Print Leak Report"
+
+	def execute(self, context):
+		report = leak_tracker.report()
+		print(report)
+		self.report({"INFO"}, report.splitlines()[0])
+		leak_tracker.clear()
+		return {"FINISHED"}
+
 class Build_Panel(bpy.types.Panel):
 	bl_label = "(DEV) Build"
 	bl_idname = "ALA_PT_Build"
@@ -432,29 +530,12 @@ class Build_Panel(bpy.types.Panel):
 		layout.prop(props, "dev_build_version")
 		layout.prop(props, "update_transform")
 		layout.operator(Dev_Build_Operator.bl_idname)
+		layout.operator(Leak_Report_Operator.bl_idname)
 
 	@classmethod
 	def poll(cls, context):
 		return context.preferences.addons[__name__].preferences.dev_mode
 
-def get_selected_blocks(context: bpy.types.Context) -> "set[Any]":
-	"""Gets selected asset data blocks in the outliner"""
-	blocks = set()
-	# Include data blocks selected in scene
-	for block in context.selected_objects:
-		if block.get("sg_asset"):
-			blocks.add(block)
-
-	# Include data blocks selected in outliner
-	for area in context.screen.areas:
-		if area.type != "OUTLINER":
-			continue
-		with context.temp_override(window=context.window, area=area):
-			for block in context.selected_ids:
-				if block.get("sg_asset"):
-					blocks.add(block)
-	return blocks
-
 class Clear_Data_Operator(bpy.types.Operator):
 	"""Clears custom data used to tag asset data blocks"""
 	bl_idname = "pipeline.clear_data"
@@ -467,6 +548,16 @@ class Clear_Data_Operator(bpy.types.Operator):
 			del block["sg_layer"]
 			del block["sg_version"]
 			del block["sg_id"]
+		selection_cache.invalidate()
+		return {"FINISHED"}
+
+class Refresh_Inspect_Operator(bpy.types.Operator):
+	"""Read the selection again, needed after selecting materials and other data in the outliner"""
+	bl_idname = "pipeline.refresh_inspect"
+	bl_label = "Refresh"
+
+	def execute(self, context):
+		selection_cache.invalidate()
 		return {"FINISHED"}
 
 class Inspect_Panel(bpy.types.Panel):
@@ -478,25 +569,34 @@ class Inspect_Panel(bpy.types.Panel):
 
 	def draw(self, context):
 		layout = self.layout
-		blocks = get_selected_blocks(context)
-		if not blocks:
+		props = context.scene.sg_props
+		# Walking big selections is slow, only done after they change
+		selection_cache.update(context)
+
+		row = layout.row()
+		row.prop(props, "inspect_grouped")
+		row.operator(Refresh_Inspect_Operator.bl_idname, text="", icon="FILE_REFRESH")
+		if not selection_cache.count:
 			layout.label(text="No assets selected")
 			return
-		
+
 		# Yuck code here, no idea how to draw a table properly
+		grouped = props.inspect_grouped or selection_cache.count > row_limit
 		cols = layout.column_flow(columns=4)
-		cols.label(text="Type")
+		cols.label(text="Blocks" if grouped else "Type")
 		cols.label(text="Asset")
 		cols.label(text="Layer")
 		cols.label(text="Version")
 		item_list = layout.box().column()
-		for block in blocks:
+		for item in selection_cache.groups if grouped else selection_cache.rows:
 			# Table columns
 			cols = item_list.column_flow(columns=4)
-			cols.label(text=type(block).__name__)
-			cols.label(text=block.get("sg_asset", "None"))
-			cols.label(text=block.get("sg_layer", "None"))
-			cols.label(text=str(block.get("sg_version", "None")))
+			cols.label(text=str(item.count) if grouped else item.type)
+			cols.label(text=item.asset)
+			cols.label(text=item.layer)
+			cols.label(text=item.version)
+		if grouped:
+			layout.label(text=f"{selection_cache.count} blocks selected")
 		# Clear asset data button
 		layout.operator(Clear_Data_Operator.bl_idname, icon="UNLINKED")
 
@@ -509,26 +609,15 @@ def load_handler(dummy):
 
 	props = bpy.context.scene.sg_props
 	settings = get_transfer_settings(props)
-	updates = get_updates()
-	for asset in updates:
-		layers = updates[asset]
-		# Avoid rebuilding material data in other layers
-		replacing_mats = LayerMaterials.folder in layers
-		settings.replacing_materials = replacing_mats
-
-		builder = AssetBuilder(asset)
-		for layer in layers:
-			layer_obj = layer_lookup[layer]
-			try:
-				builder.process(layer_obj, settings, -1)
-			except Exception as err:
-				print(err)
+	for result in apply_updates(get_updates(), settings):
+		if result["error"]:
+			print(result["error"])
 
 # Dump all classes to register in here
 classes = [
 	Publish_Panel, Update_Panel, Fetch_Panel, Inspect_Panel, Build_Panel,
-	Publish_Operator, Check_Updates_Operator, Update_Operator, Clear_Data_Operator,
-	Update_Close_Operator, Fetch_Operator, Dev_Build_Operator, Update_Item,
+	Publish_Operator, Clear_Publish_Jobs_Operator, Check_Updates_Operator, Update_Operator, Clear_Data_Operator, Refresh_Inspect_Operator,
+	Update_Close_Operator, Fetch_Operator, Batch_Fetch_Operator, Make_Editable_Operator, Dev_Build_Operator, Leak_Report_Operator, Update_Item,
 	Properties, Preferences
 ]
 
@@ -539,6 +628,7 @@ def register() -> None:
 	scn = bpy.types.Scene
 	scn.sg_props = bpy.props.PointerProperty(type=Properties)
 	bpy.app.handlers.load_post.append(load_handler)
+	register_selection()
 
 def unregister() -> None:
 	scn = bpy.types.Scene
@@ -547,6 +637,7 @@ def unregister() -> None:
 	for cls in classes:
 		bpy.utils.unregister_class(cls)
 	bpy.app.handlers.load_post.remove(load_handler)
+	unregister_selection()
 
 if __name__ == "__main__":
 	register()
\ No newline at end of file
@@ -0,0 +1,128 @@
+from typing import Any, Optional
+import bpy
+import numpy as np
+
+from .utils import *
+
+# Published actions are tagged like everything else, so an action with the same sg_id and version
+# is already loaded and can be reused. Changed actions are updated in place, only touching
+# F-curves whose keyframes differ, so updates scale with what changed.
+
+# foreach property, values per item and array type for each keyframe setting
+# Handle types go before handles, since changing them can recalculate handles
+keyframe_layouts = [
+	("co", 2, np.float32),
+	("interpolation", 1, np.int32),
+	("easing", 1, np.int32),
+	("type", 1, np.int32),
+	("handle_left_type", 1, np.int32),
+	("handle_right_type", 1, np.int32),
+	("handle_left", 2, np.float32),
+	("handle_right", 2, np.float32),
+	("amplitude", 1, np.float32),
+	("back", 1, np.float32),
+	("period", 1, np.float32),
+]
+
+def find_actions(exclude: "set[bpy.types.Action]") -> "dict[str, list[bpy.types.Action]]":
+	"""Finds loaded actions by sg_id, skipping the ones being transferred"""
+	actions = {}
+	for action in bpy.data.actions:
+		if action in exclude:
+			continue
+		id = action.get("sg_id")
+		if not id:
+			continue
+		if id not in actions:
+			actions[id] = []
+		actions[id].append(action)
+	return actions
+
+def sync_keyframes(fc_source: bpy.types.FCurve, fc_target: bpy.types.FCurve) -> bool:
+	"""Copies keyframes in bulk, returns whether anything changed"""
+	points_source = fc_source.keyframe_points
+	points_target = fc_target.keyframe_points
+	values = [read_array(points_source, prop, width, dtype) for (prop, width, dtype) in keyframe_layouts]
+
+	# Skip curves which didn't change
+	count = len(points_source)
+	if len(points_target) == count:
+		current = [read_array(points_target, prop, width, dtype) for (prop, width, dtype) in keyframe_layouts]
+		if all(np.array_equal(a, b) for a, b in zip(values, current)):
+			return False
+
+	# Resize, there's no bulk removal so this only loops the difference
+	if len(points_target) < count:
+		points_target.add(count - len(points_target))
+	while len(points_target) > count:
+		points_target.remove(points_target[len(points_target) - 1], fast=True)
+
+	for (prop, width, dtype), array in zip(keyframe_layouts, values):
+		points_target.foreach_set(prop, array.ravel())
+	fc_target.update()
+	return True
+
+def update_action(source: bpy.types.Action, target: bpy.types.Action) -> int:
+	"""Updates an action in place to match another, returns the number of changed F-curves"""
+	changed = 0
+	paths_source = set()
+	for fc_source in source.fcurves:
+		paths_source.add((fc_source.data_path, fc_source.array_index))
+		fc_target = target.fcurves.find(fc_source.data_path, index=fc_source.array_index)
+		if not fc_target:
+			group = fc_source.group.name if fc_source.group else ""
+			fc_target = target.fcurves.new(fc_source.data_path, index=fc_source.array_index, action_group=group)
+		fc_target.extrapolation = fc_source.extrapolation
+		fc_target.mute = fc_source.mute
+		if sync_keyframes(fc_source, fc_target):
+			changed += 1
+
+	# Remove curves which aren't animated anymore
+	for fc_target in list(target.fcurves):
+		if (fc_target.data_path, fc_target.array_index) not in paths_source:
+			target.fcurves.remove(fc_target)
+			changed += 1
+
+	target.frame_range = source.frame_range
+	transfer_version(source, target)
+	return changed
+
+def transfer_action(source: Any, target: Any, actions: "dict[str, list[bpy.types.Action]]") -> None:
+	"""
+	Assigns the published action of `source` to `target`.\n
+	Reuses a loaded action if its version matches, otherwise updates one in place.\n
+	Works with anything animatable, such as objects and shape keys.
+	"""
+	if not source or not target:
+		return
+	action_source = source.animation_data.action if source.animation_data else None
+	if not action_source:
+		return
+
+	action = None
+	id = action_source.get("sg_id")
+	# Prefer the action already assigned, then any other copy
+	current = target.animation_data.action if target.animation_data else None
+	candidates = actions.get(id, []) if id else []
+	candidates = sorted(candidates, key=lambda a: a != current)
+	for candidate in candidates:
+		if candidate.get("sg_version") == action_source.get("sg_version"):
+			action = candidate
+			break
+
+	if not action and candidates:
+		# Same action, different version, update the keyframes in place
+		action = candidates[0]
+		changed = update_action(action_source, action)
+		print(f"Updated {changed} F-curves in action '{action.name}'")
+
+	if not action:
+		# Brand new action, keep the loaded copy
+		action = action_source
+		if id:
+			actions[id] = [action]
+
+	if not target.animation_data:
+		target.animation_data_create()
+	if target.animation_data.action != action:
+		target.animation_data.action = action
@@ -0,0 +1,96 @@
+from typing import Any, Optional
+import bpy, os
+import numpy as np
+
+from .utils import *
+from .versioning import *
+
+# Set dressing places the same prop hundreds of times. Appending a copy per placement duplicates
+# its meshes and materials, so placements become empties instancing a single loaded build instead.
+# Memory and save size then grow with unique assets, not with placements.
+
+def placement_asset(obj: bpy.types.Object) -> Optional[str]:
+	"""
+	Returns the asset an object places, or None if it isn't a placement.\n
+	Placements either have `sg_instance` set, or instance a tagged collection.
+	"""
+	asset = obj.get("sg_instance")
+	if asset:
+		return asset
+	if obj.instance_type == "COLLECTION" and obj.instance_collection:
+		return obj.instance_collection.get("sg_build_asset") or obj.instance_collection.get("sg_asset")
+	return None
+
+def find_builds() -> "dict[str, bpy.types.Collection]":
+	"""Finds builds already loaded for instancing, by asset name"""
+	builds = {}
+	for col in bpy.data.collections:
+		asset = col.get("sg_build_asset")
+		if asset:
+			builds[asset] = col
+	return builds
+
+def latest_build(asset: str) -> "tuple[Optional[str], int]":
+	"""Returns the path and version of the latest build of an asset"""
+	versions = list_versions(os.path.join(get_preferences().database, "build", asset))
+	if not versions:
+		return (None, 0)
+	return (versions[-1], parse_version(versions[-1]) or len(versions))
+
+def load_build(asset: str, builds: "dict[str, bpy.types.Collection]") -> Optional[bpy.types.Collection]:
+	"""
+	Gets the root collection of the latest build of an asset, loading it once.\n
+	Older loaded builds are swapped for the latest, so every instance updates.
+	"""
+	(path, version) = latest_build(asset)
+	current = builds.get(asset)
+	if current and (not path or current.get("sg_build_version", 0) >= version):
+		return current
+	if not path:
+		print(f"WARNING: Builds for '{asset}' don't exist yet!")
+		return None
+
+	# Assume top collection is the root we need to import
+	with bpy.data.libraries.load(path, link=False) as (source_data, target_data):
+		target_data.collections = [source_data.collections[0]]
+	col = target_data.collections[0]
+	col["sg_build_asset"] = asset
+	col["sg_build_version"] = version
+
+	if current:
+		# Point every instance at the new build
+		current.user_remap(col)
+		bpy.data.collections.remove(current)
+	builds[asset] = col
+	return col
+
+def read_matrices(objects: Any) -> "dict[bpy.types.Object, np.ndarray]":
+	"""Reads world matrices of a collection of objects in one call"""
+	matrices = np.empty(len(objects) * 16, dtype=np.float32)
+	if len(matrices):
+		objects.foreach_get("matrix_world", matrices)
+	return dict(zip(objects, matrices.reshape(-1, 16)))
+
+def instance_build(obj: bpy.types.Object, build: bpy.types.Collection) -> None:
+	"""Turns an object into an instance of a build"""
+	if obj.instance_type != "COLLECTION":
+		obj.instance_type = "COLLECTION"
+	if obj.instance_collection != build:
+		obj.instance_collection = build
+
+def transfer_placements(pairs: "list[tuple[bpy.types.Object, bpy.types.Object]]", source_objects: Any, target_objects: Any) -> int:
+	"""
+	Copies world transforms of (target, source) pairs, returns how many changed.\n
+	Matrices are compared in bulk, so only moved placements are written.
+	"""
+	if not pairs:
+		return 0
+	source_matrices = read_matrices(source_objects)
+	target_matrices = read_matrices(target_objects)
+	sources = np.array([source_matrices[source] for _, source in pairs])
+	targets = np.array([target_matrices[target] for target, _ in pairs])
+	moved = np.flatnonzero(np.any(np.abs(sources - targets) > 1e-6, axis=1))
+	for i in moved.tolist():
+		# Matrices are stored column-major
+		pairs[i][0].matrix_world = sources[i].reshape(4, 4).T.tolist()
+	return len(moved)
@@ -0,0 +1,110 @@
+from typing import Optional
+import bpy, json, os, subprocess, tempfile
+from uuid import uuid4
+
+from .publish import *
+
+# Publishing used to block Blender while the whole file was copied to the database.
+# Now the foreground only tags and saves a snapshot to local disk. A headless Blender copies it,
+# writes metadata and updates the manifest. Failed snapshots are kept so nothing is lost.
+
+worker_path = os.path.join(os.path.dirname(__file__), "publish_worker.py")
+# Seconds between status checks
+poll_interval = 0.5
+
+class PublishJob:
+	"""Background publish started from this session"""
+	def __init__(self, asset: str, layer: str, version: int, target: str, snapshot: str):
+		self.asset = asset
+		self.layer = layer
+		self.version = version
+		self.target = target
+		self.snapshot = snapshot
+		self.status_path = f"{os.path.splitext(snapshot)[0]}.status.json"
+		self.process: Optional[subprocess.Popen] = None
+		self.stage = "Starting"
+		self.progress = 0.0
+		self.error = ""
+		self.done = False
+
+	def __str__(self) -> str:
+		return f"{self.asset} {self.layer} v{self.version:03d}"
+
+# Jobs of this session, finished ones stay listed until cleared
+jobs: "list[PublishJob]" = []
+
+def staging_folder() -> str:
+	"""Local folder for snapshots, saving there is much faster than the network"""
+	folder = os.path.join(tempfile.gettempdir(), "shitgrid_publish")
+	os.makedirs(folder, exist_ok=True)
+	return folder
+
+def start_publish(asset: str, layer: str, version: int, target: str, slim: bool, data_types: "list[str]") -> PublishJob:
+	"""Saves a snapshot and hands it to a headless Blender to publish"""
+	snapshot = os.path.join(staging_folder(), f"{asset}_{layer}_v{version:03d}_{uuid4().hex[:8]}.blend")
+	if slim:
+		write_slim(snapshot, bpy.context.scene, asset, data_types)
+	else:
+		bpy.ops.wm.save_as_mainfile(filepath=snapshot, copy=True)
+
+	job = PublishJob(asset, layer, version, target, snapshot)
+	manifest = os.path.join(os.path.dirname(os.path.dirname(target)), "manifest.json")
+	job.process = subprocess.Popen([
+		bpy.app.binary_path, "-b", "--factory-startup", snapshot,
+		"--python-exit-code", "1", "-P", worker_path, "--",
+		"--status", job.status_path, "--target", target, "--manifest", manifest,
+		"--asset", asset, "--layer", layer, "--version", str(version),
+	])
+	jobs.append(job)
+	if not bpy.app.timers.is_registered(poll_jobs):
+		bpy.app.timers.register(poll_jobs, first_interval=poll_interval)
+	return job
+
+def read_status(job: PublishJob) -> None:
+	"""Reads progress written by the worker"""
+	try:
+		with open(job.status_path) as file:
+			status = json.load(file)
+	except (OSError, ValueError):
+		return
+	job.stage = status["stage"]
+	job.progress = status["progress"]
+	job.error = status["error"]
+
+def finish_job(job: PublishJob) -> None:
+	"""Cleans up a finished job, failed snapshots are kept to publish again"""
+	read_status(job)
+	job.done = True
+	if job.process.returncode != 0 and not job.error:
+		job.error = f"Publish worker exited with code {job.process.returncode}"
+	if job.error:
+		job.stage = "Failed"
+		print(f"ERROR: Publishing {job} failed, the snapshot is kept at {job.snapshot}\n{job.error}")
+		return
+	for path in [job.snapshot, job.status_path]:
+		if os.path.exists(path):
+			os.remove(path)
+	print(f"Published {job} to {job.target}")
+
+def poll_jobs() -> Optional[float]:
+	"""Timer updating job progress, stops once every job is done"""
+	running = False
+	for job in jobs:
+		if job.done:
+			continue
+		if job.process.poll() is None:
+			read_status(job)
+			running = True
+		else:
+			finish_job(job)
+
+	# Redraw the publish panel
+	for window in bpy.context.window_manager.windows:
+		for area in window.screen.areas:
+			if area.type == "VIEW_3D":
+				area.tag_redraw()
+	return poll_interval if running else None
+
+def clear_finished() -> None:
+	"""Removes finished jobs from the list"""
+	jobs[:] = [job for job in jobs if not job.done]
@@ -0,0 +1,298 @@
+from typing import Any, Optional
+import gzip, io, mmap, os, struct, sys
+
+# Reads ID names and our sg_* tags straight from .blend files, without Blender.
+# Only block headers are walked, geometry is never decoded, so files take milliseconds.
+# This module must not import bpy, it's also used from plain Python scripts.
+
+# Tags we care about, other custom properties are skipped
+tag_keys = {"sg_asset", "sg_layer", "sg_version", "sg_id"}
+
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+
+# IDProperty types, see DNA_ID.h
+IDP_STRING = 0
+IDP_INT = 1
+IDP_FLOAT = 2
+IDP_GROUP = 6
+IDP_DOUBLE = 8
+IDP_BOOLEAN = 10
+
+def _decompress_zstd(data: bytes) -> bytes:
+	"""Decompresses every zstd frame, Blender writes many"""
+	try:
+		from compression import zstd
+		return zstd.decompress(data)
+	except ImportError:
+		pass
+	try:
+		import zstandard
+	except ImportError:
+		raise RuntimeError("Reading zstd compressed .blend files needs Python 3.14+ or the zstandard module")
+	reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+	return reader.read(-1)
+
+class DNAField:
+	"""Field of a DNA struct, offsets are in bytes from the start of the struct"""
+	def __init__(self, type: str, name: str, offset: int, size: int):
+		self.type = type
+		self.name = name
+		self.offset = offset
+		self.size = size
+		self.is_pointer = name.startswith("*") or name.startswith("(*")
+
+class DNAStruct:
+	"""Layout of a struct saved in the file"""
+	def __init__(self, type: str, size: int):
+		self.type = type
+		self.size = size
+		self.fields: dict[str, DNAField] = {}
+
+def _field_key(name: str) -> str:
+	"""Strips pointers and array sizes from a DNA name, eg. "*next" and "name[66]" """
+	return name.lstrip("(*").split("[")[0].split(")")[0]
+
+def _array_length(name: str) -> int:
+	"""Multiplies every array dimension of a DNA name"""
+	length = 1
+	for part in name.split("[")[1:]:
+		length *= int(part.split("]")[0])
+	return length
+
+class BlockHeader:
+	"""File block header, `old` is the pointer other blocks use to refer to it"""
+	def __init__(self, code: bytes, length: int, old: int, sdna: int, count: int, offset: int):
+		self.code = code
+		self.length = length
+		self.old = old
+		self.sdna = sdna
+		self.count = count
+		self.offset = offset
+
+class IDBlock:
+	"""ID data block name, type code and tags"""
+	def __init__(self, code: str, name: str, tags: "dict[str, Any]"):
+		self.code = code
+		self.name = name
+		self.tags = tags
+
+	def __repr__(self) -> str:
+		return f"IDBlock({self.code}{self.name}, {self.tags})"
+
+class BlendFile:
+	"""
+	Memory maps a .blend file and reads ID blocks and tags from it.\n
+	Compressed files are decompressed into memory first.\n
+	Use `with BlendFile(path) as blend:` to close the file afterwards.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		self.__file = open(path, "rb")
+		self.__mmap = None
+		try:
+			self.__open()
+			self.__read_blocks()
+		except Exception:
+			self.close()
+			raise
+
+	def __open(self) -> None:
+		"""Maps or decompresses the file and reads its header"""
+		self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic = self.__mmap[:4]
+		if magic[:2] == gzip_magic:
+			self.data = memoryview(gzip.decompress(self.__mmap[:]))
+		elif magic == zstd_magic:
+			self.data = memoryview(_decompress_zstd(self.__mmap[:]))
+		else:
+			self.data = memoryview(self.__mmap)
+
+		header = bytes(self.data[:17])
+		if header[:7] != b"BLENDER":
+			raise ValueError(f"Not a .blend file: {self.path}")
+		if header[7:9].isdigit():
+			# Blender 5.0+, eg. "BLENDER17-01v0500", always 64-bit little endian
+			self.header_size = int(header[7:9])
+			self.pointer_size = 8
+			self.endian = "<"
+			self.version = int(header[13:17])
+			self.__bhead = struct.Struct("<4siQqq")
+			self.__bhead_order = ("code", "sdna", "old", "length", "count")
+		else:
+			# Older files, eg. "BLENDER-v304"
+			self.header_size = 12
+			self.pointer_size = 8 if header[7:8] == b"-" else 4
+			self.endian = "<" if header[8:9] == b"v" else ">"
+			self.version = int(header[9:12])
+			pointer = "Q" if self.pointer_size == 8 else "I"
+			self.__bhead = struct.Struct(f"{self.endian}4si{pointer}ii")
+			self.__bhead_order = ("code", "length", "old", "sdna", "count")
+
+	def __read_blocks(self) -> None:
+		"""Walks every block header, skipping over the data"""
+		self.blocks: list[BlockHeader] = []
+		self.addresses: dict[int, BlockHeader] = {}
+		self.structs: list[DNAStruct] = []
+		offset = self.header_size
+		size = len(self.data)
+		while offset + self.__bhead.size <= size:
+			values = dict(zip(self.__bhead_order, self.__bhead.unpack_from(self.data, offset)))
+			offset += self.__bhead.size
+			block = BlockHeader(values["code"], values["length"], values["old"], values["sdna"], values["count"], offset)
+			if block.code == b"ENDB":
+				break
+			if block.code == b"DNA1":
+				self.__read_sdna(block)
+			self.blocks.append(block)
+			self.addresses[block.old] = block
+			offset += block.length
+
+	def __read_sdna(self, block: BlockHeader) -> None:
+		"""Reads struct layouts, they're needed to find fields inside blocks"""
+		data = bytes(self.data[block.offset:block.offset + block.length])
+		int32 = struct.Struct(f"{self.endian}i")
+
+		def read_strings(offset: int) -> "tuple[list[str], int]":
+			count = int32.unpack_from(data, offset + 4)[0]
+			offset += 8
+			strings = []
+			for _ in range(count):
+				end = data.index(b"\0", offset)
+				strings.append(data[offset:end].decode("utf-8", "replace"))
+				offset = end + 1
+			# Sections are 4 byte aligned
+			return (strings, (offset + 3) & ~3)
+
+		# Skip "SDNA", then "NAME" and "TYPE" sections
+		(names, offset) = read_strings(4)
+		(types, offset) = read_strings(offset)
+
+		# "TLEN" section
+		offset += 4
+		lengths = struct.unpack_from(f"{self.endian}{len(types)}h", data, offset)
+		offset = (offset + len(types) * 2 + 3) & ~3
+
+		# "STRC" section
+		count = int32.unpack_from(data, offset + 4)[0]
+		offset += 8
+		for _ in range(count):
+			(type_index, field_count) = struct.unpack_from(f"{self.endian}hh", data, offset)
+			offset += 4
+			dna = DNAStruct(types[type_index], lengths[type_index])
+			fields = struct.unpack_from(f"{self.endian}{field_count * 2}h", data, offset)
+			offset += field_count * 4
+			field_offset = 0
+			for (field_type, field_name) in zip(fields[0::2], fields[1::2]):
+				name = names[field_name]
+				field = DNAField(types[field_type], name, field_offset, 0)
+				unit = self.pointer_size if field.is_pointer else lengths[field_type]
+				field.size = unit * _array_length(name)
+				dna.fields[_field_key(name)] = field
+				field_offset += field.size
+			self.structs.append(dna)
+		self.struct_lookup = {dna.type: dna for dna in self.structs}
+
+	def close(self) -> None:
+		"""Releases the file, blocks can't be read afterwards"""
+		if hasattr(self, "data"):
+			self.data.release()
+		if self.__mmap:
+			self.__mmap.close()
+			self.__mmap = None
+		self.__file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		self.close()
+
+	def __read_pointer(self, offset: int) -> int:
+		return struct.unpack_from(f"{self.endian}{'Q' if self.pointer_size == 8 else 'I'}", self.data, offset)[0]
+
+	def __read_string(self, offset: int, size: int) -> str:
+		raw = bytes(self.data[offset:offset + size])
+		return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+	def __read_property(self, offset: int) -> "tuple[str, Any, int]":
+		"""Reads an IDProperty, returns its name, value and the next property pointer"""
+		prop = self.struct_lookup["IDProperty"]
+		data_offset = offset + prop.fields["data"].offset
+		prop_data = self.struct_lookup["IDPropertyData"]
+		name = self.__read_string(offset + prop.fields["name"].offset, prop.fields["name"].size)
+		type = self.data[offset + prop.fields["type"].offset]
+		next = self.__read_pointer(offset + prop.fields["next"].offset)
+
+		value = None
+		val_offset = data_offset + prop_data.fields["val"].offset
+		if type == IDP_STRING:
+			pointer = self.__read_pointer(data_offset + prop_data.fields["pointer"].offset)
+			block = self.addresses.get(pointer)
+			if block:
+				value = self.__read_string(block.offset, block.length)
+		elif type == IDP_INT or type == IDP_BOOLEAN:
+			value = struct.unpack_from(f"{self.endian}i", self.data, val_offset)[0]
+			if type == IDP_BOOLEAN:
+				value = bool(value)
+		elif type == IDP_FLOAT:
+			value = struct.unpack_from(f"{self.endian}f", self.data, val_offset)[0]
+		elif type == IDP_DOUBLE:
+			# Stored across val and val2
+			value = struct.unpack_from(f"{self.endian}d", self.data, val_offset)[0]
+		return (name, value, next)
+
+	def __read_tags(self, pointer: int) -> "dict[str, Any]":
+		"""Reads our tags from the top level properties of an ID"""
+		tags = {}
+		block = self.addresses.get(pointer)
+		if not block:
+			return tags
+		prop = self.struct_lookup["IDProperty"]
+		prop_data = self.struct_lookup["IDPropertyData"]
+		group = block.offset + prop.fields["data"].offset + prop_data.fields["group"].offset
+		child = self.__read_pointer(group + self.struct_lookup["ListBase"].fields["first"].offset)
+		# Children are a linked list of separate blocks
+		seen = set()
+		while child and child not in seen:
+			seen.add(child)
+			block = self.addresses.get(child)
+			if not block:
+				break
+			(name, value, child) = self.__read_property(block.offset)
+			if name in tag_keys:
+				tags[name] = value
+		return tags
+
+	def ids(self) -> "list[IDBlock]":
+		"""Lists every ID block in the file with its tags"""
+		id = self.struct_lookup.get("ID")
+		if not id:
+			return []
+		name = id.fields["name"]
+		properties = id.fields["properties"]
+		blocks = []
+		for block in self.blocks:
+			if block.sdna >= len(self.structs) or block.code in (b"DATA", b"DNA1"):
+				continue
+			# ID blocks start with an ID struct
+			dna = self.structs[block.sdna]
+			first = next(iter(dna.fields.values()), None)
+			if not first or first.type != "ID" or first.is_pointer:
+				continue
+			full_name = self.__read_string(block.offset + name.offset, name.size)
+			tags = self.__read_tags(self.__read_pointer(block.offset + properties.offset))
+			blocks.append(IDBlock(full_name[:2], full_name[2:], tags))
+		return blocks
+
+def read_tags(path: str) -> "list[IDBlock]":
+	"""Reads the ID blocks of a .blend file which have tags"""
+	with BlendFile(path) as blend:
+		return [block for block in blend.ids() if block.tags]
+
+if __name__ == "__main__":
+	# Usage: python blend_reader.py file.blend [...]
+	for path in sys.argv[1:]:
+		print(path)
+		for block in read_tags(path):
+			print(f"\t{block.code} {block.name}: {block.tags}")
@@ -1,4 +1,4 @@
-:: This part should be automated whenever an asset updates
+:: watcher.py runs this automatically whenever an asset updates
 ECHO off
 SET /p asset="Type an asset name: "
 
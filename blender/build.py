@@ -1,52 +1,51 @@
-import bpy, os, argparse, getpass
-from uuid import uuid4
+import bpy, os, sys, argparse, getpass
 
 from .transfer_map import *
 from .layers import *
+from .dedup import dedup_data
+from .leaks import leak_tracker
+from .versioning import *
+from .catalog import *
 from .utils import *
 
 class AssetBuilder:
 	"""Constructs an asset by applying layers to the current scene."""
 	def __init__(self, name: str):
 		self.asset = name
-		self.uuid = str(uuid4())
+		self.root: Optional[bpy.types.Collection] = None
 
-	def __get_versions(self, layer: str):
-		"""Returns a list of all files for a layer"""
+	def __get_folder(self, layer: str) -> str:
+		"""Returns the folder holding all files for a layer"""
 
 		# Structure is "master/wip/asset/layer/asset_layer_v001.blend" for now
-		prefs = bpy.context.preferences.addons[__name__].preferences
+		prefs = get_preferences()
 		wip_folder = os.path.join(prefs.database, "wip", self.asset, layer)
 		if not os.path.exists(wip_folder):
 			raise NotADirectoryError(f"Missing {layer} folder: {wip_folder}")
-		
-		# Sort by name to retrieve correct version order
-		versions = [os.path.join(wip_folder, f) for f in os.listdir(wip_folder) if f.endswith(".blend")]
-		return sorted(versions)
+		return wip_folder
 
 	def __get_version(self, layer: str, version: int) -> SourceFile:
 		"""Returns a layer file with a specific version"""
 
-		versions = self.__get_versions(layer)
+		versions = list_versions(self.__get_folder(layer))
 		if not versions:
 			raise FileNotFoundError(f"No versions for {layer} exist!")
-		
-		num_versions = len(versions)
-		if version <= 0 or version > num_versions:
-			raise IndexError(f"Version {version} is out of range! Max is {num_versions}")
-		
-		# SourceFile expects a version number starting at 1
-		return SourceFile(versions[version - 1], self.asset, layer, version)
+
+		# Versions are parsed from file names, so failed publishes don't shift them
+		path = find_version(versions, version)
+		if not path:
+			raise IndexError(f"Version {version} doesn't exist! Max is {parse_version(versions[-1]) or len(versions)}")
+		return SourceFile(path, self.asset, layer, version)
 
 	def __get_latest(self, layer: str) -> SourceFile:
 		"""Returns the latest layer file available"""
 
-		versions = self.__get_versions(layer)
+		versions = list_versions(self.__get_folder(layer))
 		if not versions:
 			raise FileNotFoundError(f"No versions for {layer} exist!")
 		
 		# SourceFile expects a version number starting at 1
-		return SourceFile(versions[-1], self.asset, layer, len(versions))
+		return SourceFile(versions[-1], self.asset, layer, parse_version(versions[-1]) or len(versions))
 
 	def mark_asset(self) -> None:
 		"""Adds asset metadata and creates a root collection if needed"""
@@ -72,33 +71,22 @@ class AssetBuilder:
 		root.asset_mark()
 		root.asset_generate_preview()
 
-		asset_data = root.asset_data
-		asset_data.catalog_id = self.uuid
-		asset_data.author = getpass.getuser()
+		root.asset_data.author = getpass.getuser()
+		# The catalog ID depends on the version, it's set when saving
+		self.root = root
 
-	def process(self, layer, settings: TransferSettings, version: int=-1) -> None:
+	def process(self, layer, settings: TransferSettings, version: int=-1, index: Optional[SceneIndex]=None) -> None:
 		"""
 		Applies a layer with a specific version.\n
-		Zero or negative uses the latest version.
+		Zero or negative uses the latest version.\n
+		`index` shares one scan of the current scene between many updates.
 		"""
 		path = self.__get_version(layer.folder, version) if version > 0 else self.__get_latest(layer.folder)
-		with TransferMap(path, layer.find_parents) as map:
-			layer.process(map, settings)
-
-	def __update_catalog(self, version: int) -> None:
-		"""Manually updates Blender's Asset Library catalog file"""
-
-		prefs = bpy.context.preferences.addons[__name__].preferences
-		catalog_path = os.path.join(prefs.database, "build", "blender_assets.cats.txt")
-		catalog_exists = os.path.isfile(catalog_path)
-
-		with open(catalog_path, "a") as catalog:
-			if not catalog_exists:
-				# Write default content, requires folders have UUIDs for some reason
-				catalog.write(f"VERSION 1\n\n{uuid4()}:Builds:Builds")
-			# Structure is "Builds/Asset/Asset v001" for now
-			name = self.asset.capitalize()
-			catalog.write(f"\n{self.uuid}:Builds/{name}:{name} v{version:03d}")
+		with leak_tracker.track(self.asset, layer.folder, "process"):
+			with TransferMap(path, layer.find_parents, index) as map:
+				layer.process(map, settings)
+			# Layer files bring their own copies of shared textures and materials
+			dedup_data()
 
 	def save(self, write_catalog: bool=False) -> None:
 		"""
@@ -106,23 +94,24 @@ class AssetBuilder:
 		`write_catalog` optionally lists this file in the Asset Library.
 		"""
 		# Structure is "master/build/asset/asset_v001.blend" for now
-		prefs = bpy.context.preferences.addons[__name__].preferences
+		prefs = get_preferences()
 		asset_folder = os.path.join(prefs.database, "build", self.asset)
 		if not os.path.exists(asset_folder):
 			os.umask(0)
 			os.makedirs(asset_folder)
 
-		# Increase version based on file count in subfolder
-		version = len([f for f in os.listdir(asset_folder) if f.endswith(".blend")]) + 1
-
+		# Claim the next version, other builds might be saving too
 		# Name is "asset_v001.blend" for now
-		file_name = f"{self.asset}_v{version:03d}.blend"
-		file_path = os.path.join(asset_folder, file_name)
+		(version, file_path) = reserve_version(asset_folder, self.asset)
 
-		if write_catalog:
-			self.__update_catalog(version)
+		if self.root and self.root.asset_data:
+			self.root.asset_data.catalog_id = catalog_uuid(self.asset, version)
 
-		bpy.ops.wm.save_mainfile(filepath=file_path)
+		write_atomic(file_path, lambda temp_path: bpy.ops.wm.save_as_mainfile(filepath=temp_path, copy=True))
+		release_version(file_path)
+		# Only list versions which exist
+		if write_catalog:
+			update_catalog(os.path.join(prefs.database, "build", catalog_name), self.asset, version)
 		print(f"Successfully built {file_path}")
 
 def get_args():
@@ -136,23 +125,41 @@ def get_args():
 
 	# Put custom arguments here
 	parser.add_argument("-a", "--asset", help="Asset name to build")
+	parser.add_argument("--regenerate-catalog", action="store_true", help="Rebuild the catalog from the builds on disk")
+	parser.add_argument("--prune-catalog", type=int, default=0, metavar="KEEP", help="Only keep the latest KEEP versions of each asset in the catalog")
 	parsed_args, _ = parser.parse_known_args(script_args)
 	return parsed_args
 
 if __name__ == "__main__":
 	args = get_args()
+	prefs = get_preferences()
+
+	catalog_path = os.path.join(prefs.database, "build", catalog_name)
+	if args.regenerate_catalog:
+		count = regenerate_catalog(catalog_path, os.path.join(prefs.database, "build"))
+		print(f"Catalog lists {count} builds")
+	if args.prune_catalog > 0:
+		removed = prune_catalog(catalog_path, args.prune_catalog)
+		print(f"Removed {removed} superseded builds from the catalog")
+	if not args.asset:
+		sys.exit(0)
 
 	settings = TransferSettings()
 	settings.update_transform = True
 	# Avoid rebuilding material data in other layers
 	settings.replacing_materials = True
+	settings.cache_folder = os.path.join(prefs.database, "cache")
+	settings.workers = prefs.workers
 
 	builder = AssetBuilder(args.asset)
+	index = SceneIndex()
 	for layer in listed_layers:
 		try:
-			builder.process(layer, settings, -1)
+			builder.process(layer, settings, -1, index)
 		except Exception as err:
 			print(err)
 
 	builder.mark_asset()
-	builder.save(write_catalog=True)
\ No newline at end of file
+	builder.save(write_catalog=True)
+	if leak_tracker.enabled():
+		print(leak_tracker.report())
\ No newline at end of file
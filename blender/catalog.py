@@ -0,0 +1,150 @@
+from typing import Optional
+import os, re
+from uuid import UUID, uuid5
+
+from .versioning import *
+
+# Builds used to append to blender_assets.cats.txt, so parallel builds could interleave lines or
+# write the header twice, and the file grew by a line per build forever. The catalog is now
+# read into an index, changed under a lock and rewritten atomically.
+
+catalog_name = "blender_assets.cats.txt"
+root_path = "Builds"
+# Simple names are "Asset v001"
+simple_pattern = re.compile(r"^(.*) v(\d+)$")
+# IDs are derived from the asset and version, so regenerating the catalog keeps builds in place
+catalog_namespace = UUID("6f3c2a8e-51d4-4b7a-9c0e-2d8b1f47a935")
+
+def catalog_uuid(asset: str, version: int) -> str:
+	"""Returns the catalog ID of a build"""
+	return str(uuid5(catalog_namespace, f"{asset.capitalize()}/{version}"))
+
+class CatalogEntry:
+	"""One line of the catalog file"""
+	def __init__(self, uuid: str, path: str, name: str):
+		self.uuid = uuid
+		self.path = path
+		self.name = name
+
+	def __str__(self) -> str:
+		return f"{self.uuid}:{self.path}:{self.name}"
+
+class AssetCatalog:
+	"""
+	Blender's Asset Library catalog, indexed by asset and version.\n
+	Use `update_catalog`, `prune_catalog` or `regenerate_catalog` to change the file safely.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		# Build entries keyed by (name, version), name is capitalized like in the catalog
+		self.builds: "dict[tuple[str, int], CatalogEntry]" = {}
+		# Root folder and catalogs we didn't write, kept as they are
+		self.others: "list[CatalogEntry]" = []
+		self.load()
+
+	def load(self) -> None:
+		"""Reads the catalog file, a missing file is empty"""
+		self.builds.clear()
+		self.others.clear()
+		if not os.path.isfile(self.path):
+			return
+		with open(self.path, encoding="utf-8") as file:
+			for line in file:
+				line = line.strip()
+				if not line or line.startswith("#") or line.startswith("VERSION"):
+					continue
+				parts = line.split(":", 2)
+				if len(parts) != 3:
+					continue
+				entry = CatalogEntry(*parts)
+				key = self.__build_key(entry)
+				if key:
+					self.builds[key] = entry
+				else:
+					self.others.append(entry)
+
+	def __build_key(self, entry: CatalogEntry) -> "Optional[tuple[str, int]]":
+		"""Returns the index key of a build entry, None for anything else"""
+		if not entry.path.startswith(root_path + "/"):
+			return None
+		match = simple_pattern.match(entry.name)
+		if not match:
+			return None
+		return (match.group(1), int(match.group(2)))
+
+	def save(self) -> None:
+		"""Rewrites the catalog file, readers see the old or new file but never half of one"""
+		if not any(entry.path == root_path for entry in self.others):
+			# Requires folders have UUIDs for some reason
+			self.others.insert(0, CatalogEntry(str(uuid5(catalog_namespace, root_path)), root_path, root_path))
+		lines = ["VERSION 1", ""]
+		lines.extend(str(entry) for entry in self.others)
+		lines.extend(str(self.builds[key]) for key in sorted(self.builds))
+
+		def write(temp_path: str) -> None:
+			with open(temp_path, "w", encoding="utf-8") as file:
+				file.write("\n".join(lines) + "\n")
+		write_atomic(self.path, write)
+
+	def add(self, asset: str, version: int, uuid: Optional[str]=None) -> CatalogEntry:
+		"""Adds or replaces a build, structure is "Builds/Asset/Asset v001" for now"""
+		name = asset.capitalize()
+		entry = CatalogEntry(uuid or catalog_uuid(asset, version), f"{root_path}/{name}", f"{name} v{version:03d}")
+		self.builds[(name, version)] = entry
+		return entry
+
+	def prune(self, keep: int=1) -> int:
+		"""Removes all but the latest `keep` versions of each asset, returns how many were removed"""
+		latest: "dict[str, list[int]]" = {}
+		for (name, version) in self.builds:
+			latest.setdefault(name, []).append(version)
+		removed = 0
+		for name, versions in latest.items():
+			for version in sorted(versions)[:-keep] if keep > 0 else versions:
+				del self.builds[(name, version)]
+				removed += 1
+		return removed
+
+	def regenerate(self, build_folder: str) -> None:
+		"""Lists every build on disk, existing entries keep their IDs"""
+		builds = {}
+		for entry in os.scandir(build_folder):
+			if not entry.is_dir():
+				continue
+			for path in list_versions(entry.path):
+				version = parse_version(path)
+				if version is None:
+					continue
+				key = (entry.name.capitalize(), version)
+				old = self.builds.get(key)
+				builds[key] = old or CatalogEntry(catalog_uuid(entry.name, version), f"{root_path}/{key[0]}", f"{key[0]} v{version:03d}")
+		self.builds = builds
+
+def lock_path(path: str) -> str:
+	"""Lock file guarding a catalog"""
+	return path + ".lock"
+
+def update_catalog(path: str, asset: str, version: int, uuid: Optional[str]=None) -> CatalogEntry:
+	"""Adds a build to the catalog file, safe while other builds write it"""
+	with FileLock(lock_path(path)):
+		catalog = AssetCatalog(path)
+		entry = catalog.add(asset, version, uuid)
+		catalog.save()
+	return entry
+
+def prune_catalog(path: str, keep: int=1) -> int:
+	"""Removes superseded builds from the catalog file, returns how many were removed"""
+	with FileLock(lock_path(path)):
+		catalog = AssetCatalog(path)
+		removed = catalog.prune(keep)
+		if removed:
+			catalog.save()
+	return removed
+
+def regenerate_catalog(path: str, build_folder: str) -> int:
+	"""Rebuilds the catalog file from the builds on disk, returns how many builds it lists"""
+	with FileLock(lock_path(path)):
+		catalog = AssetCatalog(path)
+		catalog.regenerate(build_folder)
+		catalog.save()
+	return len(catalog.builds)
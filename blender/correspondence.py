@@ -0,0 +1,432 @@
+from typing import Any, Optional
+import bpy, bmesh, mathutils, os, shutil
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .digest import *
+from .utils import *
+
+# Proximity transfers used to rebuild a BMesh, BVH tree and triangle lookup per pass.
+# A correspondence does the nearest triangle search once per mesh pair instead.
+# Everything is stored as arrays so it can be saved as .npy files and memory-mapped.
+# Huge meshes are searched in fixed chunks on a thread pool with a NumPy grid kernel, which releases the GIL.
+
+# Arrays saved to disk, everything else is rebuilt from the meshes when needed
+saved_arrays = ["vert_verts", "vert_loops", "vert_weights", "vert_face", "poly_face"]
+
+def source_triangles(mesh: bpy.types.Mesh) -> "tuple[np.ndarray, np.ndarray, np.ndarray]":
+	"""Returns the loops, vertices and polygon of each triangle in a mesh"""
+	mesh.calc_loop_triangles()
+	tri_loops = read_array(mesh.loop_triangles, "loops", 3, np.int32)
+	tri_verts = read_array(mesh.loop_triangles, "vertices", 3, np.int32)
+	tri_poly = read_array(mesh.loop_triangles, "polygon_index", 1, np.int32)
+	return (tri_loops, tri_verts, tri_poly)
+
+def barycentric_weights(points: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+	"""Calculates barycentric weights of points lying on triangles abc"""
+	v0 = b - a
+	v1 = c - a
+	v2 = points - a
+	d00 = np.einsum("ij,ij->i", v0, v0)
+	d01 = np.einsum("ij,ij->i", v0, v1)
+	d11 = np.einsum("ij,ij->i", v1, v1)
+	d20 = np.einsum("ij,ij->i", v2, v0)
+	d21 = np.einsum("ij,ij->i", v2, v1)
+	denom = d00 * d11 - d01 * d01
+
+	# Degenerate triangles fall back to their first corner
+	degenerate = np.abs(denom) < 1e-12
+	denom[degenerate] = 1.0
+	v = (d11 * d20 - d01 * d21) / denom
+	w = (d00 * d21 - d01 * d20) / denom
+	weights = np.stack([1.0 - v - w, v, w], axis=1)
+	weights[degenerate] = [1.0, 0.0, 0.0]
+
+	# Points come from the triangle surface, so this only removes float error
+	weights = np.clip(weights, 0.0, 1.0)
+	return weights / weights.sum(axis=1, keepdims=True)
+
+def nearest_triangles(bvh_tree: mathutils.bvhtree.BVHTree, points: np.ndarray, tris: np.ndarray, locations: np.ndarray) -> None:
+	"""Writes the nearest triangle index and location for each point into `tris` and `locations`"""
+	for i, p in enumerate(points.tolist()):
+		(loc, norm, index, distance) = bvh_tree.find_nearest(p)
+		if index is None:
+			continue
+		tris[i] = index
+		locations[i] = loc
+
+def closest_on_triangles(points: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+	"""Returns the closest point to each point on triangles abc, see Real-Time Collision Detection 5.1.5"""
+	ab = b - a
+	ac = c - a
+	ap = points - a
+	bp = points - b
+	cp = points - c
+	d1 = np.einsum("ij,ij->i", ab, ap)
+	d2 = np.einsum("ij,ij->i", ac, ap)
+	d3 = np.einsum("ij,ij->i", ab, bp)
+	d4 = np.einsum("ij,ij->i", ac, bp)
+	d5 = np.einsum("ij,ij->i", ab, cp)
+	d6 = np.einsum("ij,ij->i", ac, cp)
+	va = d3 * d6 - d5 * d4
+	vb = d5 * d2 - d1 * d6
+	vc = d1 * d4 - d3 * d2
+
+	# Zero denominators only happen in regions checked earlier or on degenerate triangles
+	def divide(n: np.ndarray, d: np.ndarray) -> np.ndarray:
+		return np.divide(n, d, out=np.zeros_like(n), where=d != 0)
+	edge_bc = d4 - d3
+	total = va + vb + vc
+	# Barycentric weights of b and c per Voronoi region, checked in order
+	regions = [
+		(d1 <= 0) & (d2 <= 0),
+		(d3 >= 0) & (d4 <= d3),
+		(vc <= 0) & (d1 >= 0) & (d3 <= 0),
+		(d6 >= 0) & (d5 <= d6),
+		(vb <= 0) & (d2 >= 0) & (d6 <= 0),
+		(va <= 0) & (edge_bc >= 0) & (d5 - d6 >= 0),
+	]
+	edge_bc_w = divide(edge_bc, edge_bc + d5 - d6)
+	v = np.select(regions, [0.0, 1.0, divide(d1, d1 - d3), 0.0, 0.0, 1.0 - edge_bc_w], divide(vb, total))
+	w = np.select(regions, [0.0, 0.0, 0.0, 1.0, divide(d2, d2 - d6), edge_bc_w], divide(vc, total))
+	return a + ab * v[:, None] + ac * w[:, None]
+
+def shell_offsets(ring: int) -> np.ndarray:
+	"""Offsets of the cells exactly `ring` cells away from a cell"""
+	steps = np.arange(-ring, ring + 1)
+	offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+	return offsets[np.abs(offsets).max(axis=1) == ring]
+
+class TriangleGrid:
+	"""
+	Uniform grids of triangles for nearest triangle searches in NumPy.\n
+	Unlike BVHTree.find_nearest, queries run on whole arrays and release the GIL,
+	so chunks of points can be searched on many threads at once.
+	Points left after searching a few cells around them continue in a coarser grid.
+	"""
+	# Shells of cells searched around a point before moving to the coarser grid
+	max_ring = 2
+
+	def __init__(self, a: np.ndarray, b: np.ndarray, c: np.ndarray, cell: float=0.0):
+		self.a = a
+		self.b = b
+		self.c = c
+		self.tri_min = tri_min = np.minimum(np.minimum(a, b), c)
+		self.tri_max = tri_max = np.maximum(np.maximum(a, b), c)
+
+		# Cells about twice the size of a triangle hold a few triangles each
+		self.origin = tri_min.min(axis=0)
+		extent = tri_max.max(axis=0) - self.origin
+		if not cell:
+			cell = 2.0 * float((tri_max - tri_min).max(axis=1).mean())
+		self.cell = max(cell, float(extent.max()) * 1e-6, 1e-9)
+		max_cells = min(max(4 * len(a), 4096), 1 << 24)
+		while True:
+			self.dims = np.maximum(np.ceil(extent / self.cell).astype(np.int64), 1)
+			if int(np.prod(self.dims)) <= max_cells:
+				break
+			self.cell *= 1.25
+
+		# Each triangle goes into every cell its bounds touch
+		lo = self.cell_coords(tri_min)
+		span = self.cell_coords(tri_max) - lo + 1
+		count = np.prod(span, axis=1)
+		tri = np.repeat(np.arange(len(a), dtype=np.int32), count)
+		local = np.arange(len(tri)) - np.repeat(np.cumsum(count) - count, count)
+		span = span[tri]
+		coords = lo[tri] + np.stack([local % span[:, 0], local // span[:, 0] % span[:, 1], local // (span[:, 0] * span[:, 1])], axis=1)
+		cells = self.cell_index(coords)
+		order = np.argsort(cells, kind="stable")
+		self.cell_tris = tri[order]
+		self.cell_start = np.searchsorted(cells[order], np.arange(int(np.prod(self.dims)) + 1))
+
+		# The coarsest grid is small enough to search whole
+		self.coarser: Optional[TriangleGrid] = None
+		if self.dims.max() > 2 * self.max_ring + 1:
+			self.coarser = TriangleGrid(a, b, c, self.cell * (2 * self.max_ring + 1))
+
+	def cell_coords(self, points: np.ndarray) -> np.ndarray:
+		"""Cell of each point, points outside the grid are clamped to its border"""
+		return np.clip(np.floor((points - self.origin) / self.cell).astype(np.int64), 0, self.dims - 1)
+
+	def cell_index(self, coords: np.ndarray) -> np.ndarray:
+		return coords[:, 0] + self.dims[0] * (coords[:, 1] + self.dims[1] * coords[:, 2])
+
+	def nearest(self, points: np.ndarray, tris: np.ndarray, locations: np.ndarray) -> None:
+		"""Writes the nearest triangle index and location for each point into `tris` and `locations`"""
+		self.search(points, np.arange(len(points)), np.full(len(points), np.inf), tris, locations)
+
+	def search(self, points: np.ndarray, active: np.ndarray, best: np.ndarray, tris: np.ndarray, locations: np.ndarray) -> None:
+		"""
+		Searches shells of cells around `active` points until nothing outside them can be closer than `best`.\n
+		Each point is searched the same way whatever other points it's queried with,
+		so results don't depend on how points are split into chunks.
+		"""
+		home = self.cell_coords(points)
+		ring = 0
+		while len(active) and (ring <= self.max_ring or not self.coarser):
+			offsets = shell_offsets(ring)
+			coords = (home[active, None, :] + offsets[None, :, :]).reshape(-1, 3)
+			owner = np.repeat(active, len(offsets))
+			inside = np.all((coords >= 0) & (coords < self.dims), axis=1)
+			coords = coords[inside]
+			owner = owner[inside]
+			# Skip cells further away than the closest triangle found so far
+			cell_min = self.origin + coords * self.cell
+			gap = np.maximum(np.maximum(cell_min - points[owner], points[owner] - cell_min - self.cell), 0.0)
+			near = np.einsum("ij,ij->i", gap, gap) < best[owner]
+			cells = self.cell_index(coords[near])
+			owner = owner[near]
+
+			# Every triangle in those cells, grouped by point
+			starts = self.cell_start[cells]
+			sizes = self.cell_start[cells + 1] - starts
+			pair_point = np.repeat(owner, sizes)
+			if len(pair_point):
+				pair_tri = self.cell_tris[np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(len(pair_point))]
+				# Corners give an upper bound on the distance, skip triangles whose bounds are further away
+				pair_co = points[pair_point]
+				corner = np.einsum("ij,ij->i", self.a[pair_tri] - pair_co, self.a[pair_tri] - pair_co)
+				group = np.flatnonzero(np.diff(pair_point, prepend=-1))
+				limit = np.minimum(np.repeat(np.minimum.reduceat(corner, group), np.diff(group, append=len(pair_point))), best[pair_point])
+				gap = np.maximum(np.maximum(self.tri_min[pair_tri] - pair_co, pair_co - self.tri_max[pair_tri]), 0.0)
+				keep = np.einsum("ij,ij->i", gap, gap) <= limit
+				pair_point = pair_point[keep]
+				pair_tri = pair_tri[keep]
+				closest = closest_on_triangles(points[pair_point], self.a[pair_tri], self.b[pair_tri], self.c[pair_tri])
+				distance = np.einsum("ij,ij->i", closest - points[pair_point], closest - points[pair_point])
+				# Pairs are grouped by point, keep the first with the lowest distance of each group
+				group = np.flatnonzero(np.diff(pair_point, prepend=-1))
+				lowest = np.repeat(np.minimum.reduceat(distance, group), np.diff(group, append=len(pair_point)))
+				pick = np.flatnonzero(distance == lowest)
+				pick = pick[np.diff(pair_point[pick], prepend=-1) != 0]
+				pick = pick[distance[pick] < best[pair_point[pick]]]
+				best[pair_point[pick]] = distance[pick]
+				tris[pair_point[pick]] = pair_tri[pick]
+				locations[pair_point[pick]] = closest[pick]
+
+			# Anything not searched yet lies beyond the shell, borders of the grid have nothing beyond them
+			p = points[active] - self.origin
+			low = np.where(home[active] - ring > 0, p - (home[active] - ring) * self.cell, np.inf)
+			high = np.where(home[active] + ring < self.dims - 1, (home[active] + ring + 1) * self.cell - p, np.inf)
+			bound = np.minimum(low, high).min(axis=1)
+			active = active[best[active] > bound * bound]
+			ring += 1
+
+		if len(active):
+			self.coarser.search(points, active, best, tris, locations)
+
+# Points per chunk when computing in parallel.
+# This is fixed so the output is identical regardless of the thread count.
+chunk_size = 1024
+
+def run_chunked(count: int, func: Any, workers: int=0) -> None:
+	"""
+	Calls `func(start, end)` for fixed-size chunks of `count` items on a thread pool.\n
+	Zero workers uses every core. Chunks must write to separate slices of shared arrays.
+	"""
+	chunks = [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+	if not workers:
+		workers = os.cpu_count() or 1
+	if workers == 1 or len(chunks) <= 1:
+		for start, end in chunks:
+			func(start, end)
+		return
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		# Consuming the results raises any exceptions from the threads
+		list(pool.map(lambda chunk: func(*chunk), chunks))
+
+def compute_correspondence(source: bpy.types.Mesh, target: bpy.types.Mesh, workers: int=0) -> "Optional[dict[str, np.ndarray]]":
+	"""
+	Finds the nearest source triangle for every target vertex and polygon.\n
+	Points are split into fixed chunks searched with `TriangleGrid` on `workers` threads, zero uses every core.
+	Results are written into preallocated arrays and don't depend on the thread count.
+	One worker searches a BVH tree instead, which is faster on a single core.\n
+	Returns None if the source mesh has no faces to project onto.
+	"""
+	(tri_loops, tri_verts, tri_poly) = source_triangles(source)
+	if not len(tri_verts):
+		return None
+
+	source_co = read_array(source.vertices, "co", 3, np.float32).astype(np.float64)
+	if not workers:
+		workers = os.cpu_count() or 1
+	if workers == 1:
+		bvh_tree = mathutils.bvhtree.BVHTree.FromPolygons(source_co.tolist(), tri_verts.tolist(), all_triangles=True)
+		search = lambda points, tris, locations: nearest_triangles(bvh_tree, points, tris, locations)
+	else:
+		search = TriangleGrid(*[source_co[tri_verts[:, i]] for i in range(3)]).nearest
+
+	# Corners sit on vertices, so vertex results are reused for corners
+	target_co = read_array(target.vertices, "co", 3, np.float32).astype(np.float64)
+	vert_tri = np.zeros(len(target_co), dtype=np.int32)
+	vert_loc = np.zeros((len(target_co), 3), dtype=np.float64)
+	weights = np.zeros((len(target_co), 3), dtype=np.float32)
+
+	def vert_chunk(start: int, end: int) -> None:
+		search(target_co[start:end], vert_tri[start:end], vert_loc[start:end])
+		corners = tri_verts[vert_tri[start:end]]
+		weights[start:end] = barycentric_weights(vert_loc[start:end], *[source_co[corners[:, i]] for i in range(3)])
+
+	run_chunked(len(target_co), vert_chunk, workers)
+
+	target_centers = read_array(target.polygons, "center", 3, np.float32).astype(np.float64)
+	poly_tri = np.zeros(len(target_centers), dtype=np.int32)
+	poly_loc = np.zeros((len(target_centers), 3), dtype=np.float64)
+
+	def poly_chunk(start: int, end: int) -> None:
+		search(target_centers[start:end], poly_tri[start:end], poly_loc[start:end])
+
+	run_chunked(len(target_centers), poly_chunk, workers)
+
+	return {
+		"vert_verts": tri_verts[vert_tri],
+		"vert_loops": tri_loops[vert_tri],
+		"vert_weights": weights,
+		"vert_face": tri_poly[vert_tri],
+		"poly_face": tri_poly[poly_tri],
+	}
+
+class Correspondence:
+	"""
+	Proximity mapping from a target mesh onto a source mesh.\n
+	Vertex Verts/Loops: Source vertices and loops of the nearest triangle to each target vertex
+	Vertex Weights: Barycentric weights within that triangle
+	Vertex Face: Source polygon nearest to each target vertex
+	Poly Face: Source polygon nearest to each target polygon center
+	"""
+	def __init__(self, source: bpy.types.Mesh, target: bpy.types.Mesh, arrays: "dict[str, np.ndarray]"):
+		self.source = source
+		self.target = target
+		self.vert_verts: np.ndarray = arrays["vert_verts"]
+		self.vert_loops: np.ndarray = arrays["vert_loops"]
+		self.vert_weights: np.ndarray = arrays["vert_weights"]
+		self.vert_face: np.ndarray = arrays["vert_face"]
+		self.poly_face: np.ndarray = arrays["poly_face"]
+
+		# Target corner lookups are cheap, so they aren't saved
+		self.loop_vert = read_array(target.loops, "vertex_index", 1, np.int32)
+		loop_total = read_array(target.polygons, "loop_total", 1, np.int32)
+		self.loop_poly = np.repeat(np.arange(len(loop_total), dtype=np.int32), loop_total)
+
+		# Only needed for corners near data seams, built when first used
+		self.__bmesh: Optional[bmesh.types.BMesh] = None
+		self.__tri_order: Optional[np.ndarray] = None
+
+	@property
+	def corner_loops(self) -> np.ndarray:
+		"""Source loops of the nearest triangle to each target corner"""
+		return self.vert_loops[self.loop_vert]
+
+	@property
+	def corner_weights(self) -> np.ndarray:
+		"""Barycentric weights of the nearest triangle to each target corner"""
+		return self.vert_weights[self.loop_vert]
+
+	def unenclosed_corners(self) -> np.ndarray:
+		"""Target corners whose nearest source face differs from the face nearest to their polygon"""
+		return np.nonzero(self.vert_face[self.loop_vert] != self.poly_face[self.loop_poly])[0]
+
+	def vertex_values(self, values: np.ndarray) -> np.ndarray:
+		"""Interpolates per-vertex source values onto target vertices"""
+		return np.einsum("ij,ij...->i...", self.vert_weights, values[self.vert_verts])
+
+	def corner_values(self, values: np.ndarray) -> np.ndarray:
+		"""Interpolates per-corner source values onto target corners"""
+		return np.einsum("ij,ij...->i...", self.corner_weights, values[self.corner_loops])
+
+	def source_bmesh(self) -> bmesh.types.BMesh:
+		"""BMesh of the source, used for face traversal"""
+		if not self.__bmesh:
+			self.__bmesh = bmesh.new()
+			self.__bmesh.from_mesh(self.source)
+			self.__bmesh.faces.ensure_lookup_table()
+		return self.__bmesh
+
+	def closest_on_face(self, face_index: int, p: mathutils.Vector) -> "tuple[np.ndarray, np.ndarray]":
+		"""Returns the loops and weights of the closest point to `p` within a source face"""
+		if self.__tri_order is None:
+			(self.__tri_loops, self.__tri_verts, tri_poly) = source_triangles(self.source)
+			self.__tri_order = np.argsort(tri_poly, kind="stable")
+			self.__tri_starts = np.searchsorted(tri_poly[self.__tri_order], np.arange(len(self.source.polygons) + 1))
+			self.__source_co = read_array(self.source.vertices, "co", 3, np.float32)
+
+		best = None
+		for tri in self.__tri_order[self.__tri_starts[face_index]:self.__tri_starts[face_index + 1]]:
+			corners = [mathutils.Vector(self.__source_co[v]) for v in self.__tri_verts[tri]]
+			point = mathutils.geometry.closest_point_on_tri(p, *corners)
+			distance = (point - p).length
+			if best is None or distance < best[0]:
+				best = (distance, tri, corners, point)
+
+		(_, tri, corners, point) = best
+		weights = mathutils.interpolate.poly_3d_calc(corners, point)
+		return (self.__tri_loops[tri], np.array(weights, dtype=np.float32))
+
+	def free(self) -> None:
+		"""Frees the BMesh if one was built"""
+		if self.__bmesh:
+			self.__bmesh.free()
+			self.__bmesh = None
+
+class CorrespondenceCache:
+	"""
+	Shares correspondences between every proximity transfer in a layer application.\n
+	`folder` persists them as .npy files, leave it blank to keep them in memory only.\n
+	`workers` is the thread count used to compute them, zero uses every core.
+	"""
+	def __init__(self, folder: str="", workers: int=0):
+		self.folder = folder
+		self.workers = workers
+		self.__cache: dict[tuple[bpy.types.Mesh, bpy.types.Mesh], Optional[Correspondence]] = {}
+
+	def __load(self, path: str) -> "Optional[dict[str, np.ndarray]]":
+		"""Memory-maps saved arrays if they all exist"""
+		try:
+			return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in saved_arrays}
+		except (OSError, ValueError):
+			return None
+
+	def __save(self, path: str, arrays: "dict[str, np.ndarray]") -> None:
+		"""Writes arrays to a temporary folder, then renames it so readers never see partial data"""
+		temp_path = f"{path}.{os.getpid()}.tmp"
+		os.makedirs(temp_path, exist_ok=True)
+		for name in saved_arrays:
+			np.save(os.path.join(temp_path, f"{name}.npy"), arrays[name])
+		try:
+			os.rename(temp_path, path)
+		except OSError:
+			# Someone else saved it first, theirs is identical
+			shutil.rmtree(temp_path, ignore_errors=True)
+
+	def get(self, obj_source: bpy.types.Object, obj_target: bpy.types.Object) -> Optional[Correspondence]:
+		"""
+		Gets the correspondence from a target mesh onto a source mesh, computing it if needed.\n
+		Returns None if the source has no faces.
+		"""
+		key = (obj_source.data, obj_target.data)
+		if key in self.__cache:
+			return self.__cache[key]
+
+		arrays = None
+		path = ""
+		if self.folder:
+			name = f"{digest_mesh(obj_source.data)}_{digest_mesh(obj_target.data)}"
+			path = os.path.join(self.folder, "correspondence", name)
+			arrays = self.__load(path)
+
+		if arrays is None:
+			arrays = compute_correspondence(obj_source.data, obj_target.data, self.workers)
+			if arrays is not None and path:
+				self.__save(path, arrays)
+
+		corr = Correspondence(obj_source.data, obj_target.data, arrays) if arrays is not None else None
+		self.__cache[key] = corr
+		return corr
+
+	def free(self) -> None:
+		"""Frees everything held by cached correspondences"""
+		for corr in self.__cache.values():
+			if corr:
+				corr.free()
+		self.__cache.clear()
@@ -0,0 +1,127 @@
+import bpy
+import numpy as np
+
+from .utils import *
+
+# Legacy curves have no flat point collection, so points are read and written per spline.
+# Each spline still goes through foreach_get/foreach_set, so long splines stay cheap.
+# Curves with shape keys are drawn from the key blocks, which move by the same offsets as the points.
+
+# foreach property, values per item and array type for each point setting
+# Handle types go before handles, since changing them can recalculate handles
+bezier_layouts = [
+	("co", 3, np.float32),
+	("handle_left_type", 1, np.int32),
+	("handle_right_type", 1, np.int32),
+	("handle_left", 3, np.float32),
+	("handle_right", 3, np.float32),
+	("radius", 1, np.float32),
+	("tilt", 1, np.float32),
+	("weight_softbody", 1, np.float32),
+]
+point_layouts = [
+	("co", 4, np.float32),
+	("weight", 1, np.float32),
+	("radius", 1, np.float32),
+	("tilt", 1, np.float32),
+	("weight_softbody", 1, np.float32),
+]
+
+# Geometry settings, material_index is left to surfacing
+# Order depends on the point count, so it goes last
+spline_settings = [
+	"use_cyclic_u", "use_cyclic_v", "use_endpoint_u", "use_endpoint_v", "use_bezier_u", "use_bezier_v",
+	"resolution_u", "resolution_v", "use_smooth", "tilt_interpolation", "radius_interpolation", "order_u", "order_v",
+]
+curve_settings = [
+	"dimensions", "resolution_u", "resolution_v", "render_resolution_u", "render_resolution_v",
+	"twist_mode", "twist_smooth", "use_fill_deform", "fill_mode", "offset", "extrude",
+	"bevel_mode", "bevel_depth", "bevel_resolution", "use_fill_caps", "use_map_taper", "taper_radius_mode",
+]
+
+def spline_points(spline: bpy.types.Spline):
+	"""Returns the point collection and layouts used by a spline"""
+	if spline.type == "BEZIER":
+		return (spline.bezier_points, bezier_layouts)
+	return (spline.points, point_layouts)
+
+def match_curve_topology(a: bpy.types.Curve, b: bpy.types.Curve) -> bool:
+	"""Checks if two curves have the same spline types and point counts"""
+	if len(a.splines) != len(b.splines):
+		return False
+	for spline_a, spline_b in zip(a.splines, b.splines):
+		if spline_a.type != spline_b.type:
+			return False
+		if len(spline_points(spline_a)[0]) != len(spline_points(spline_b)[0]):
+			return False
+	return True
+
+def curve_positions(curve: bpy.types.Curve) -> "tuple[np.ndarray, np.ndarray, np.ndarray]":
+	"""Returns points, left and right handles of every spline, in shape key order"""
+	co = []
+	left = []
+	right = []
+	for spline in curve.splines:
+		(points, _) = spline_points(spline)
+		if spline.type == "BEZIER":
+			co.append(read_array(points, "co", 3, np.float32))
+			left.append(read_array(points, "handle_left", 3, np.float32))
+			right.append(read_array(points, "handle_right", 3, np.float32))
+		else:
+			# Shape keys don't store the weight, other splines have no handles
+			points_co = read_array(points, "co", 4, np.float32)[:, :3].reshape(-1, 3)
+			co.append(points_co)
+			left.append(points_co)
+			right.append(points_co)
+	if not co:
+		empty = np.empty((0, 3), dtype=np.float32)
+		return (empty, empty, empty)
+	return (np.concatenate(co), np.concatenate(left), np.concatenate(right))
+
+def offset_shape_keys(curve: bpy.types.Curve, offsets: "tuple[np.ndarray, np.ndarray, np.ndarray]") -> None:
+	"""Moves every shape key of a curve by per-point offsets from `curve_positions`"""
+	if not curve.splines:
+		return
+	bezier = np.concatenate([np.full(len(spline_points(spline)[0]), spline.type == "BEZIER") for spline in curve.splines])
+	for key in curve.shape_keys.key_blocks:
+		if bezier.all() or not bezier.any():
+			props = ["co", "handle_left", "handle_right"] if bezier.any() else ["co"]
+			for prop, offset in zip(props, offsets):
+				values = read_array(key.data, prop, 3, np.float32)
+				key.data.foreach_set(prop, (values + offset).ravel())
+			continue
+		# Bezier and other key points can't be read in bulk together
+		for i, point in enumerate(key.data):
+			point.co = offsets[0][i] + np.array(point.co, dtype=np.float32)
+			if bezier[i]:
+				point.handle_left = offsets[1][i] + np.array(point.handle_left, dtype=np.float32)
+				point.handle_right = offsets[2][i] + np.array(point.handle_right, dtype=np.float32)
+
+def transfer_curve_geometry(source: bpy.types.Curve, target: bpy.types.Curve, id_map: dict) -> None:
+	"""
+	Copies point positions, handles, radii and tilts in place, the topology must match.\n
+	Shape keys are moved by the same offsets. Materials and spline material indices are left untouched.
+	"""
+	for key in curve_settings:
+		setattr(target, key, getattr(source, key))
+	# Bevel and taper objects should point at our own objects
+	target.bevel_object = id_map.get(source.bevel_object, source.bevel_object)
+	target.taper_object = id_map.get(source.taper_object, source.taper_object)
+
+	has_keys = target.shape_keys and len(target.shape_keys.key_blocks)
+	if has_keys:
+		old = curve_positions(target)
+
+	for spline_source, spline_target in zip(source.splines, target.splines):
+		(points_source, layouts) = spline_points(spline_source)
+		points_target = spline_points(spline_target)[0]
+		for (prop, width, dtype) in layouts:
+			values = read_array(points_source, prop, width, dtype)
+			points_target.foreach_set(prop, values.ravel())
+		for key in spline_settings:
+			setattr(spline_target, key, getattr(spline_source, key))
+
+	if has_keys:
+		new = curve_positions(target)
+		offset_shape_keys(target, tuple(n - o for n, o in zip(new, old)))
+	target.update_tag()
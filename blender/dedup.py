@@ -0,0 +1,115 @@
+from typing import Any, Optional
+import bpy, os, hashlib
+
+from .digest import digest_file
+
+# Every append brings its own copies of shared textures and materials, eg. "tex", "tex.001".
+# Duplicates are remapped to one canonical block and removed, so each pixel buffer exists once.
+# Images are grouped by settings and size first, so files are only hashed when they could match.
+
+class DedupReport:
+	"""Results of a deduplication pass"""
+	def __init__(self):
+		self.images = 0
+		self.materials = 0
+		self.bytes_freed = 0
+
+	def __str__(self) -> str:
+		megabytes = self.bytes_freed / (1024 * 1024)
+		return f"Removed {self.images} duplicate images and {self.materials} duplicate materials, freeing {megabytes:.1f} MB"
+
+def image_path(image: bpy.types.Image) -> str:
+	"""Absolute path of an image file, normalized so different spellings match"""
+	path = bpy.path.abspath(image.filepath, library=image.library)
+	return os.path.normcase(os.path.normpath(path))
+
+def image_size_key(image: bpy.types.Image) -> Optional[tuple]:
+	"""Cheap key grouping images which could be identical, None if it can't be deduplicated"""
+	# Generated images have no file, painted ones differ from their file or packed data until saved
+	if image.source != "FILE" or image.is_dirty:
+		return None
+	settings = (image.colorspace_settings.name, image.alpha_mode)
+	if image.packed_file:
+		return settings + ("packed", image.packed_file.size)
+	try:
+		return settings + ("file", os.path.getsize(image_path(image)))
+	except OSError:
+		return None
+
+def image_digest(image: bpy.types.Image) -> Optional[str]:
+	"""Hashes the contents of an image, packed or on disk"""
+	if image.packed_file:
+		return hashlib.blake2b(image.packed_file.data, digest_size=16).hexdigest()
+	return digest_file(image_path(image))
+
+def image_memory(image: bpy.types.Image) -> int:
+	"""Size of the loaded pixel buffer, zero if it isn't loaded"""
+	if not image.has_data:
+		return 0
+	(width, height) = image.size
+	return width * height * image.channels * (4 if image.is_float else 1)
+
+def canonical_order(block: Any) -> tuple:
+	"""Prefers linked blocks, then the original name over ".001" copies"""
+	return (block.library is None, len(block.name), block.name)
+
+def remap_duplicates(groups: "dict[Any, list[Any]]") -> "list[tuple[Any, Any]]":
+	"""Remaps every group to its canonical block, returns (canonical, duplicate) pairs"""
+	removed = []
+	for blocks in groups.values():
+		if len(blocks) < 2:
+			continue
+		blocks = sorted(blocks, key=canonical_order)
+		canonical = blocks[0]
+		for block in blocks[1:]:
+			# Linked blocks belong to their library
+			if block.library:
+				continue
+			block.user_remap(canonical)
+			removed.append((canonical, block))
+	return removed
+
+def dedup_images(report: DedupReport) -> None:
+	"""Merges images with identical settings and contents"""
+	candidates: dict[tuple, list[bpy.types.Image]] = {}
+	for image in bpy.data.images:
+		key = image_size_key(image)
+		if key:
+			candidates.setdefault(key, []).append(image)
+
+	groups: dict[tuple, list[bpy.types.Image]] = {}
+	for key, images in candidates.items():
+		if len(images) < 2:
+			continue
+		for image in images:
+			digest = image_digest(image)
+			if digest:
+				groups.setdefault(key + (digest,), []).append(image)
+
+	for (canonical, image) in remap_duplicates(groups):
+		# Loaded twice means the canonical one is already in memory
+		report.bytes_freed += image_memory(image)
+		bpy.data.images.remove(image)
+		report.images += 1
+
+def dedup_materials(report: DedupReport) -> None:
+	"""Merges published materials with the same ID and version"""
+	groups: dict[tuple, list[bpy.types.Material]] = {}
+	for mat in bpy.data.materials:
+		id = mat.get("sg_id")
+		if id:
+			groups.setdefault((id, mat.get("sg_version")), []).append(mat)
+
+	for (canonical, mat) in remap_duplicates(groups):
+		bpy.data.materials.remove(mat)
+		report.materials += 1
+
+def dedup_data() -> DedupReport:
+	"""Merges duplicate images and materials, run after loading or appending data"""
+	report = DedupReport()
+	# Images first, merged materials are compared by ID so their images don't matter
+	dedup_images(report)
+	dedup_materials(report)
+	if report.images or report.materials:
+		print(report)
+	return report
@@ -0,0 +1,77 @@
+from typing import Any, Optional
+import bpy, hashlib, os
+import numpy as np
+
+# Digests are used for change detection, eg. whether a modifier needs rebinding.
+# Everything is read through foreach_get, looping vertices in Python is way too slow.
+
+def _hash_array(hasher: Any, collection: Any, prop: str, count: int, dtype: Any) -> None:
+	"""Feeds a bulk property read into a hasher"""
+	values = np.empty(count, dtype=dtype)
+	if count:
+		collection.foreach_get(prop, values)
+	hasher.update(values.tobytes())
+
+def digest_mesh(mesh: bpy.types.Mesh) -> str:
+	"""Hashes the positions and connectivity of a mesh"""
+	hasher = hashlib.blake2b(digest_size=16)
+	sizes = [len(mesh.vertices), len(mesh.edges), len(mesh.loops), len(mesh.polygons)]
+	hasher.update(np.array(sizes, dtype=np.int64).tobytes())
+	_hash_array(hasher, mesh.vertices, "co", len(mesh.vertices) * 3, np.float32)
+	_hash_array(hasher, mesh.edges, "vertices", len(mesh.edges) * 2, np.int32)
+	_hash_array(hasher, mesh.loops, "vertex_index", len(mesh.loops), np.int32)
+	_hash_array(hasher, mesh.polygons, "loop_start", len(mesh.polygons), np.int32)
+	return hasher.hexdigest()
+
+def digest_lattice(lattice: bpy.types.Lattice) -> str:
+	"""Hashes the resolution and deformed points of a lattice"""
+	hasher = hashlib.blake2b(digest_size=16)
+	sizes = [lattice.points_u, lattice.points_v, lattice.points_w]
+	hasher.update(np.array(sizes, dtype=np.int64).tobytes())
+	_hash_array(hasher, lattice.points, "co_deform", len(lattice.points) * 3, np.float32)
+	return hasher.hexdigest()
+
+def digest_geometry(obj: bpy.types.Object) -> Optional[str]:
+	"""
+	Hashes the original (unevaluated) geometry of an object.\n
+	Returns None for types we can't hash, treat that as always changed.
+	"""
+	if obj.type == "MESH":
+		return digest_mesh(obj.data)
+	elif obj.type == "LATTICE":
+		return digest_lattice(obj.data)
+	return None
+
+def digest_values(values: "list[Any]") -> str:
+	"""Hashes a list of plain values, such as modifier settings"""
+	hasher = hashlib.blake2b(digest_size=16)
+	for value in values:
+		if hasattr(value, "__len__") and not isinstance(value, str):
+			# Vectors and matrices, rounded to avoid float noise
+			value = np.round(np.array(value, dtype=np.float64), 6).tobytes()
+		hasher.update(repr(value).encode())
+		hasher.update(b"\0")
+	return hasher.hexdigest()
+
+# File digests by (path, size, modified time), textures are big and rarely change
+_file_digests: "dict[tuple[str, int, int], str]" = {}
+
+def digest_file(path: str) -> Optional[str]:
+	"""Hashes the contents of a file, returns None if it can't be read"""
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	key = (path, stat.st_size, stat.st_mtime_ns)
+	digest = _file_digests.get(key)
+	if digest is None:
+		hasher = hashlib.blake2b(digest_size=16)
+		try:
+			with open(path, "rb") as file:
+				for chunk in iter(lambda: file.read(1 << 20), b""):
+					hasher.update(chunk)
+		except OSError:
+			return None
+		digest = hasher.hexdigest()
+		_file_digests[key] = digest
+	return digest
@@ -0,0 +1,196 @@
+from typing import Optional
+import bpy, os, tempfile, time
+
+from .utils import *
+from .versioning import *
+from .dedup import *
+from .leaks import tracked_types
+
+# Scene assembly fetches hundreds of builds. Resolving them together means each build file is
+# opened by a single library load, and root collections are linked in one pass at the end.
+
+# Linking keeps builds in their own files, nothing is copied into the shot until it's overridden.
+# Overrides start as system overrides, which can't be edited and stay cheap. Only objects
+# the artist makes editable become user overrides.
+# Comparing loads the same builds appended into temporary data, so the shot is left alone.
+
+class AppendBaseline:
+	"""Memory and shot file size appending builds would cost"""
+	def __init__(self):
+		self.memory = 0
+		self.blocks = 0
+		self.bytes_written = 0
+
+class FetchReport:
+	"""Results of a batch fetch"""
+	def __init__(self, link: bool=False):
+		self.link = link
+		self.collections: list[bpy.types.Collection] = []
+		self.missing: list[str] = []
+		self.files = 0
+		self.bytes_read = 0
+		self.memory = 0
+		self.seconds = 0.0
+		self.dedup: Optional[DedupReport] = None
+		# What appending the same builds costs, only measured when comparing
+		self.append: Optional[AppendBaseline] = None
+
+	def __str__(self) -> str:
+		megabytes = self.bytes_read / (1024 * 1024)
+		memory = self.memory / (1024 * 1024)
+		mode = "Linked" if self.link else "Appended"
+		report = f"{mode} {len(self.collections)} assets from {self.files} build files ({megabytes:.1f} MB on disk) in {self.seconds:.2f}s, memory {memory:+.1f} MB"
+		if self.append:
+			append_memory = self.append.memory / (1024 * 1024)
+			saved = self.append.bytes_written / (1024 * 1024)
+			report += f". Appending would use {append_memory:+.1f} MB memory ({append_memory - memory:+.1f} MB more) and add {self.append.blocks} data blocks"
+			report += f", {saved:.1f} MB linking keeps out of the shot file"
+		if self.dedup and (self.dedup.images or self.dedup.materials):
+			report += f". {self.dedup}"
+		return report
+
+def parse_fetch_list(text: str) -> "list[tuple[str, int]]":
+	"""
+	Parses assets to fetch, separated by commas or spaces.\n
+	Versions are pinned with `@`, eg. `"tree, rock@3"`. Unpinned assets use the latest version.
+	"""
+	requests = []
+	for item in text.replace(",", " ").split():
+		(asset, _, version) = item.partition("@")
+		if not asset:
+			continue
+		requests.append((asset, int(version) if version.isdigit() else 0))
+	return requests
+
+def resolve_builds(requests: "list[tuple[str, int]]", database: str) -> "tuple[dict[str, list[str]], list[str]]":
+	"""
+	Resolves (asset, version) pairs to build files.\n
+	Returns the assets to load per file, and requests which don't have a build.
+	"""
+	versions = build_versions(database, [asset for (asset, _) in requests])
+	files: dict[str, list[str]] = {}
+	missing = []
+	for (asset, version) in requests:
+		path = find_version(versions[asset], version)
+		if not path:
+			missing.append(f"{asset}@{version}" if version > 0 else asset)
+			continue
+		assets = files.setdefault(path, [])
+		# Requesting the same build twice only loads it once
+		if asset not in assets:
+			assets.append(asset)
+	return (files, missing)
+
+def root_collection(names: "list[str]", asset: str) -> Optional[str]:
+	"""Finds the root collection of a build, it's named after the asset"""
+	if asset in names:
+		return asset
+	# Assume top collection is the root we need to import
+	return names[0] if names else None
+
+def load_roots(data: bpy.types.BlendData, files: "dict[str, list[str]]", link: bool) -> "list[bpy.types.Collection]":
+	"""Loads the root collections of builds into `data`, one library load per file"""
+	loaded = []
+	for path, assets in files.items():
+		with data.libraries.load(path, link=link) as (source_data, target_data):
+			names = [root_collection(source_data.collections, asset) for asset in assets]
+			target_data.collections = list(dict.fromkeys(name for name in names if name))
+		loaded.extend(col for col in target_data.collections if col)
+	return loaded
+
+def measure_append(files: "dict[str, list[str]]") -> AppendBaseline:
+	"""
+	Appends builds into temporary data, which is freed afterwards.\n
+	Data blocks are written to a temporary file to measure what they'd add to the shot file.
+	Deduplication against the shot isn't included.
+	"""
+	baseline = AppendBaseline()
+	memory = get_memory_usage()
+	with bpy.data.temp_data() as temp_data:
+		loaded = load_roots(temp_data, files, False)
+		baseline.memory = get_memory_usage() - memory
+		baseline.blocks = sum(len(getattr(temp_data, data_type)) for data_type in tracked_types if hasattr(temp_data, data_type))
+		path = os.path.join(tempfile.gettempdir(), f"shitgrid_append_{os.getpid()}.blend")
+		try:
+			temp_data.libraries.write(path, set(loaded))
+			baseline.bytes_written = os.path.getsize(path)
+		finally:
+			if os.path.exists(path):
+				os.remove(path)
+	return baseline
+
+def fetch_builds(requests: "list[tuple[str, int]]", parent: Optional[bpy.types.Collection]=None, link: bool=False, compare: bool=False) -> FetchReport:
+	"""
+	Appends the root collections of many asset builds.\n
+	`parent` defaults to the scene collection.\n
+	`link` links read-only builds instead, see `make_editable` to edit them.
+	`compare` also measures appending them, to report what linking saves.
+	"""
+	start = time.perf_counter()
+	memory = get_memory_usage()
+	report = FetchReport(link)
+	(files, report.missing) = resolve_builds(requests, get_preferences().database)
+
+	loaded = load_roots(bpy.data, files, link)
+	report.files = len(files)
+	report.bytes_read = sum(os.path.getsize(path) for path in files)
+
+	# Add to our Scene Collection in one go
+	if not parent:
+		parent = bpy.context.scene.collection
+	for col in loaded:
+		parent.children.link(col)
+	report.collections = loaded
+	# Builds share studio textures and materials
+	report.dedup = dedup_data()
+	report.memory = get_memory_usage() - memory
+	report.seconds = time.perf_counter() - start
+
+	if compare and link:
+		report.append = measure_append(files)
+	return report
+
+def linked_root(obj: bpy.types.Object, scene: bpy.types.Scene) -> Optional[bpy.types.Collection]:
+	"""Finds the linked build collection an object was fetched with"""
+	for col in scene.collection.children:
+		# Linked names can clash with local ones, so compare the blocks
+		if col.library and obj in col.all_objects[:]:
+			return col
+	return None
+
+def make_editable(objs: "list[bpy.types.Object]", context: bpy.types.Context) -> "list[bpy.types.Object]":
+	"""
+	Overrides linked builds containing the objects, returns the editable overrides.\n
+	Only the given objects become editable, the rest of the build stays a system override.
+	"""
+	editable = []
+	overrides: dict[bpy.types.Collection, bpy.types.Collection] = {}
+	for obj in objs:
+		if obj.override_library and obj.override_library.is_system_override:
+			# Already overridden, just unlock it
+			obj.override_library.is_system_override = False
+			editable.append(obj)
+			continue
+		if not obj.library:
+			continue
+		root = linked_root(obj, context.scene)
+		if not root:
+			print(f"WARNING: '{obj.name}' wasn't fetched as a linked build, skipping")
+			continue
+
+		if root not in overrides:
+			override = root.override_hierarchy_create(context.scene, context.view_layer)
+			# The override replaces the linked collection in our scene
+			children = context.scene.collection.children
+			if root in children[:]:
+				children.unlink(root)
+			if override not in children[:]:
+				children.link(override)
+			overrides[root] = override
+
+		for obj_override in overrides[root].all_objects:
+			if obj_override.override_library and obj_override.override_library.reference == obj:
+				obj_override.override_library.is_system_override = False
+				editable.append(obj_override)
+				break
+	return editable
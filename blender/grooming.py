@@ -0,0 +1,71 @@
+from typing import Optional
+import bpy
+import numpy as np
+
+from .utils import *
+
+# Grooms have millions of points, so everything here goes through foreach_get/foreach_set.
+# Positions are just the "position" point attribute, so they're transferred with the rest.
+
+# foreach property, values per item and array type for each attribute type
+attribute_layouts = {
+	"FLOAT": ("value", 1, np.float32),
+	"INT": ("value", 1, np.int32),
+	"INT8": ("value", 1, np.int32),
+	"BOOLEAN": ("value", 1, bool),
+	"FLOAT2": ("vector", 2, np.float32),
+	"FLOAT_VECTOR": ("vector", 3, np.float32),
+	"FLOAT_COLOR": ("color", 4, np.float32),
+	"BYTE_COLOR": ("color", 4, np.float32),
+	"INT32_2D": ("value", 2, np.int32),
+	"QUATERNION": ("value", 4, np.float32),
+	"FLOAT4X4": ("value", 16, np.float32),
+}
+
+def match_curves_topology(a: bpy.types.Curves, b: bpy.types.Curves) -> bool:
+	"""Checks if two hair curves have the same curve and point counts"""
+	if len(a.curves) != len(b.curves) or len(a.points) != len(b.points):
+		return False
+	points_a = read_array(a.curves, "points_length", 1, np.int32)
+	points_b = read_array(b.curves, "points_length", 1, np.int32)
+	return np.array_equal(points_a, points_b)
+
+def transfer_curves_attributes(source: bpy.types.Curves, target: bpy.types.Curves) -> None:
+	"""Copies every generic curve and point attribute in bulk, the counts must match"""
+	for attr_source in source.attributes:
+		if attr_source.domain not in {"POINT", "CURVE"}:
+			continue
+		layout = attribute_layouts.get(attr_source.data_type)
+		if not layout:
+			print(f"WARNING: Can't transfer {attr_source.data_type} attribute '{attr_source.name}'")
+			continue
+
+		attr_target = target.attributes.get(attr_source.name)
+		if attr_target and (attr_target.data_type != attr_source.data_type or attr_target.domain != attr_source.domain):
+			target.attributes.remove(attr_target)
+			attr_target = None
+		if not attr_target:
+			attr_target = target.attributes.new(attr_source.name, attr_source.data_type, attr_source.domain)
+
+		(prop, width, dtype) = layout
+		values = read_array(attr_source.data, prop, width, dtype)
+		attr_target.data.foreach_set(prop, values.ravel())
+
+	# Remove attributes the groom doesn't have anymore
+	# Removing reallocates the attributes, so look each one up again by name
+	stale = [attr.name for attr in target.attributes if attr.domain in {"POINT", "CURVE"} and attr.name not in source.attributes]
+	for name in stale:
+		attr_target = target.attributes.get(name)
+		if not attr_target:
+			continue
+		try:
+			target.attributes.remove(attr_target)
+		except RuntimeError:
+			# Built-in attributes can't be removed
+			pass
+	target.update_tag()
+
+def attach_surface(source: bpy.types.Curves, target: bpy.types.Curves, id_map: dict) -> None:
+	"""Attaches hair curves to our own copy of the surface object"""
+	target.surface = id_map.get(source.surface, source.surface)
+	target.surface_uv_map = source.surface_uv_map
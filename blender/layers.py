@@ -1,9 +1,15 @@
 import bpy
+import numpy as np
 from abc import ABCMeta, abstractmethod
 
 from .transfer_map import *
 from .utils import *
 from .utils_kitsu import *
+from .vertex_groups import *
+from .rigging import *
+from .grooming import *
+from .animation import *
+from .assembly import *
 
 # Required properties for all layer classes
 class LayerBase(ABCMeta):
@@ -34,6 +40,11 @@ class LayerModelling(LayerBase):
 
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
+		# Binds are slow, batch them at the end so digests can be shared
+		rebind_objs = []
+		# Proximity lookups are shared by every transfer in this layer
+		correspondences = CorrespondenceCache(settings.cache_folder, settings.workers)
+
 		# Handle new models
 		for obj in map.new_objs:
 			if obj.type in __class__.object_blacklist:
@@ -61,7 +72,7 @@ class LayerModelling(LayerBase):
 
 			# Transfer modifiers
 			remap_new_modifiers(obj, map)
-			rebind_modifiers(obj)
+			rebind_objs.append(obj)
 
 		# Handle deleted models
 		for obj in map.deleted_objs:
@@ -70,46 +81,47 @@ class LayerModelling(LayerBase):
 			bpy.data.objects.remove(obj)
 		map.remove_blank_collections()
 
-		# Handle matching models
-		for obj_target, obj_source in map.matching_objs.items():
-			
-			# Copy world space transform
-			if settings.update_transform:
-				copy_transform(obj_source, obj_target)
+		# Handle matching models, data shared by several objects is only updated once
+		for group in map.matching_by_data().values():
+			(obj_target, obj_source) = group[0]
 
 			topo_match = match_topology(obj_source, obj_target)
-			if topo_match:
+			# Reordered meshes can still use the fast path
+			remap = None
+			if not topo_match and obj_source.type == "MESH" and obj_target.type == "MESH":
+				remap = match_topology_remap(obj_source.data, obj_target.data)
+				if remap:
+					print(f"Topology of '{obj_target.name}' matches after reordering")
+
+			if topo_match or remap:
 				if obj_target.type == "MESH":
 					# Transfer position attribute (keeping shapekeys intact)
 					if not obj_target.data.vertices:
 						print(f"WARNING: Mesh object '{obj_target.name}' has empty object data")
 						continue
-					offset = [obj_source.data.vertices[i].co - obj_target.data.vertices[i].co for i in range(len(obj_source.data.vertices))]
-					offset_sum = 0
-					for x in offset:
-						offset_sum += x.length
-					offset_avg = offset_sum / len(offset)
+					source_co = read_array(obj_source.data.vertices, "co", 3, np.float32)
+					if remap:
+						source_co = source_co[remap.verts]
+					offset = source_co - read_array(obj_target.data.vertices, "co", 3, np.float32)
+					offset_avg = np.linalg.norm(offset, axis=1).mean()
 					if offset_avg > 0.1:
 						print(f"Average vertex offset is {offset_avg} for {obj_target.name}")
 
-					for i, vec in enumerate(offset):
-						obj_target.data.vertices[i].co += vec
+					obj_target.data.vertices.foreach_set("co", source_co.ravel())
 
 					# Update shapekeys
 					if obj_target.data.shape_keys:
 						for key in obj_target.data.shape_keys.key_blocks:
-							for i, point in enumerate([dat.co for dat in key.data]):
-								key.data[i].co = point + offset[i]
+							points = read_array(key.data, "co", 3, np.float32)
+							key.data.foreach_set("co", (points + offset).ravel())
+
+					# Update vertex group weights, copied by index
+					transfer_vertex_groups(obj_source, obj_target, remap)
+					obj_target.data.update()
 
 				elif obj_target.type == "CURVE":
-					# TODO: Geometry transfer for curves
-					obj_target_original = bpy.data.objects.new(f"{obj_target.name}.original", obj_target.data)
-					# This overrides material data
-					obj_target.data = obj_source.data
-					# Try to restore material data (slow)
-					if not settings.replacing_materials:
-						transfer_surfacing(obj_target_original, obj_target, topo_match)
-					bpy.data.objects.remove(obj_target_original)
+					# Update points in place, materials are kept
+					transfer_curve_geometry(obj_source.data, obj_target.data, map.matching_objs_target)
 			else:
 				# If topology doesn't match, replace object data and proximity transfer shapekeys
 				print(f"WARNING: Topology Mismatch! Replacing object data and transferring with potential data loss on '{obj_target.name}'")
@@ -123,52 +135,59 @@ class LayerModelling(LayerBase):
 
 				# This overrides material data
 				obj_target.data = obj_source.data
+				corr = None
+				needs_corr = not settings.replacing_materials or has_keys or obj_target_original.vertex_groups
+				# Proximity lookups only work between meshes
+				if obj_target.type == "MESH" and needs_corr:
+					corr = correspondences.get(obj_target_original, obj_target)
 				# Try to restore material data (slow)
 				if not settings.replacing_materials:
-					transfer_surfacing(obj_target_original, obj_target, topo_match)
+					transfer_surfacing(obj_target_original, obj_target, topo_match, corr)
 
-				if obj_target_original.vertex_groups:
+				if obj_target_original.vertex_groups and corr:
 					# Transfer vertex groups
-					bpy.ops.object.data_transfer(
-						{
-							"object": obj_target_original,
-							"active_object": obj_target_original,
-							"selected_editable_objects": [obj_target],
-						},
-						data_type="VGROUP_WEIGHTS",
-						use_create=True,
-						vert_mapping='POLYINTERP_NEAREST',
-						layers_select_src="ALL",
-						layers_select_dst="NAME",
-						mix_mode="REPLACE",
-					)
+					transfer_vertex_groups(obj_target_original, obj_target, corr=corr)
 				
-				if has_keys:
+				if has_keys and obj_target.type == "MESH":
 					# Transfer shapekeys
-					transfer_shapekeys_proximity(obj_target_original, obj_target)
+					transfer_shapekeys_proximity(obj_target_original, obj_target, corr)
 					# Transfer shapekey drivers
 					copy_drivers(sk_original, obj_target.data.shape_keys)
 					del sk_original
 
 				bpy.data.objects.remove(obj_target_original)
 
-			# Remove old modifiers
-			# UPDATE: For now, don't remove any
+			# The data may have been replaced, objects sharing it should follow
+			data_target = obj_target.data
+			for obj_target, obj_source in group:
+				if obj_target.data != data_target:
+					obj_target.data = data_target
 
-			#for mod in obj_target.modifiers:
-				#if mod.name not in __class__.modifier_whitelist and mod.name not in [m.name for m in obj_source.modifiers]:
-					#print(f"Removing modifier {mod.name}")
-					#obj_target.modifiers.remove(mod)
+				# Copy world space transform
+				if settings.update_transform:
+					copy_transform(obj_source, obj_target)
+
+				# Remove old modifiers
+				# UPDATE: For now, don't remove any
+
+				#for mod in obj_target.modifiers:
+					#if mod.name not in __class__.modifier_whitelist and mod.name not in [m.name for m in obj_source.modifiers]:
+						#print(f"Removing modifier {mod.name}")
+						#obj_target.modifiers.remove(mod)
 			
-			# Transfer modifiers
-			transfer_new_modifiers(obj_source, obj_target)
-			remap_modifiers(obj_source, obj_target, map)
-			rebind_modifiers(obj_target)
+				# Transfer modifiers
+				transfer_new_modifiers(obj_source, obj_target)
+				remap_modifiers(obj_source, obj_target, map)
+				rebind_objs.append(obj_target)
 
-			# Ensure object version matches
-			transfer_version(obj_source, obj_target)
-			# Ensure mesh version matches
-			transfer_version(obj_source.data, obj_target.data)
+				# Ensure object version matches
+				transfer_version(obj_source, obj_target)
+				# Ensure mesh version matches
+				transfer_version(obj_source.data, obj_target.data)
+
+		# Only rebinds modifiers whose inputs changed
+		rebind_modifiers_batch(rebind_objs)
+		correspondences.free()
 
 class LayerMaterials(LayerBase):
 	"""
@@ -187,72 +206,263 @@ class LayerMaterials(LayerBase):
 	
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
-		# Handle matching materials
-		for obj_target, obj_source in map.matching_objs.items():
+		# Proximity lookups are shared by every transfer in this layer
+		correspondences = CorrespondenceCache(settings.cache_folder, settings.workers)
+
+		# Handle matching materials, data shared by several objects is only updated once
+		for group in map.matching_by_data().values():
+			(obj_target, obj_source) = group[0]
 			topo_match = match_topology(obj_source, obj_target)
-			if not topo_match:
+			corr = None
+			remap = None
+			if not topo_match and obj_source.type == "MESH" and obj_target.type == "MESH":
+				# Reordered meshes can still transfer by index
+				remap = match_topology_remap(obj_source.data, obj_target.data)
+				if not remap:
+					print(f"WARNING: Mismatching topology, falling back to proximity transfer. (Object '{obj_target.name}')")
+					corr = correspondences.get(obj_source, obj_target)
+			elif not topo_match:
 				print(f"WARNING: Mismatching topology, falling back to proximity transfer. (Object '{obj_target.name}')")
-			transfer_surfacing(obj_source, obj_target, topo_match)
+			transfer_surfacing_data(obj_source, obj_target, topo_match, corr, remap)
+
+			# Material slots live on the object
+			for obj_target, obj_source in group:
+				transfer_material_slots(obj_source, obj_target)
+
+		correspondences.free()
 
 class LayerGrooming(LayerBase):
 	"""
 	# GROOMING LAYER
-	TODO
+	Adds, removes and transfers hair curves into the current scene.\n
+	When curve and point counts match, attributes are moved in bulk. Otherwise the data is replaced.
 	"""
 	folder = "grooms"
-	label = "(TODO) Grooming"
+	label = "Grooming"
 	# Sub-object data blocks which could be part of this layer
 	trigger_update = ["hair_curves"]
 
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
-		print("TODO")
-		# TODO
+		# Surfaces should point at our own objects
+		id_map = dict(map.matching_objs_target)
+
+		# Handle new grooms
+		for obj in map.new_objs:
+			if obj.type != "CURVES":
+				continue
+			# Rebuild collection hierarchy
+			parent = map.rebuild_collection_parents(obj)
+			parent.objects.link(obj)
+			attach_surface(obj.data, obj.data, id_map)
+			remap_new_modifiers(obj, map)
+
+		# Handle deleted grooms
+		for obj in map.deleted_objs:
+			if obj.type != "CURVES":
+				continue
+			bpy.data.objects.remove(obj)
+		map.remove_blank_collections()
+
+		# Handle matching grooms
+		for obj_target, obj_source in map.matching_objs.items():
+			if obj_target.type != "CURVES" or obj_source.type != "CURVES":
+				continue
+
+			if settings.update_transform:
+				copy_transform(obj_source, obj_target)
+
+			if match_curves_topology(obj_source.data, obj_target.data):
+				transfer_curves_attributes(obj_source.data, obj_target.data)
+			else:
+				print(f"WARNING: Curve count mismatch! Replacing groom data on '{obj_target.name}'")
+				obj_target_original = bpy.data.objects.new(f"{obj_target.name}.original", obj_target.data)
+				# Parent and constraints live on the object, so they're kept
+				obj_target.data = obj_source.data
+				# Try to restore material data
+				if not settings.replacing_materials:
+					transfer_surfacing(obj_target_original, obj_target, False)
+				bpy.data.objects.remove(obj_target_original)
+			attach_surface(obj_source.data, obj_target.data, id_map)
+
+			# HACK: Armature constraints on grooms can lose their target when updating
+			for con in obj_target.constraints:
+				if con.type == "ARMATURE":
+					for t in con.targets:
+						if t.target == None:
+							t.target = obj_target.parent
+
+			transfer_new_modifiers(obj_source, obj_target)
+			remap_modifiers(obj_source, obj_target, map)
+
+			# Ensure object version matches
+			transfer_version(obj_source, obj_target)
+			# Ensure groom version matches
+			transfer_version(obj_source.data, obj_target.data)
 
 class LayerRigging(LayerBase):
 	"""
 	# RIGGING LAYER
-	TODO
+	Adds, removes and transfers armatures into the current scene.\n
+	Deformed objects get their vertex groups, shape keys, drivers and armature modifiers updated.
 	"""
 	folder = "rigs"
-	label = "(TODO) Rigging / Shape Keys / Vertex Groups"
+	label = "Rigging / Shape Keys / Vertex Groups"
 	# Sub-object data blocks which could be part of this layer
 	trigger_update = ["armatures", "shape_keys"]
 
+	@staticmethod
+	def is_rig(obj: bpy.types.Object) -> bool:
+		"""Armatures and helper objects (like bone shapes) published in this layer"""
+		return obj.type == "ARMATURE" or obj.get("sg_layer") == __class__.folder
+
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
-		print("TODO")
-		# TODO
+		# Drivers, constraints and parents should point at our own objects
+		id_map = dict(map.matching_objs_target)
+		# Proximity lookups are shared by every transfer in this layer
+		correspondences = CorrespondenceCache(settings.cache_folder, settings.workers)
+
+		# Handle new rigs
+		for obj in map.new_objs:
+			if not __class__.is_rig(obj):
+				continue
+			# Rebuild collection hierarchy
+			parent = map.rebuild_collection_parents(obj)
+			parent.objects.link(obj)
+			remap_new_modifiers(obj, map)
+
+		# Handle deleted rigs
+		for obj in map.deleted_objs:
+			if not __class__.is_rig(obj):
+				continue
+			bpy.data.objects.remove(obj)
+		map.remove_blank_collections()
+
+		# Armatures go first, so deformed objects can rely on their bones
+		matching = sorted(map.matching_objs.items(), key=lambda item: item[0].type != "ARMATURE")
+		for obj_target, obj_source in matching:
+			if obj_target.type == "ARMATURE" and obj_source.type == "ARMATURE":
+				transfer_armature(obj_source, obj_target, id_map)
+			else:
+				transfer_rigged_object(obj_source, obj_target, map, id_map, correspondences)
+
+			copy_rigging_object_data(obj_source, obj_target, id_map)
+			# Parenting changes the world transform, so copy it afterwards
+			if settings.update_transform:
+				copy_transform(obj_source, obj_target)
+
+			# Ensure object version matches
+			transfer_version(obj_source, obj_target)
+
+		correspondences.free()
 
 class LayerAssembly(LayerBase):
 	"""
 	# ASSEMBLY LAYER
-	TODO
+	Adds, removes and transfers placements and cameras into the current scene.\n
+	Placements instance one loaded build per asset, so repeated props share their data.
 	"""
 	folder = "assembly"
-	label = "(TODO) Assembly / Layout"
+	label = "Assembly / Layout"
 	# Sub-object data blocks which could be part of this layer
 	trigger_update = ["cameras"]
 
+	@staticmethod
+	def is_assembly(obj: bpy.types.Object) -> bool:
+		"""Cameras and placements published in this layer"""
+		return obj.type == "CAMERA" or placement_asset(obj) != None
+
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
-		print("TODO")
-		# TODO
+		builds = find_builds()
+
+		def instance(obj_source: bpy.types.Object, obj_target: bpy.types.Object) -> None:
+			asset = placement_asset(obj_source)
+			if not asset:
+				return
+			build = load_build(asset, builds)
+			if build:
+				instance_build(obj_target, build)
+				obj_target["sg_instance"] = asset
+
+		# Handle new placements and cameras
+		for obj in map.new_objs:
+			if not __class__.is_assembly(obj):
+				continue
+			# Rebuild collection hierarchy
+			parent = map.rebuild_collection_parents(obj)
+			parent.objects.link(obj)
+			instance(obj, obj)
+
+		# Handle deleted placements and cameras
+		for obj in map.deleted_objs:
+			if not __class__.is_assembly(obj):
+				continue
+			bpy.data.objects.remove(obj)
+		map.remove_blank_collections()
+
+		# Handle matching placements and cameras
+		placements = []
+		for obj_target, obj_source in map.matching_objs.items():
+			if not __class__.is_assembly(obj_source):
+				continue
+			if obj_source.type == "CAMERA" and obj_target.type == "CAMERA":
+				# Transfer the camera data
+				obj_target.data = obj_source.data
+				if settings.update_transform:
+					copy_transform(obj_source, obj_target)
+			else:
+				instance(obj_source, obj_target)
+				placements.append((obj_target, obj_source))
+			# Ensure object version matches
+			transfer_version(obj_source, obj_target)
+
+		# Placements can number in the thousands, only write the ones which moved
+		if settings.update_transform:
+			moved = transfer_placements(placements, map.scene.collection.all_objects, bpy.context.scene.collection.all_objects)
+			print(f"Moved {moved} of {len(placements)} placements")
+
+		# Keep the active camera in sync
+		camera = map.matching_objs_target.get(map.scene.camera)
+		if not camera and map.scene.camera in map.new_objs:
+			camera = map.scene.camera
+		if camera:
+			bpy.context.scene.camera = camera
 
 class LayerAnimation(LayerBase):
 	"""
 	# ANIMATION LAYER
-	TODO
+	Assigns published actions to matching objects and shape keys.\n
+	Loaded actions are reused when unchanged, otherwise their keyframes are updated in place.
 	"""
 	folder = "anims"
-	label = "(TODO) Animation"
+	label = "Animation"
 	# Sub-object data blocks which could be part of this layer
 	trigger_update = ["actions", "shape_keys"]
+	# This layer doesn't need parents, skip calculating it
+	find_parents = False
 
 	@staticmethod
 	def process(map: TransferMap, settings: TransferSettings):
-		print("TODO")
-		# TODO
+		# Actions loaded with the layer file aren't candidates for reuse
+		loaded = set()
+		for obj_source in map.matching_objs.values():
+			for block in [obj_source, getattr(obj_source.data, "shape_keys", None)]:
+				if block and block.animation_data and block.animation_data.action:
+					loaded.add(block.animation_data.action)
+		actions = find_actions(loaded)
+
+		# Handle matching animation
+		for obj_target, obj_source in map.matching_objs.items():
+			transfer_action(obj_source, obj_target, actions)
+			# Shape key animation lives on the key data block
+			keys_source = getattr(obj_source.data, "shape_keys", None)
+			keys_target = getattr(obj_target.data, "shape_keys", None)
+			transfer_action(keys_source, keys_target, actions)
+
+			# Ensure object version matches
+			transfer_version(obj_source, obj_target)
 
 class LayerLighting(LayerBase):
 	"""
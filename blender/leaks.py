@@ -0,0 +1,158 @@
+from typing import Optional
+import bpy, os, time
+from collections import deque
+from contextlib import contextmanager
+
+from .utils import *
+
+# Layers load whole scenes and remove them again, and anything left behind stays for the session.
+# With tracking on, bpy.data counts and memory are recorded around every layer and TransferMap,
+# and growth is blamed on the asset and layer which caused it.
+# Turn it on in the preferences, or with SHITGRID_TRACK_LEAKS=1 for headless builds.
+
+tracked_types = [
+	"objects", "meshes", "curves", "materials", "images", "textures", "node_groups", "collections",
+	"armatures", "actions", "shape_keys", "hair_curves", "cameras", "lights", "worlds", "scenes", "libraries",
+]
+# Records kept for the report, totals per layer are kept forever
+record_limit = 1000
+
+def stray_blocks() -> "set[str]":
+	"""Names of leftover copies and blocks nothing uses, prefixed by their data type"""
+	strays = set()
+	for data_type in tracked_types:
+		for block in getattr(bpy.data, data_type, []):
+			if ".original" in block.name:
+				strays.add(f"{data_type}: {block.name}")
+			elif block.users == 0 and not block.use_fake_user:
+				strays.add(f"{data_type}: {block.name} (no users)")
+	return strays
+
+class DataSnapshot:
+	"""Counts of data blocks and process memory at one point in time"""
+	def __init__(self):
+		self.counts = {data_type: len(getattr(bpy.data, data_type)) for data_type in tracked_types if hasattr(bpy.data, data_type)}
+		self.memory = get_memory_usage()
+		self.strays = stray_blocks()
+		self.time = time.perf_counter()
+
+	def growth(self, before: "DataSnapshot") -> "dict[str, int]":
+		"""Blocks added since another snapshot, per data type"""
+		growth = {}
+		for data_type, count in self.counts.items():
+			change = count - before.counts.get(data_type, 0)
+			if change:
+				growth[data_type] = change
+		return growth
+
+class LeakRecord:
+	"""What one stage of a layer left behind"""
+	def __init__(self, asset: str, layer: str, stage: str, before: DataSnapshot, after: DataSnapshot):
+		self.asset = asset
+		self.layer = layer
+		self.stage = stage
+		self.growth = after.growth(before)
+		self.memory = after.memory - before.memory
+		self.strays = sorted(after.strays - before.strays)
+		self.seconds = after.time - before.time
+
+	def __str__(self) -> str:
+		return f"{self.asset} {self.layer} {self.stage}: {describe_growth(self.growth, self.memory)} in {self.seconds:.2f}s"
+
+class LayerTotals:
+	"""Growth of every application of one asset layer, per stage"""
+	def __init__(self):
+		self.count = 0
+		self.growth: "dict[str, dict[str, int]]" = {}
+		self.memory: "dict[str, int]" = {}
+		self.strays: "set[str]" = set()
+
+	def add(self, record: LeakRecord) -> None:
+		growth = self.growth.setdefault(record.stage, {})
+		for data_type, change in record.growth.items():
+			growth[data_type] = growth.get(data_type, 0) + change
+		self.memory[record.stage] = self.memory.get(record.stage, 0) + record.memory
+		# Loaded layer files have unused blocks until they're unloaded
+		if record.stage == "process":
+			self.strays.update(record.strays)
+			self.count += 1
+
+def describe_growth(growth: "dict[str, int]", memory: int) -> str:
+	"""Formats block growth and memory, eg. "objects +2, meshes +2, +12.5 MB" """
+	parts = [f"{data_type} {change:+d}" for data_type, change in growth.items()]
+	parts.append(f"{memory / (1024 * 1024):+.1f} MB")
+	return ", ".join(parts)
+
+class LeakTracker:
+	"""Records what each layer application leaves in bpy.data"""
+	def __init__(self):
+		self.records: "deque[LeakRecord]" = deque(maxlen=record_limit)
+		self.totals: "dict[tuple[str, str], LayerTotals]" = {}
+		self.baseline: Optional[DataSnapshot] = None
+
+	@staticmethod
+	def enabled() -> bool:
+		"""Tracking costs a walk over bpy.data per stage, so it's off by default"""
+		if os.environ.get("SHITGRID_TRACK_LEAKS") == "1":
+			return True
+		try:
+			return get_preferences().track_leaks
+		except (KeyError, AttributeError):
+			return False
+
+	def begin(self) -> Optional[DataSnapshot]:
+		"""Snapshots bpy.data before a stage, None when tracking is off"""
+		if not self.enabled():
+			return None
+		snapshot = DataSnapshot()
+		if not self.baseline:
+			self.baseline = snapshot
+		return snapshot
+
+	def end(self, before: Optional[DataSnapshot], asset: str, layer: str, stage: str) -> Optional[LeakRecord]:
+		"""Records growth since `begin`, blocks left without users or named ".original" are leaks"""
+		if not before:
+			return None
+		record = LeakRecord(asset, layer, stage, before, DataSnapshot())
+		self.records.append(record)
+		self.totals.setdefault((asset, layer), LayerTotals()).add(record)
+		# New objects are expected, leftovers aren't
+		if stage == "process" and record.strays:
+			print(f"WARNING: {record}, left {len(record.strays)} stray blocks")
+		return record
+
+	@contextmanager
+	def track(self, asset: str, layer: str, stage: str):
+		"""Records growth of the code inside `with leak_tracker.track(...):`"""
+		before = self.begin()
+		try:
+			yield
+		finally:
+			self.end(before, asset, layer, stage)
+
+	def report(self) -> str:
+		"""Summarizes growth per asset layer and over the whole session"""
+		if not self.baseline:
+			return "Leak tracking is off, or nothing was tracked yet"
+		now = DataSnapshot()
+		lines = [f"Leak report, session {describe_growth(now.growth(self.baseline), now.memory - self.baseline.memory)}"]
+		# Worst offenders first
+		ordered = sorted(self.totals.items(), key=lambda item: (-len(item[1].strays), -sum(item[1].memory.values())))
+		for (asset, layer), totals in ordered:
+			lines.append(f"\t{asset} {layer} x{totals.count}, {len(totals.strays)} stray blocks")
+			for stage, growth in totals.growth.items():
+				lines.append(f"\t\t{stage}: {describe_growth(growth, totals.memory[stage])}")
+			for stray in sorted(totals.strays)[:10]:
+				lines.append(f"\t\t{stray}")
+			if len(totals.strays) > 10:
+				lines.append(f"\t\t...and {len(totals.strays) - 10} more")
+		return "\n".join(lines)
+
+	def clear(self) -> None:
+		"""Forgets every record and starts a new session"""
+		self.records.clear()
+		self.totals.clear()
+		self.baseline = None
+
+# Shared by the whole addon
+leak_tracker = LeakTracker()
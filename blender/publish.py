@@ -0,0 +1,67 @@
+from typing import Any
+import bpy, os
+
+# Working files carry reference scenes, scratch objects and other assets, and every build and
+# update loads the whole thing. Slim publishes only write what belongs to the asset.
+# Builds load the first scene of a layer file, so the asset gets a scene of its own.
+
+def asset_blocks(asset: str, data_types: "list[str]") -> "set[Any]":
+	"""Finds sub-object data blocks tagged for an asset, which objects might not reference"""
+	blocks = set()
+	for data_type in data_types:
+		for block in getattr(bpy.data, data_type):
+			if block.get("sg_asset") == asset:
+				blocks.add(block)
+	return blocks
+
+def make_publish_scene(scene: bpy.types.Scene, asset: str) -> bpy.types.Scene:
+	"""Creates a scene holding only the collections and objects tagged for an asset"""
+	publish = bpy.data.scenes.new(scene.name)
+	root = scene.collection
+	# Our blocks might sit under collections of other assets, link the top-most ones
+	tagged = [col for col in root.children_recursive if col.get("sg_asset") == asset]
+	nested = set()
+	for col in tagged:
+		nested.update(col.children_recursive)
+	covered = set()
+	for col in tagged:
+		if col not in nested:
+			publish.collection.children.link(col)
+			covered.update(col.all_objects)
+	for obj in root.all_objects:
+		if obj.get("sg_asset") == asset and obj not in covered:
+			publish.collection.objects.link(obj)
+
+	# Layers read these from the scene
+	publish.world = scene.world
+	if scene.camera and scene.camera.get("sg_asset") == asset:
+		publish.camera = scene.camera
+	publish.frame_start = scene.frame_start
+	publish.frame_end = scene.frame_end
+	publish.render.fps = scene.render.fps
+	return publish
+
+def write_slim(path: str, scene: bpy.types.Scene, asset: str, data_types: "list[str]") -> int:
+	"""
+	Writes the data blocks of an asset and their dependencies, returns the file size.\n
+	`data_types` are the layer's sub-object data blocks, see `trigger_update`.
+	"""
+	publish = make_publish_scene(scene, asset)
+	try:
+		# Everything referenced by the scene gets written too
+		blocks = {publish} | asset_blocks(asset, data_types)
+		compress = bpy.context.preferences.filepaths.use_file_compression
+		bpy.data.libraries.write(path, blocks, path_remap="RELATIVE", compress=compress)
+	finally:
+		bpy.data.scenes.remove(publish)
+	return os.path.getsize(path)
+
+def describe_reduction(slim_size: int) -> str:
+	"""Compares a slim publish with the working file on disk"""
+	megabytes = slim_size / (1024 * 1024)
+	full_path = bpy.data.filepath
+	if not full_path or not os.path.exists(full_path):
+		return f"Slim publish is {megabytes:.1f} MB"
+	full_size = os.path.getsize(full_path)
+	saved = 100 * (1 - slim_size / full_size) if full_size else 0
+	return f"Slim publish is {megabytes:.1f} MB, {saved:.0f}% smaller than the working file ({full_size / (1024 * 1024):.1f} MB)"
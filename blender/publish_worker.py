@@ -0,0 +1,113 @@
+"""
+Finishes a publish in a headless Blender, so the artist can keep working.\n
+Run by the addon as `blender -b snapshot.blend -P publish_worker.py -- --status ... --target ...`\n
+This runs outside the addon, so it only uses bpy, the standard library and standalone modules next to it.
+"""
+import bpy, argparse, getpass, hashlib, json, os, sys, time, traceback
+
+# Blender doesn't add the script folder to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from versioning import FileLock, release_version, write_atomic
+
+# Data types counted in the metadata
+counted_types = [
+	"collections", "objects", "meshes", "curves", "materials", "images", "armatures",
+	"actions", "shape_keys", "hair_curves", "lights", "cameras", "worlds",
+]
+
+def write_json(path: str, data: dict) -> None:
+	"""Writes JSON through a temporary file, readers never see half a file"""
+	def write(temp_path: str) -> None:
+		with open(temp_path, "w") as file:
+			json.dump(data, file, indent="\t")
+	write_atomic(path, write)
+
+def write_status(path: str, stage: str, progress: float, error: str="", done: bool=False) -> None:
+	"""Reports progress back to the addon"""
+	write_json(path, {"stage": stage, "progress": progress, "error": error, "done": done})
+
+def digest_file(path: str) -> str:
+	"""Hashes a published file so changes can be detected without loading it"""
+	hasher = hashlib.blake2b(digest_size=16)
+	with open(path, "rb") as file:
+		for chunk in iter(lambda: file.read(1 << 20), b""):
+			hasher.update(chunk)
+	return hasher.hexdigest()
+
+def save_file(target: str) -> None:
+	"""
+	Saves the snapshot to the database through a temporary file, so half written versions never appear.\n
+	Saving rather than copying remaps relative paths, they pointed next to the snapshot.
+	"""
+	write_atomic(target, lambda temp_path: bpy.ops.wm.save_as_mainfile(filepath=temp_path, copy=True, relative_remap=True))
+	# The version exists now, release the reservation the addon made before starting us
+	release_version(target)
+
+def collect_metadata(asset: str, layer: str) -> dict:
+	"""Counts the blocks tagged for the published layer"""
+	counts = {}
+	for data_type in counted_types:
+		blocks = getattr(bpy.data, data_type, [])
+		count = len([block for block in blocks if block.get("sg_asset") == asset and block.get("sg_layer") == layer])
+		if count:
+			counts[data_type] = count
+	return counts
+
+def update_manifest(path: str, entry: dict) -> None:
+	"""
+	Adds a version to the asset manifest, replacing older entries for the same version.\n
+	Other layers and artists publish the same asset at once, so the whole update holds a lock.
+	"""
+	with FileLock(path + ".lock"):
+		manifest = {"versions": []}
+		if os.path.exists(path):
+			with open(path) as file:
+				manifest = json.load(file)
+		versions = [v for v in manifest["versions"] if (v["layer"], v["version"]) != (entry["layer"], entry["version"])]
+		versions.append(entry)
+		manifest["versions"] = sorted(versions, key=lambda v: (v["layer"], v["version"]))
+		write_json(path, manifest)
+
+def get_args():
+	"""Gets arguments after -- from the terminal"""
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--status", help="Status file to report progress to")
+	parser.add_argument("--target", help="Versioned file to publish to")
+	parser.add_argument("--manifest", help="Asset manifest to update")
+	parser.add_argument("--asset", help="Published asset name")
+	parser.add_argument("--layer", help="Published layer")
+	parser.add_argument("--version", type=int, help="Published version")
+	parser.add_argument("--author", default=getpass.getuser(), help="Artist who published")
+	return parser.parse_args(argv)
+
+def main() -> None:
+	args = get_args()
+	try:
+		write_status(args.status, "Saving to database", 0.1)
+		save_file(args.target)
+
+		write_status(args.status, "Computing metadata", 0.6)
+		entry = {
+			"layer": args.layer,
+			"version": args.version,
+			"file": os.path.basename(args.target),
+			"size": os.path.getsize(args.target),
+			"digest": digest_file(args.target),
+			"author": args.author,
+			"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"blocks": collect_metadata(args.asset, args.layer),
+		}
+		# Sidecar next to the file, readable without Blender
+		write_json(f"{os.path.splitext(args.target)[0]}.json", entry)
+
+		write_status(args.status, "Updating manifest", 0.8)
+		update_manifest(args.manifest, entry)
+
+		write_status(args.status, "Published", 1.0, done=True)
+	except Exception:
+		write_status(args.status, "Failed", 1.0, error=traceback.format_exc(), done=True)
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
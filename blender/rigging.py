@@ -0,0 +1,138 @@
+from typing import Any, Optional
+import bpy
+import numpy as np
+
+from .utils import *
+from .utils_kitsu import *
+from .vertex_groups import *
+
+def copy_custom_properties(source: Any, target: Any) -> None:
+	"""Copies custom properties, skipping our own tags"""
+	for key in source.keys():
+		if key.startswith("sg_"):
+			continue
+		value = source[key]
+		# Nested properties have to be converted before assigning
+		if hasattr(value, "to_dict"):
+			value = value.to_dict()
+		elif hasattr(value, "to_list"):
+			value = value.to_list()
+		target[key] = value
+
+def transfer_pose(obj_source: bpy.types.Object, obj_target: bpy.types.Object, id_map: dict) -> None:
+	"""Copies pose bone settings, custom properties and constraints by bone name"""
+	for pb_source in obj_source.pose.bones:
+		pb_target = obj_target.pose.bones.get(pb_source.name)
+		if not pb_target:
+			continue
+		copy_attributes(pb_source, pb_target)
+		# Custom shapes and similar should point at our own objects
+		remap_pointers(pb_target, id_map)
+		copy_custom_properties(pb_source, pb_target)
+		copy_constraints(pb_source, pb_target, id_map)
+
+def transfer_armature(obj_source: bpy.types.Object, obj_target: bpy.types.Object, id_map: dict) -> None:
+	"""Transfers armature data, bone properties, pose and constraints"""
+	# Bones can only be edited in edit mode, replacing the data is much faster
+	obj_target.data = obj_source.data
+	obj_target.pose_position = obj_source.pose_position
+	transfer_pose(obj_source, obj_target, id_map)
+	copy_custom_properties(obj_source, obj_target)
+
+def sync_shape_keys(obj_source: bpy.types.Object, obj_target: bpy.types.Object,
+		remap: Optional[TopologyRemap]=None, corr: Optional[Correspondence]=None) -> None:
+	"""
+	Syncs shape key layout, settings and positions by name.\n
+	Positions are moved as offsets from the reference key, so model updates are kept.\n
+	Matching topology copies by index, `remap` handles reordered meshes, `corr` mismatching ones.
+	"""
+	keys_source = obj_source.data.shape_keys
+	if not keys_source:
+		if obj_target.data.shape_keys:
+			obj_target.shape_key_clear()
+		return
+
+	blocks_source = keys_source.key_blocks
+	if not obj_target.data.shape_keys:
+		obj_target.shape_key_add(name=keys_source.reference_key.name, from_mix=False)
+	keys_target = obj_target.data.shape_keys
+	blocks_target = keys_target.key_blocks
+
+	# Both reference keys share a name, so everything else can match by name
+	if keys_target.reference_key.name not in blocks_source:
+		keys_target.reference_key.name = keys_source.reference_key.name
+
+	# Remove keys the rig doesn't have anymore, keeping our reference key
+	for kb in list(blocks_target):
+		if kb.name not in blocks_source and kb != keys_target.reference_key:
+			obj_target.shape_key_remove(kb)
+
+	if corr:
+		# Interpolates positions and adds missing keys
+		transfer_shapekeys_proximity(obj_source, obj_target, corr)
+	else:
+		for kb in blocks_source:
+			if kb.name not in blocks_target:
+				obj_target.shape_key_add(name=kb.name, from_mix=False)
+
+		# Move every key by its offset from the source reference key
+		reference_source = read_array(keys_source.reference_key.data, "co", 3, np.float32)
+		reference_target = read_array(keys_target.reference_key.data, "co", 3, np.float32)
+		for kb in blocks_source:
+			if kb == keys_source.reference_key:
+				continue
+			offset = read_array(kb.data, "co", 3, np.float32) - reference_source
+			if remap:
+				offset = offset[remap.verts]
+			blocks_target[kb.name].data.foreach_set("co", (reference_target + offset).ravel())
+
+	# Settings, in bulk when both layouts have the same order
+	keys_target.use_relative = keys_source.use_relative
+	names_source = [kb.name for kb in blocks_source]
+	names_target = [kb.name for kb in blocks_target]
+	# Slider ranges go first since they clamp values
+	for prop in ["slider_min", "slider_max", "value", "mute"]:
+		dtype = bool if prop == "mute" else np.float32
+		values = read_array(blocks_source, prop, 1, dtype)
+		if names_source == names_target:
+			blocks_target.foreach_set(prop, values)
+		else:
+			for name, value in zip(names_source, values.tolist()):
+				if name in blocks_target:
+					setattr(blocks_target[name], prop, value)
+	for kb in blocks_source:
+		kb_target = blocks_target.get(kb.name)
+		if not kb_target:
+			continue
+		kb_target.interpolation = kb.interpolation
+		kb_target.vertex_group = kb.vertex_group
+		kb_target.relative_key = blocks_target.get(kb.relative_key.name, keys_target.reference_key)
+
+def transfer_rigged_object(obj_source: bpy.types.Object, obj_target: bpy.types.Object, map: TransferMap,
+		id_map: dict, correspondences: CorrespondenceCache) -> None:
+	"""Transfers vertex groups, shape keys, drivers and armature modifiers of a deformed object"""
+	if obj_source.type == "MESH" and obj_target.type == "MESH" and obj_target.data.vertices:
+		remap = None
+		corr = None
+		matched = match_topology(obj_source, obj_target)
+		if not matched:
+			remap = match_topology_remap(obj_source.data, obj_target.data)
+			if not remap:
+				print(f"WARNING: Mismatching topology, falling back to proximity transfer. (Object '{obj_target.name}')")
+				corr = correspondences.get(obj_source, obj_target)
+				if not corr:
+					# Armature modifiers below still need remapping
+					print(f"WARNING: Skipping weights and shape keys on '{obj_target.name}', the rig mesh has no faces")
+
+		if matched or remap or corr:
+			transfer_vertex_groups(obj_source, obj_target, remap, corr)
+			sync_shape_keys(obj_source, obj_target, remap, corr)
+
+			# Shape key drivers live on the key data block
+			if obj_source.data.shape_keys and obj_target.data.shape_keys:
+				copy_drivers(obj_source.data.shape_keys, obj_target.data.shape_keys, id_map)
+				transfer_version(obj_source.data.shape_keys, obj_target.data.shape_keys)
+
+	# Point armature modifiers at our own armatures
+	transfer_new_modifiers(obj_source, obj_target, {"ARMATURE"})
+	remap_modifiers(obj_source, obj_target, map, {"ARMATURE"})
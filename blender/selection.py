@@ -0,0 +1,139 @@
+from typing import Any
+import bpy
+from bpy.app.handlers import persistent
+
+# The Inspect panel walked the selection and every outliner on each redraw, which crawled
+# with big selections. Rows are now cached, and only rebuilt after depsgraph updates which
+# aren't plain transforms, active object changes, undo and file loads.
+# Selecting non-object blocks in the outliner doesn't notify anything, so the panel can refresh.
+
+# Past this many blocks the panel shows counts per asset and layer
+row_limit = 50
+
+def get_selected_blocks(context: bpy.types.Context) -> "set[Any]":
+	"""Gets selected asset data blocks in the outliner"""
+	blocks = set()
+	# Include data blocks selected in scene
+	for block in context.selected_objects:
+		if block.get("sg_asset"):
+			blocks.add(block)
+
+	# Include data blocks selected in outliner
+	for area in context.screen.areas:
+		if area.type != "OUTLINER":
+			continue
+		with context.temp_override(window=context.window, area=area):
+			for block in context.selected_ids:
+				if block.get("sg_asset"):
+					blocks.add(block)
+	return blocks
+
+class InspectRow:
+	"""Row of the Inspect panel, holds text only so undo can't invalidate it"""
+	def __init__(self, type: str, asset: str, layer: str, version: str, count: int=1):
+		self.type = type
+		self.asset = asset
+		self.layer = layer
+		self.version = version
+		self.count = count
+
+def block_rows(blocks: "set[Any]") -> "list[InspectRow]":
+	"""One row per block, sorted by asset and layer"""
+	rows = [InspectRow(
+		type(block).__name__,
+		block.get("sg_asset", "None"),
+		block.get("sg_layer", "None"),
+		str(block.get("sg_version", "None")),
+	) for block in blocks]
+	return sorted(rows, key=lambda row: (row.asset, row.layer, row.type))
+
+def group_rows(blocks: "set[Any]") -> "list[InspectRow]":
+	"""One row per asset and layer, with the range of versions and how many blocks use them"""
+	groups: "dict[tuple[str, str], list[Any]]" = {}
+	for block in blocks:
+		key = (block.get("sg_asset", "None"), block.get("sg_layer", "None"))
+		groups.setdefault(key, []).append(block.get("sg_version"))
+
+	rows = []
+	for (asset, layer), versions in sorted(groups.items()):
+		numbers = [version for version in versions if isinstance(version, int)]
+		if not numbers:
+			version = "None"
+		elif min(numbers) == max(numbers):
+			version = str(numbers[0])
+		else:
+			# Mixed versions usually mean a half finished update
+			version = f"{min(numbers)}-{max(numbers)}"
+		rows.append(InspectRow("", asset, layer, version, len(versions)))
+	return rows
+
+class SelectionCache:
+	"""Inspect panel rows, rebuilt on the next redraw after being invalidated"""
+	def __init__(self):
+		self.dirty = True
+		self.count = 0
+		self.rows: "list[InspectRow]" = []
+		self.groups: "list[InspectRow]" = []
+
+	def invalidate(self) -> None:
+		self.dirty = True
+
+	def update(self, context: bpy.types.Context) -> None:
+		"""Rebuilds rows if the selection or tags might have changed"""
+		if not self.dirty:
+			return
+		blocks = get_selected_blocks(context)
+		self.count = len(blocks)
+		self.groups = group_rows(blocks)
+		# Nobody reads thousands of rows, skip building them
+		self.rows = block_rows(blocks) if self.count <= row_limit else []
+		self.dirty = False
+
+# Shared by the panel and handlers
+selection_cache = SelectionCache()
+# Owner of our message bus subscriptions
+msgbus_owner = object()
+
+@persistent
+def invalidate_selection(*args) -> None:
+	selection_cache.invalidate()
+
+@persistent
+def depsgraph_handler(scene, depsgraph) -> None:
+	"""Invalidates the cache unless objects were only moved"""
+	if selection_cache.dirty:
+		return
+	for update in depsgraph.updates:
+		# Selection changes update the scene, tag changes update the object without a transform
+		if not isinstance(update.id, bpy.types.Object) or not update.is_updated_transform:
+			selection_cache.invalidate()
+			return
+
+def subscribe_selection() -> None:
+	"""Listens for active object changes, subscriptions are cleared when files load"""
+	bpy.msgbus.clear_by_owner(msgbus_owner)
+	bpy.msgbus.subscribe_rna(
+		key=(bpy.types.LayerObjects, "active"),
+		owner=msgbus_owner,
+		args=(),
+		notify=invalidate_selection,
+	)
+
+@persistent
+def selection_load_handler(dummy) -> None:
+	selection_cache.invalidate()
+	subscribe_selection()
+
+def register_selection() -> None:
+	bpy.app.handlers.depsgraph_update_post.append(depsgraph_handler)
+	bpy.app.handlers.undo_post.append(invalidate_selection)
+	bpy.app.handlers.redo_post.append(invalidate_selection)
+	bpy.app.handlers.load_post.append(selection_load_handler)
+	subscribe_selection()
+
+def unregister_selection() -> None:
+	bpy.msgbus.clear_by_owner(msgbus_owner)
+	bpy.app.handlers.depsgraph_update_post.remove(depsgraph_handler)
+	bpy.app.handlers.undo_post.remove(invalidate_selection)
+	bpy.app.handlers.redo_post.remove(invalidate_selection)
+	bpy.app.handlers.load_post.remove(selection_load_handler)
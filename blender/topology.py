@@ -0,0 +1,173 @@
+from typing import Optional
+import bpy
+import numpy as np
+
+from .utils import *
+
+# Re-exporting or renumbering a mesh keeps its connectivity but changes its index order.
+# Instead of falling back to proximity transfer, find the permutation between both meshes.
+# Vertices are coloured by repeatedly hashing their neighbours (Weisfeiler-Lehman refinement),
+# then matched by colour. The result is always verified, so a wrong guess just returns None.
+
+# Refinement stops early once colours stop splitting, this is only a safety limit
+max_refine_steps = 100
+
+class TopologyRemap:
+	"""
+	Index mapping between two meshes sharing connectivity in a different order.\n
+	Each array maps target indices to source indices, eg. `source_co[remap.verts]`.
+	"""
+	def __init__(self, verts: np.ndarray, edges: np.ndarray, polys: np.ndarray, loops: np.ndarray):
+		self.verts = verts
+		self.edges = edges
+		self.polys = polys
+		self.loops = loops
+
+class MeshTopology:
+	"""Connectivity arrays of a mesh, read in bulk"""
+	def __init__(self, mesh: bpy.types.Mesh):
+		self.vert_count = len(mesh.vertices)
+		self.co = read_array(mesh.vertices, "co", 3, np.float32)
+		self.edges = read_array(mesh.edges, "vertices", 2, np.int64)
+		self.loop_vert = read_array(mesh.loops, "vertex_index", 1, np.int64)
+		self.loop_start = read_array(mesh.polygons, "loop_start", 1, np.int64)
+		self.loop_total = read_array(mesh.polygons, "loop_total", 1, np.int64)
+
+def _mix(values: np.ndarray) -> np.ndarray:
+	"""Scrambles 64-bit integers (splitmix64), overflow is intended"""
+	values = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+	values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+	values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+	return values ^ (values >> np.uint64(31))
+
+class _Refiner:
+	"""Colours the vertices of a mesh by their neighbourhood"""
+	def __init__(self, topo: MeshTopology):
+		self.count = topo.vert_count
+		# Directed edges sorted by start vertex, so neighbours can be summed per vertex
+		src = np.concatenate([topo.edges[:, 0], topo.edges[:, 1]])
+		dst = np.concatenate([topo.edges[:, 1], topo.edges[:, 0]])
+		order = np.argsort(src, kind="stable")
+		self.src = src[order]
+		self.dst = dst[order]
+		self.heads = np.flatnonzero(np.r_[True, self.src[1:] != self.src[:-1]]) if len(self.src) else self.src
+
+		# Start from the vertex degree and the number of faces using each vertex
+		degree = np.bincount(self.src, minlength=self.count)
+		faces = np.bincount(topo.loop_vert, minlength=self.count)
+		self.colors = _mix(degree) ^ _mix(faces.astype(np.uint64) << np.uint64(32))
+
+	def step(self) -> None:
+		"""Rehashes each colour with the sum of its neighbour colours (order independent)"""
+		sums = np.zeros(self.count, dtype=np.uint64)
+		if len(self.src):
+			sums[self.src[self.heads]] = np.add.reduceat(_mix(self.colors[self.dst]), self.heads)
+		self.colors = _mix(self.colors ^ _mix(sums))
+
+def _edge_keys(edges: np.ndarray, count: int) -> np.ndarray:
+	"""Encodes undirected edges as single integers"""
+	return np.minimum(edges[:, 0], edges[:, 1]) * count + np.maximum(edges[:, 0], edges[:, 1])
+
+def _canonical_offsets(loop_vert: np.ndarray, loop_start: np.ndarray, loop_total: np.ndarray, loop_poly: np.ndarray) -> np.ndarray:
+	"""Finds the corner of each polygon holding its smallest vertex, so winding is compared from there"""
+	smallest = np.minimum.reduceat(loop_vert, loop_start)
+	candidates = np.flatnonzero(loop_vert == smallest[loop_poly])
+	# Degenerate polygons can repeat a vertex, keep the first
+	_, first = np.unique(loop_poly[candidates], return_index=True)
+	return candidates[first] - loop_start
+
+def match_permuted_topology(source: MeshTopology, target: MeshTopology) -> Optional[TopologyRemap]:
+	"""
+	Finds the index permutation between meshes with identical connectivity.\n
+	Ties between symmetric vertices are broken by position.\n
+	Returns None if the connectivity differs or the permutation can't be proven.
+	"""
+	if source.vert_count != target.vert_count:
+		return None
+	if len(source.edges) != len(target.edges) or len(source.loop_vert) != len(target.loop_vert):
+		return None
+	if len(source.loop_total) != len(target.loop_total):
+		return None
+	if not len(target.loop_total):
+		return None
+	# Loops must be stored in polygon order for the bulk polygon maths
+	for topo in [source, target]:
+		if np.any(np.diff(topo.loop_start) < 0) or topo.loop_start[0] != 0:
+			return None
+
+	# Colour refinement on both meshes with the same hash, until colours stop splitting
+	source_ref = _Refiner(source)
+	target_ref = _Refiner(target)
+	distinct = 0
+	for _ in range(max_refine_steps):
+		if not np.array_equal(np.sort(source_ref.colors), np.sort(target_ref.colors)):
+			return None
+		count = len(np.unique(source_ref.colors))
+		if count == distinct or count == source.vert_count:
+			break
+		distinct = count
+		source_ref.step()
+		target_ref.step()
+
+	# Match vertices by colour, ties are symmetric so sort them by position
+	source_order = np.lexsort((source.co[:, 2], source.co[:, 1], source.co[:, 0], source_ref.colors))
+	target_order = np.lexsort((target.co[:, 2], target.co[:, 1], target.co[:, 0], target_ref.colors))
+	verts = np.empty(target.vert_count, dtype=np.int64)
+	verts[target_order] = source_order
+
+	# Verify edges and find the edge permutation
+	source_keys = _edge_keys(source.edges, source.vert_count)
+	edge_order = np.argsort(source_keys)
+	sorted_keys = source_keys[edge_order]
+	target_keys = _edge_keys(verts[target.edges], target.vert_count)
+	found = np.minimum(np.searchsorted(sorted_keys, target_keys), len(sorted_keys) - 1)
+	if not np.array_equal(sorted_keys[found], target_keys):
+		return None
+	edges = edge_order[found]
+	if len(np.unique(edges)) != len(edges):
+		return None
+
+	# Polygons are compared in their own vertex numbering, starting from the smallest vertex
+	source_poly = np.repeat(np.arange(len(source.loop_total)), source.loop_total)
+	target_poly = np.repeat(np.arange(len(target.loop_total)), target.loop_total)
+	target_loop_vert = verts[target.loop_vert]
+	source_offsets = _canonical_offsets(source.loop_vert, source.loop_start, source.loop_total, source_poly)
+	target_offsets = _canonical_offsets(target_loop_vert, target.loop_start, target.loop_total, target_poly)
+
+	def poly_keys(loop_vert, loop_start, loop_total, loop_poly, offsets):
+		# Hash each vertex with its position in the winding, then sum per polygon
+		corner = np.arange(len(loop_vert)) - loop_start[loop_poly]
+		canonical = loop_start[loop_poly] + (corner + offsets[loop_poly]) % loop_total[loop_poly]
+		hashed = _mix(_mix(loop_vert[canonical]) ^ corner.astype(np.uint64))
+		return _mix(np.add.reduceat(hashed, loop_start) ^ _mix(loop_total))
+
+	source_keys = poly_keys(source.loop_vert, source.loop_start, source.loop_total, source_poly, source_offsets)
+	target_keys = poly_keys(target_loop_vert, target.loop_start, target.loop_total, target_poly, target_offsets)
+	poly_order = np.argsort(source_keys)
+	sorted_keys = source_keys[poly_order]
+	found = np.minimum(np.searchsorted(sorted_keys, target_keys), len(sorted_keys) - 1)
+	if not np.array_equal(sorted_keys[found], target_keys):
+		return None
+	polys = poly_order[found]
+	if len(np.unique(polys)) != len(polys) or not np.array_equal(source.loop_total[polys], target.loop_total):
+		return None
+
+	# Match corners at the same winding position, then verify them exactly
+	corner = np.arange(len(target_loop_vert)) - target.loop_start[target_poly]
+	total = target.loop_total[target_poly]
+	source_polys = polys[target_poly]
+	target_loops = target.loop_start[target_poly] + (corner + target_offsets[target_poly]) % total
+	source_loops = source.loop_start[source_polys] + (corner + source_offsets[source_polys]) % total
+	loops = np.empty(len(target_loop_vert), dtype=np.int64)
+	loops[target_loops] = source_loops
+	if not np.array_equal(source.loop_vert[loops], target_loop_vert):
+		return None
+
+	return TopologyRemap(verts, edges, polys, loops)
+
+def match_topology_remap(source: bpy.types.Mesh, target: bpy.types.Mesh) -> Optional[TopologyRemap]:
+	"""
+	Checks if two meshes share connectivity up to a reordering.\n
+	Returns index mappings from the target onto the source, or None if they differ.
+	"""
+	return match_permuted_topology(MeshTopology(source), MeshTopology(target))
@@ -2,12 +2,66 @@ from typing import Any, Optional, Union
 import bpy
 
 from .utils import *
+from .leaks import leak_tracker
 
 class TransferSettings:
 	"""Settings used when applying build layers"""
 	update_transform: bool = True
 	# Avoid rebuilding material data in other layers
 	replacing_materials: bool = False
+	# Folder to save proximity transfer lookups, blank keeps them in memory
+	cache_folder: str = ""
+	# Threads used for proximity transfers, zero uses every core
+	workers: int = 0
+
+class SceneIndex:
+	"""
+	Finds blocks in the current scene by asset and ID, scanning the scene only once.\n
+	Share one between TransferMaps when updating many assets, they keep it in sync.
+	"""
+	def __init__(self):
+		self.scene = bpy.context.scene
+		self.assets: dict[str, dict[str, list[Any]]] = {}
+
+		collection = self.scene.collection
+		for blocks in [collection.all_objects, collection.children_recursive]:
+			for block in blocks:
+				asset = block.get("sg_asset")
+				id = block.get("sg_id")
+				if asset and id:
+					self.get(asset).setdefault(id, []).append(block)
+
+	def get(self, asset: str) -> "dict[str, list[Any]]":
+		"""Returns the blocks of an asset by ID, changes to it are kept"""
+		return self.assets.setdefault(asset, {})
+
+	@staticmethod
+	def __is_removed(block: Any) -> bool:
+		"""Removed blocks raise errors when accessed"""
+		try:
+			block.name
+			return False
+		except ReferenceError:
+			return True
+
+	def update(self, map: "TransferMap") -> None:
+		"""Adds blocks a layer linked into the scene and forgets removed ones"""
+		ids = self.get(map.file.name)
+		# New collections are added by rebuild_collection_parents already
+		for obj in map.new_objs:
+			id = obj.get("sg_id")
+			if self.scene not in obj.users_scene:
+				continue
+			blocks = ids.setdefault(id, [])
+			if obj not in blocks:
+				blocks.append(obj)
+
+		if not map.deleted_objs and not map.deleted_cols:
+			return
+		for id in list(ids):
+			ids[id] = [block for block in ids[id] if not self.__is_removed(block)]
+			if not ids[id]:
+				del ids[id]
 
 class TransferMap:
 	"""
@@ -59,15 +113,13 @@ class TransferMap:
 		"""Finds added, removed and matching data blocks using IDs"""
 
 		source_col = self.scene.collection
-		target_col = bpy.context.scene.collection
 
 		# Find IDs in the other scene
 		self.__find_ids(source_col.all_objects, self.source_ids)
 		self.__find_ids(source_col.children_recursive, self.source_ids)
 
-		# Find IDs in the current scene
-		self.__find_ids(target_col.all_objects, self.target_ids)
-		self.__find_ids(target_col.children_recursive, self.target_ids)
+		# IDs in the current scene come from the shared index
+		self.target_ids = self.index.get(self.file.name)
 
 		# Find matching and added IDs
 		for source_id in self.source_ids:
@@ -131,6 +183,20 @@ class TransferMap:
 			if not col.children and not col.objects:
 				bpy.data.collections.remove(col)
 
+	def matching_by_data(self) -> "dict[tuple[Any, Any], list[tuple[bpy.types.Object, bpy.types.Object]]]":
+		"""
+		Groups matching objects by their (source data, target data) pair.\n
+		Objects sharing data only need data level work done once, the rest is per object.
+		"""
+		groups = {}
+		for target, source in self.matching_objs.items():
+			# Objects without data can't share it
+			key = (source.data, target.data) if target.data else (source, target)
+			if key not in groups:
+				groups[key] = []
+			groups[key].append((target, source))
+		return groups
+
 	@staticmethod
 	def __wipe_collection(base: bpy.types.Collection) -> None:
 		"""Clears objects and subcollections from a collection"""
@@ -177,9 +243,12 @@ class TransferMap:
 		bpy.context.collection.children.link(top)
 		return parent
 
-	def __init__(self, file: SourceFile, find_parents: bool=True):
+	def __init__(self, file: SourceFile, find_parents: bool=True, index: Optional[SceneIndex]=None):
+		opening = leak_tracker.begin()
 		self.file = file
 		self.scene = load_scene(file.path)
+		# Scanning the current scene is slow, batches share an index
+		self.index = index if index else SceneIndex()
 
 		# For rare case in modelling layer
 		self.matching_objs_target: dict[bpy.types.Object, bpy.types.Object] = {}
@@ -201,10 +270,13 @@ class TransferMap:
 				Union[bpy.types.Object, bpy.types.Collection]
 			] = {}
 			self.__find_parents(self.scene.collection)
+		leak_tracker.end(opening, file.name, file.layer, "open")
 		
 	def close(self):
 		"""In case you don't want to use `with`"""
-		unload_scene(self.scene)
+		with leak_tracker.track(self.file.name, self.file.layer, "close"):
+			self.index.update(self)
+			unload_scene(self.scene)
 
 	def __enter__(self):
 		"""Used with `with TransferMap(...) as map:`"""
@@ -0,0 +1,169 @@
+"""
+Applies outdated asset layers to many shot files, without anyone opening them.\n
+Run with plain Python next to the addon: `python update_shots.py --blender blender --workers 4 "shots/**/*.blend"`\n
+It starts a pool of headless Blenders running this script again with `--worker`,
+which need the addon enabled in the user preferences for the database path.
+"""
+from typing import Any
+import argparse, glob, json, os, shutil, subprocess, sys, tempfile, time, traceback, zlib
+
+# Updates only ran in interactive sessions through Update_Operator or load_handler.
+# Workers open shot files one after another, apply the same updates with the settings saved
+# in each file, and write a report per file. Crashes only lose the files of one worker.
+
+script_folder = os.path.dirname(os.path.abspath(__file__))
+
+def worker_command(blender: str, paths: "list[str]", reports: str) -> "list[str]":
+	"""Command updating shot files in one headless Blender"""
+	return [
+		blender, "-b", "--python-use-system-env", "--python-exit-code", "1",
+		"-P", os.path.abspath(__file__), "--", "--worker", "--reports", reports, *paths,
+	]
+
+def report_path(reports: str, path: str) -> str:
+	"""Report file of a shot, unique for shots with the same name"""
+	name = os.path.splitext(os.path.basename(path))[0]
+	return os.path.join(reports, f"{name}_{zlib.crc32(os.path.abspath(path).encode()):08x}.json")
+
+def find_addon():
+	"""Enables the addon this script belongs to and returns its module"""
+	import addon_utils
+	for module in addon_utils.modules():
+		if os.path.dirname(os.path.abspath(module.__file__)) == script_folder:
+			return addon_utils.enable(module.__name__)
+	raise ModuleNotFoundError(f"The addon in {script_folder} isn't installed")
+
+def update_file(addon, path: str) -> "dict[str, Any]":
+	"""Opens a shot file, applies outdated layers and saves it"""
+	import bpy
+	start = time.perf_counter()
+	report = {"file": path, "layers": [], "saved": False, "error": "", "seconds": 0.0}
+	try:
+		bpy.ops.wm.open_mainfile(filepath=path, load_ui=False)
+		settings = addon.get_transfer_settings(bpy.context.scene.sg_props)
+		report["layers"] = addon.apply_updates(addon.get_updates(), settings)
+		# Layers which failed are reported, the rest is still worth saving
+		if any(not result["error"] for result in report["layers"]):
+			bpy.ops.wm.save_mainfile()
+			report["saved"] = True
+		failed = [f"{result['asset']} {result['layer']}" for result in report["layers"] if result["error"]]
+		if failed:
+			report["error"] = f"{len(failed)} layers failed: {', '.join(failed)}"
+	except Exception:
+		report["error"] = traceback.format_exc()
+	report["seconds"] = time.perf_counter() - start
+	return report
+
+def run_worker(paths: "list[str]", reports: str) -> bool:
+	"""Updates shot files inside Blender, writing a report for each, returns whether all of them succeeded"""
+	import bpy
+	addon = find_addon()
+	prefs = bpy.context.preferences.addons[addon.__name__].preferences
+	# Otherwise load_handler updates files as they open, and nothing gets reported
+	auto_update = prefs.auto_update
+	prefs.auto_update = False
+	succeeded = True
+	try:
+		for path in paths:
+			report = update_file(addon, path)
+			succeeded = succeeded and not report["error"]
+			with open(report_path(reports, path), "w") as file:
+				json.dump(report, file, indent="\t")
+	finally:
+		prefs.auto_update = auto_update
+	return succeeded
+
+def expand_paths(patterns: "list[str]", list_file: str="") -> "list[str]":
+	"""Expands globs and a text file of paths, each file only once"""
+	if list_file:
+		with open(list_file) as file:
+			patterns = patterns + [line.strip() for line in file if line.strip()]
+	paths = []
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+		paths.extend(os.path.abspath(path) for path in matches if path.endswith(".blend"))
+	return list(dict.fromkeys(paths))
+
+def run_pool(paths: "list[str]", blender: str, workers: int, batch: int) -> "list[dict[str, Any]]":
+	"""Spreads shot files over a pool of headless Blenders, returns a report per file"""
+	reports = tempfile.mkdtemp(prefix="shitgrid_update_")
+	batches = [paths[i:i + batch] for i in range(0, len(paths), batch)]
+	running: "list[tuple[subprocess.Popen, list[str]]]" = []
+	results = []
+	try:
+		while batches or running:
+			while batches and len(running) < workers:
+				chunk = batches.pop(0)
+				process = subprocess.Popen(worker_command(blender, chunk, reports), stdout=subprocess.DEVNULL)
+				running.append((process, chunk))
+			time.sleep(0.5)
+			for process, chunk in running[:]:
+				if process.poll() is None:
+					continue
+				running.remove((process, chunk))
+				for path in chunk:
+					results.append(read_report(reports, path, process.returncode))
+					print_file(results[-1])
+	finally:
+		shutil.rmtree(reports, ignore_errors=True)
+	return results
+
+def read_report(reports: str, path: str, returncode: int) -> "dict[str, Any]":
+	"""Reads the report of a shot, files without one died with their worker"""
+	try:
+		with open(report_path(reports, path)) as file:
+			return json.load(file)
+	except (OSError, ValueError):
+		return {"file": path, "layers": [], "saved": False, "error": f"Blender exited with code {returncode} before finishing", "seconds": 0.0}
+
+def print_file(report: "dict[str, Any]") -> None:
+	"""Prints layers updated and time spent for one shot"""
+	state = "saved" if report["saved"] else "up to date"
+	if report["error"]:
+		state = "FAILED, partly saved" if report["saved"] else "FAILED"
+	print(f"{os.path.basename(report['file'])}: {state} in {report['seconds']:.1f}s")
+	for result in report["layers"]:
+		error = f" ({result['error']})" if result["error"] else ""
+		print(f"\t{result['asset']} {result['layer']} {result['seconds']:.1f}s{error}")
+	if report["error"]:
+		print(f"\t{report['error'].strip().splitlines()[-1]}")
+
+def print_summary(results: "list[dict[str, Any]]", seconds: float) -> None:
+	"""Prints totals over every shot"""
+	saved = len([report for report in results if report["saved"]])
+	failed = len([report for report in results if report["error"]])
+	layers = sum(len(report["layers"]) for report in results)
+	print(f"Updated {saved} of {len(results)} files ({layers} layers, {failed} failed) in {seconds:.1f}s")
+
+def get_args():
+	"""Gets arguments from the terminal, Blender passes them after --"""
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+	parser = argparse.ArgumentParser()
+	parser.add_argument("paths", nargs="*", help="Shot files or globs, quote globs so \"**\" works everywhere")
+	parser.add_argument("--list", default="", help="Text file with a shot file per line")
+	parser.add_argument("--blender", default="blender", help="Blender executable running the updates")
+	parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Blenders running at once")
+	parser.add_argument("--batch", type=int, default=4, help="Shot files per Blender, saves startup time")
+	parser.add_argument("--report", default="", help="JSON file to write every report to")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	parser.add_argument("--reports", default="", help=argparse.SUPPRESS)
+	return parser.parse_args(argv)
+
+if __name__ == "__main__":
+	args = get_args()
+	if args.worker:
+		# The watcher and farm only see the exit code
+		sys.exit(0 if run_worker(args.paths, args.reports) else 1)
+
+	paths = expand_paths(args.paths, args.list)
+	if not paths:
+		print("No shot files found")
+		sys.exit(1)
+	print(f"Updating {len(paths)} files with {args.workers} Blenders")
+	start = time.perf_counter()
+	results = run_pool(paths, args.blender, args.workers, args.batch)
+	print_summary(results, time.perf_counter() - start)
+	if args.report:
+		with open(args.report, "w") as file:
+			json.dump(results, file, indent="\t")
+	sys.exit(1 if any(report["error"] for report in results) else 0)
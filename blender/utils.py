@@ -1,5 +1,6 @@
 from typing import Any
-import bpy
+import bpy, os, sys
+import numpy as np
 
 class SourceFile:
 	"""
@@ -15,6 +16,42 @@ class SourceFile:
 		self.layer = layer
 		self.version = version
 
+def read_array(collection: Any, prop: str, width: int, dtype: Any) -> np.ndarray:
+	"""Reads a property of every item in a collection into an array"""
+	values = np.empty(len(collection) * width, dtype=dtype)
+	if len(values):
+		collection.foreach_get(prop, values)
+	return values.reshape(-1, width) if width > 1 else values
+
+def get_preferences() -> Any:
+	"""Returns the addon preferences, works from any module in the addon"""
+	return bpy.context.preferences.addons[__package__].preferences
+
+def get_memory_usage() -> int:
+	"""Returns the memory used by Blender in bytes, or 0 if it can't be measured"""
+	try:
+		if sys.platform == "win32":
+			import ctypes
+			from ctypes import wintypes
+			class Counters(ctypes.Structure):
+				_fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+					(name, ctypes.c_size_t) for name in [
+						"PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+						"QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage"
+					]
+				]
+			counters = Counters()
+			counters.cb = ctypes.sizeof(Counters)
+			process = ctypes.windll.kernel32.GetCurrentProcess()
+			if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+				return counters.WorkingSetSize
+			return 0
+		# Resident pages are the second field
+		with open("/proc/self/statm") as statm:
+			return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		return 0
+
 def load_scene(path: str) -> bpy.types.Scene:
 	"""Loads the first scene of the file into our scene"""
 	with bpy.data.libraries.load(path, link=False) as (source_data, target_data):
@@ -1,15 +1,21 @@
 from typing import Any, Optional
-import bpy, mathutils, bmesh
+import bpy, mathutils, bmesh, time
 import numpy as np
 
 from .transfer_map import TransferMap
+from .digest import *
+from .correspondence import *
+from .topology import *
+from .curves import *
 
 # Kitsu has lots of utilities for transferring data between objects
 # I stole everything below from Kitsu :)
 # projects.blender.org/studio/blender-studio-pipeline/src/branch/main/scripts-blender/addons/asset_pipeline/docs/production_config_heist/task_layers.py
 
-def transfer_new_modifiers(obj_source: bpy.types.Object, obj_target: bpy.types.Object):
+def transfer_new_modifiers(obj_source: bpy.types.Object, obj_target: bpy.types.Object, types: "Optional[set[str]]" = None):
 	for i, mod in enumerate(obj_source.modifiers):
+		if types and mod.type not in types:
+			continue
 		if mod.name in [m.name for m in obj_target.modifiers]:
 			continue
 		mod_new = obj_target.modifiers.new(mod.name, mod.type)
@@ -31,8 +37,10 @@ def remap_new_modifiers(obj: bpy.types.Object, map: TransferMap):
 				value = map.matching_objs_target[value]
 			setattr(mod_source, prop, value)
 
-def remap_modifiers(obj_source: bpy.types.Object, obj_target: bpy.types.Object, map: TransferMap):
+def remap_modifiers(obj_source: bpy.types.Object, obj_target: bpy.types.Object, map: TransferMap, types: "Optional[set[str]]" = None):
 	for i, mod_source in enumerate(obj_source.modifiers):
+		if types and mod_source.type not in types:
+			continue
 		mod_target = obj_target.modifiers.get(mod_source.name)
 		if not mod_target:
 			continue
@@ -43,24 +51,108 @@ def remap_modifiers(obj_source: bpy.types.Object, obj_target: bpy.types.Object,
 				value = map.matching_objs_target[value]
 			setattr(mod_target, prop, value)
 
-def rebind_modifiers(obj_target: bpy.types.Object):
-	"""Rebinds corrective smooth, surface deform and mesh deform modifiers"""
+# Bound state property and bind operator for each bindable modifier type
+_bind_types = {
+	"SURFACE_DEFORM": ("is_bound", "surfacedeform_bind"),
+	"MESH_DEFORM": ("is_bound", "meshdeform_bind"),
+	"CORRECTIVE_SMOOTH": ("is_bind", "correctivesmooth_bind"),
+}
+
+# Modifier settings which affect the bind result (runtime settings like strength don't)
+_bind_settings = {
+	"SURFACE_DEFORM": ["target", "falloff", "use_sparse_bind", "vertex_group", "invert_vertex_group"],
+	"MESH_DEFORM": ["object", "precision", "use_dynamic_bind"],
+	"CORRECTIVE_SMOOTH": ["rest_source"],
+}
+
+class BindResult:
+	"""
+	Struct describing a modifier bind which ran.\n
+	Object: Name of the bound object
+	Modifier: Name of the bound modifier
+	Seconds: Time taken to bind
+	"""
+	def __init__(self, obj: str, modifier: str, seconds: float):
+		self.obj = obj
+		self.modifier = modifier
+		self.seconds = seconds
+
+def _cached_geometry(obj: bpy.types.Object, geometry: "dict[bpy.types.Object, Optional[str]]") -> Optional[str]:
+	"""Digests object geometry once per batch, many objects often share a bind cage"""
+	if obj not in geometry:
+		geometry[obj] = digest_geometry(obj)
+	return geometry[obj]
+
+def bind_digest(obj: bpy.types.Object, mod: bpy.types.Modifier, geometry: "dict[bpy.types.Object, Optional[str]]") -> Optional[str]:
+	"""
+	Hashes everything a modifier bind depends on.\n
+	Returns None if any geometry can't be hashed.
+	"""
+	own_digest = _cached_geometry(obj, geometry)
+	if own_digest is None:
+		return None
+	values = [mod.type, own_digest]
+	for prop in _bind_settings[mod.type]:
+		value = getattr(mod, prop)
+		if type(value) == bpy.types.Object:
+			target_digest = _cached_geometry(value, geometry)
+			if target_digest is None:
+				return None
+			# Binds are stored relative to the bound object
+			values += [value.name, target_digest, obj.matrix_world.inverted() @ value.matrix_world]
+		else:
+			values.append(value)
+	return digest_values(values)
+
+def rebind_modifiers(obj_target: bpy.types.Object, force: bool=False,
+		geometry: "Optional[dict[bpy.types.Object, Optional[str]]]"=None) -> "list[BindResult]":
+	"""
+	Rebinds corrective smooth, surface deform and mesh deform modifiers.\n
+	Binds only run when the digest of their inputs changed since the last bind.\n
+	`geometry` caches geometry digests, share it between calls to avoid rehashing.
+	"""
+	if geometry is None:
+		geometry = {}
+	results = []
 	for mod in obj_target.modifiers:
-		if mod.type == "SURFACE_DEFORM":
-			if not mod.is_bound:
-				continue
-			for i in range(2):
-				bpy.ops.object.surfacedeform_bind({"object": obj_target, "active_object": obj_target}, modifier=mod.name)
-		elif mod.type == "MESH_DEFORM":
-			if not mod.is_bound:
-				continue
-			for i in range(2):
-				bpy.ops.object.meshdeform_bind({"object": obj_target, "active_object": obj_target}, modifier=mod.name)
-		elif mod.type == "CORRECTIVE_SMOOTH":
-			if not mod.is_bind:
-				continue
-			for i in range(2):
-				bpy.ops.object.correctivesmooth_bind({"object": obj_target, "active_object": obj_target}, modifier=mod.name)
+		if mod.type not in _bind_types:
+			continue
+		bound_prop, op_name = _bind_types[mod.type]
+		if not getattr(mod, bound_prop):
+			continue
+
+		# Digests are stored per modifier name, modifiers don't support custom data
+		digests = obj_target.get("sg_bind_digests")
+		digest = bind_digest(obj_target, mod, geometry)
+		if not force and digest and digests and digests.get(mod.name) == digest:
+			continue
+
+		# First call unbinds, second call binds again
+		start = time.perf_counter()
+		bind_op = getattr(bpy.ops.object, op_name)
+		for i in range(2):
+			bind_op({"object": obj_target, "active_object": obj_target}, modifier=mod.name)
+		results.append(BindResult(obj_target.name, mod.name, time.perf_counter() - start))
+
+		if digest:
+			if "sg_bind_digests" not in obj_target:
+				obj_target["sg_bind_digests"] = {}
+			obj_target["sg_bind_digests"][mod.name] = digest
+	return results
+
+def rebind_modifiers_batch(objs: "list[bpy.types.Object]", force: bool=False) -> "list[BindResult]":
+	"""Rebinds modifiers on many objects, sharing geometry digests and printing a report"""
+	geometry = {}
+	results = []
+	for obj in objs:
+		results += rebind_modifiers(obj, force, geometry)
+
+	for result in results:
+		print(f"Bound {result.modifier} on {result.obj} in {result.seconds:.2f}s")
+	if results:
+		total = sum(result.seconds for result in results)
+		print(f"Rebound {len(results)} modifiers in {total:.2f}s")
+	return results
 
 def match_topology(a: bpy.types.Object, b: bpy.types.Object) -> bool:
 	"""Checks if two objects have matching topology (efficiency over exactness)"""
@@ -73,18 +165,17 @@ def match_topology(a: bpy.types.Object, b: bpy.types.Object) -> bool:
 			return False
 		if len(a.data.polygons) != len(b.data.polygons):
 			return False
-		for e1, e2 in zip(a.data.edges, b.data.edges):
-			for v1, v2 in zip(e1.vertices, e2.vertices):
-				if v1 != v2:
-					return False
-		return True
-	elif a.type == 'CURVE':
-		if len(a.data.splines) != len(b.data.splines):
+		if len(a.data.loops) != len(b.data.loops):
 			return False
-		for spline1, spline2 in zip(a.data.splines, b.data.splines):
-			if len(spline1.points) != len(spline2.points):
+		# Compare in bulk, corners are checked too since face corner data is copied by index
+		for collection, prop, width in [("edges", "vertices", 2), ("loops", "vertex_index", 1)]:
+			values_a = read_array(getattr(a.data, collection), prop, width, np.int32)
+			values_b = read_array(getattr(b.data, collection), prop, width, np.int32)
+			if not np.array_equal(values_a, values_b):
 				return False
 		return True
+	elif a.type == 'CURVE':
+		return match_curve_topology(a.data, b.data)
 	return False
 
 def copy_transform(source_ob: bpy.types.Object, target_ob: bpy.types.Object):
@@ -100,30 +191,71 @@ def copy_transform(source_ob: bpy.types.Object, target_ob: bpy.types.Object):
 	for con, vis in zip(target_ob.constraints, con_vis):
 		con.enabled = vis
 
-def copy_parenting(source_ob: bpy.types.Object, target_ob: bpy.types.Object) -> None:
-	"""Copy parenting data from one object to another."""
-	target_ob.parent = source_ob.parent
+def copy_parenting(source_ob: bpy.types.Object, target_ob: bpy.types.Object, id_map: Optional[dict] = None) -> None:
+	"""Copy parenting data from one object to another, `id_map` remaps the parent."""
+	target_ob.parent = id_map.get(source_ob.parent, source_ob.parent) if id_map else source_ob.parent
 	target_ob.parent_type = source_ob.parent_type
 	target_ob.parent_bone = source_ob.parent_bone
 	target_ob.matrix_parent_inverse = source_ob.matrix_parent_inverse.copy()
 
 _invalid_keys: "set[str]" = {"group", "is_valid", "rna_type", "bl_rna"}
 
+# Copyable keys per type, scanning properties for every copy was slow with lots of drivers
+_attribute_cache: "dict[type, list[str]]" = {}
+# Writable pointer properties per type, used for remapping
+_pointer_cache: "dict[type, list[str]]" = {}
+
 def copy_attributes(a: Any, b: Any) -> None:
-	keys = dir(a)
+	keys = _attribute_cache.get(type(a))
+	if keys is None:
+		if hasattr(a, "bl_rna"):
+			keys = [p.identifier for p in a.bl_rna.properties if not p.is_readonly]
+		else:
+			keys = dir(a)
+		keys = [key for key in keys if not key.startswith("_") and not key.startswith("error_") and key not in _invalid_keys]
+		_attribute_cache[type(a)] = keys
 	for key in keys:
-		if key.startswith("_") or key.startswith("error_") or key in _invalid_keys:
-			continue
 		try:
 			setattr(b, key, getattr(a, key))
-		except AttributeError:
+		except (AttributeError, TypeError, ValueError):
 			pass
 
+def remap_pointers(struct: Any, id_map: dict) -> None:
+	"""Points writable data block properties at our own data blocks instead of transferred ones"""
+	keys = _pointer_cache.get(type(struct))
+	if keys is None:
+		keys = [p.identifier for p in struct.bl_rna.properties if p.type == "POINTER" and not p.is_readonly]
+		_pointer_cache[type(struct)] = keys
+	for key in keys:
+		value = getattr(struct, key)
+		if value in id_map:
+			try:
+				setattr(struct, key, id_map[value])
+			except (AttributeError, TypeError):
+				pass
+
+def copy_constraints(source: Any, target: Any, id_map: dict) -> None:
+	"""Replaces constraints on an object or pose bone, remapping their targets"""
+	for con in list(target.constraints):
+		target.constraints.remove(con)
+	for con_source in source.constraints:
+		con_target = target.constraints.new(con_source.type)
+		copy_attributes(con_source, con_target)
+		# Armature constraints keep their targets in a collection
+		if con_source.type == "ARMATURE":
+			for t_source in con_source.targets:
+				t_target = con_target.targets.new()
+				t_target.target = id_map.get(t_source.target, t_source.target)
+				t_target.subtarget = t_source.subtarget
+				t_target.weight = t_source.weight
+		remap_pointers(con_target, id_map)
+
 def copy_driver(
 	source_fcurve: bpy.types.FCurve,
 	target_obj: bpy.types.Object,
 	data_path: Optional[str] = None,
 	index: Optional[str] = None,
+	id_map: Optional[dict] = None,
 ) -> bpy.types.FCurve:
 	if not data_path:
 		data_path = source_fcurve.data_path
@@ -157,25 +289,32 @@ def copy_driver(
 		v2 = new_fc.driver.variables.new()
 		copy_attributes(v1, v2)
 		for i in range(len(v1.targets)):
+			# ID type has to be set first, otherwise the ID is rejected
+			try:
+				v2.targets[i].id_type = v1.targets[i].id_type
+			except (AttributeError, TypeError):
+				pass
 			copy_attributes(v1.targets[i], v2.targets[i])
+			if id_map and v1.targets[i].id in id_map:
+				v2.targets[i].id = id_map[v1.targets[i].id]
 
 	return new_fc
 
-def copy_drivers(source_ob: bpy.types.Object, target_ob: bpy.types.Object) -> None:
-	"""Copy all drivers from one object to another."""
+def copy_drivers(source_ob: bpy.types.Object, target_ob: bpy.types.Object, id_map: Optional[dict] = None) -> None:
+	"""Copy all drivers from one object to another, `id_map` remaps driver targets."""
 	if not hasattr(source_ob, "animation_data") or not source_ob.animation_data:
 		return
 
 	for fc in source_ob.animation_data.drivers:
-		copy_driver(fc, target_ob)
+		copy_driver(fc, target_ob, id_map=id_map)
 
 def copy_rigging_object_data(
-	source_ob: bpy.types.Object, target_ob: bpy.types.Object
+	source_ob: bpy.types.Object, target_ob: bpy.types.Object, id_map: Optional[dict] = None
 ) -> None:
-	"""Copy all object data that could be relevant to rigging."""
-	# TODO: Object constraints, if needed.
-	copy_drivers(source_ob, target_ob)
-	copy_parenting(source_ob, target_ob)
+	"""Copy all object data that could be relevant to rigging, `id_map` remaps targets."""
+	copy_drivers(source_ob, target_ob, id_map)
+	copy_parenting(source_ob, target_ob, id_map)
+	copy_constraints(source_ob, target_ob, id_map or {})
 	# HACK: For some reason Armature constraints on grooming objects lose their target when updating? Very strange...
 	for c in target_ob.constraints:
 		if c.type == "ARMATURE":
@@ -216,119 +355,79 @@ def closest_edge_on_face_to_line(face, p1, p2, skip_edges=None):
 			return edge
 	return None
 
-def interpolate_data_from_face(bm_source, tris_dict, face, p, data_layer_source, data_suffix = ''):
-	""" Returns interpolated value of a data layer within a face closest to a point."""
-	(tri, point) = closest_tri_on_face(tris_dict, face, p)
-	if not tri:
-		return None
-	weights = mathutils.interpolate.poly_3d_calc([tri[i].vert.co for i in range(3)], point)
+# Number of floats per item in face corner data layers
+_corner_widths = {"uv": 2, "color": 4}
 
-	if not data_suffix:
-		cols_weighted = [weights[i] * np.array(data_layer_source[tri[i].index]) for i in range(3)]
-		col = sum(np.array(cols_weighted))
-	else:
-		cols_weighted = [weights[i] * np.array(getattr(data_layer_source[tri[i].index], data_suffix)) for i in range(3)]
-		col = sum(np.array(cols_weighted))
-	return col
-
-def closest_face_to_point(bm_source, p_target, bvh_tree = None):
-	if not bvh_tree:
-		bvh_tree = mathutils.bvhtree.BVHTree.FromBMesh(bm_source)
-	(loc, norm, index, distance) = bvh_tree.find_nearest(p_target)
-	return bm_source.faces[index]
-
-def tris_per_face(bm_source):
-	tris_source = bm_source.calc_loop_triangles()
-	tris_dict = dict()
-	for face in bm_source.faces:
-		tris_face = []
-		for i in range(len(tris_source))[::-1]:
-			if tris_source[i][0] in face.loops:
-				tris_face.append(tris_source.pop(i))
-		tris_dict[face] = tris_face
-	return tris_dict
-
-def closest_tri_on_face(tris_dict, face, p):
-	points = []
-	dist = []
-	tris = []
-	for tri in tris_dict[face]:
-		point = mathutils.geometry.closest_point_on_tri(p, *[tri[i].vert.co for i in range(3)])
-		tris.append(tri)
-		points.append(point)
-		dist.append((point - p).length)
-	min_idx = np.argmin(np.array(dist))
-	point = points[min_idx]
-	tri = tris[min_idx]
-	return (tri, point)
-
-def transfer_corner_data(obj_source, obj_target, data_layer_source, data_layer_target, data_suffix = ''):
+def transfer_corner_data(obj_source, obj_target, data_layer_source, data_layer_target, data_suffix: str, corr: Optional[Correspondence] = None):
 	"""
 	Transfers interpolated face corner data from data layer of a source object to data layer of a
 	target object, while approximately preserving data seams (e.g. necessary for UV Maps).
 	The transfer is face interpolated per target corner within the source face that is closest
 	to the target corner point and does not have any data seams on the way back to the
-	source face that is closest to the target face's center.
+	source face that is closest to the target face's center.\n
+	`corr` shares proximity lookups between passes, see `CorrespondenceCache`.
+	"""
+	if not corr:
+		corr = CorrespondenceCache().get(obj_source, obj_target)
+		if not corr:
+			return
+
+	# Corners enclosed by the source face nearest to their polygon interpolate in bulk
+	values_source = read_array(data_layer_source, data_suffix, _corner_widths[data_suffix], np.float32)
+	values_target = corr.corner_values(values_source)
+
+	# Remaining corners traverse faces between point and face center
+	unenclosed = corr.unenclosed_corners()
+	if len(unenclosed):
+		bm_source = corr.source_bmesh()
+		target_co = read_array(obj_target.data.vertices, "co", 3, np.float32)
+		target_centers = read_array(obj_target.data.polygons, "center", 3, np.float32)
+
+	for corner in unenclosed.tolist():
+		poly_target = corr.loop_poly[corner]
+		face_target_center = mathutils.Vector(target_centers[poly_target])
+		face_source = bm_source.faces[int(corr.poly_face[poly_target])]
+
+		# Find nearest face on target compared to face that loop belongs to
+		vert_target = corr.loop_vert[corner]
+		p = mathutils.Vector(target_co[vert_target])
+		face_source_closest = bm_source.faces[int(corr.vert_face[vert_target])]
+
+		traversed_faces = set()
+		traversed_edges = set()
+		face_source_int = face_source
+		while (face_source_int is not face_source_closest):
+			traversed_faces.add(face_source_int)
+			edge = closest_edge_on_face_to_line(face_source_int, face_target_center, p, skip_edges = traversed_edges)
+			if edge == None:
+				break
+			if len(edge.link_faces) != 2:
+				break
+			traversed_edges.add(edge)
+
+			split = edge_data_split(edge, data_layer_source, data_suffix)
+			if split:
+				break
+
+			# Set new source face to other face belonging to edge
+			face_source_int = edge.link_faces[1] if edge.link_faces[1] is not face_source_int else edge.link_faces[0]
+
+			# Avoid looping behaviour
+			if face_source_int in traversed_faces:
+				face_source_int = face_source
+				break
+
+		# Interpolate data from selected face
+		(loops, weights) = corr.closest_on_face(face_source_int.index, p)
+		values_target[corner] = weights @ values_source[loops]
+
+	data_layer_target.foreach_set(data_suffix, values_target.ravel())
+
+def transfer_shapekeys_proximity(obj_source, obj_target, corr: Optional[Correspondence] = None) -> None:
+	"""
+	Transfers shapekeys from one object to another based on the mesh proximity with face interpolation.\n
+	`corr` shares proximity lookups between passes, see `CorrespondenceCache`.
 	"""
-	bm_source = bmesh.new()
-	bm_source.from_mesh(obj_source.data)
-	bm_source.faces.ensure_lookup_table()
-	bm_target = bmesh.new()
-	bm_target.from_mesh(obj_target.data)
-	bm_target.faces.ensure_lookup_table()
-
-	bvh_tree = mathutils.bvhtree.BVHTree.FromBMesh(bm_source)
-	tris_dict = tris_per_face(bm_source)
-
-	for face_target in bm_target.faces:
-		face_target_center = face_target.calc_center_median()
-
-		face_source = closest_face_to_point(bm_source, face_target_center, bvh_tree)
-
-		for corner_target in face_target.loops:
-			# Find nearest face on target compared to face that loop belongs to
-			p = corner_target.vert.co
-
-			face_source_closest = closest_face_to_point(bm_source, p, bvh_tree)
-			enclosed = face_source_closest is face_source
-			face_source_int = face_source
-			if not enclosed:
-				# Traverse faces between point and face center
-				traversed_faces = set()
-				traversed_edges = set()
-				while (face_source_int is not face_source_closest):
-					traversed_faces.add(face_source_int)
-					edge = closest_edge_on_face_to_line(face_source_int, face_target_center, p, skip_edges = traversed_edges)
-					if edge == None:
-						break
-					if len(edge.link_faces) != 2:
-						break
-					traversed_edges.add(edge)
-
-					split = edge_data_split(edge, data_layer_source, data_suffix)
-					if split:
-						break
-
-					# Set new source face to other face belonging to edge
-					face_source_int = edge.link_faces[1] if edge.link_faces[1] is not face_source_int else edge.link_faces[0]
-
-					# Avoid looping behaviour
-					if face_source_int in traversed_faces:
-						face_source_int = face_source
-						break
-
-			# Interpolate data from selected face
-			col = interpolate_data_from_face(bm_source, tris_dict, face_source_int, p, data_layer_source, data_suffix)
-			if col is None:
-				continue
-			if not data_suffix:
-				data_layer_target.data[corner_target.index] = col
-			else:
-				setattr(data_layer_target[corner_target.index], data_suffix, list(col))
-	return
-
-def transfer_shapekeys_proximity(obj_source, obj_target) -> None:
-	"""Transfers shapekeys from one object to another based on the mesh proximity with face interpolation."""
 	# Copy shapekey layout
 	if not obj_source.data.shape_keys:
 		return
@@ -344,32 +443,33 @@ def transfer_shapekeys_proximity(obj_source, obj_target) -> None:
 		sk_target.vertex_group = sk_source.vertex_group
 		sk_target.relative_key = obj_target.data.shape_keys.key_blocks[sk_source.relative_key.name]
 
-	bm_source = bmesh.new()
-	bm_source.from_mesh(obj_source.data)
-	bm_source.faces.ensure_lookup_table()
-
-	bvh_tree = mathutils.bvhtree.BVHTree.FromBMesh(bm_source)
-
-	tris_dict = tris_per_face(bm_source)
-
-	for i, vert in enumerate(obj_target.data.vertices):
-		p = vert.co
-		face = closest_face_to_point(bm_source, p, bvh_tree)
+	if not corr:
+		corr = CorrespondenceCache().get(obj_source, obj_target)
+		if not corr:
+			return
 
-		(tri, point) = closest_tri_on_face(tris_dict, face, p)
-		if not tri:
+	# Shapekeys are interpolated as offsets from the source vertices
+	source_co = read_array(obj_source.data.vertices, "co", 3, np.float32)
+	target_co = read_array(obj_target.data.vertices, "co", 3, np.float32)
+	for sk_target in obj_target.data.shape_keys.key_blocks:
+		sk_source = obj_source.data.shape_keys.key_blocks.get(sk_target.name)
+		if not sk_source:
 			continue
-		weights = mathutils.interpolate.poly_3d_calc([tri[i].vert.co for i in range(3)], point)
+		offsets = read_array(sk_source.data, "co", 3, np.float32) - source_co
+		sk_target.data.foreach_set("co", (target_co + corr.vertex_values(offsets)).ravel())
 
-		for sk_target in obj_target.data.shape_keys.key_blocks:
-			sk_source = obj_source.data.shape_keys.key_blocks.get(sk_target.name)
-
-			vals_weighted = [weights[i] * (sk_source.data[tri[i].vert.index].co-obj_source.data.vertices[tri[i].vert.index].co) for i in range(3)]
-			val = mathutils.Vector(sum(np.array(vals_weighted)))
-			sk_target.data[i].co = vert.co + val
+def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Object, topo_match: bool,
+		corr: Optional[Correspondence] = None, remap: Optional[TopologyRemap] = None):
+	"""
+	Transfers materials, UVs, seams, vertex colors and face data.\n
+	`corr` shares proximity lookups between passes, see `CorrespondenceCache`.\n
+	`remap` transfers by index between reordered meshes, see `match_topology_remap`.
+	"""
+	transfer_material_slots(obj_source, obj_target)
+	transfer_surfacing_data(obj_source, obj_target, topo_match, corr, remap)
 
-def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Object, topo_match: bool):
-	"""Transfers materials, UVs, seams, vertex colors and face data"""
+def transfer_material_slots(obj_source: bpy.types.Object, obj_target: bpy.types.Object) -> None:
+	"""Transfers material slots, these live on the object so they're needed per object"""
 	# Wipe our material slots
 	while len(obj_target.material_slots) > len(obj_source.material_slots):
 		obj_target.active_material_index = len(obj_source.material_slots)
@@ -385,6 +485,9 @@ def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Objec
 	# Transfer active material slot
 	obj_target.active_material_index = obj_source.active_material_index
 
+def transfer_surfacing_data(obj_source: bpy.types.Object, obj_target: bpy.types.Object, topo_match: bool,
+		corr: Optional[Correspondence] = None, remap: Optional[TopologyRemap] = None):
+	"""Transfers face data only, objects sharing data only need this once"""
 	# Transfer material slot assignments for curve
 	if obj_target.type == "CURVE":
 		if not obj_target.data.splines:
@@ -404,30 +507,36 @@ def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Objec
 	# Placeholder for transfer source object
 	obj_source_original: bpy.types.Object = None
 
+	# Index lookups, either matching or reordered topology
+	by_index = topo_match or remap
+	polys = remap.polys if remap else slice(None)
+	edges = remap.edges if remap else slice(None)
+	loops = remap.loops if remap else slice(None)
+
 	# Transfer face data
-	if topo_match:
-		for pol_to, pol_from in zip(obj_target.data.polygons, obj_source.data.polygons):
-			pol_to.material_index = pol_from.material_index
-			pol_to.use_smooth = pol_from.use_smooth
+	if by_index:
+		material_index = read_array(obj_source.data.polygons, "material_index", 1, np.int32)
+		use_smooth = read_array(obj_source.data.polygons, "use_smooth", 1, bool)
+		obj_target.data.polygons.foreach_set("material_index", material_index[polys])
+		obj_target.data.polygons.foreach_set("use_smooth", use_smooth[polys])
 	else:
-		# Generate new transfer source object, required to fix raycasting issues
-		obj_source_original = bpy.data.objects.new(f"{obj_source.name}.original", obj_source.data)
-		bpy.context.scene.collection.objects.link(obj_source_original)
-
-		depsgraph = bpy.context.evaluated_depsgraph_get()
-		obj_source_eval = obj_source_original.evaluated_get(depsgraph)
-		for pol_target in obj_target.data.polygons:
-			# This breaks unless the object is in the same scene, hence the transfer object
-			(hit, loc, norm, face_index) = obj_source_eval.closest_point_on_mesh(pol_target.center)
-			pol_source = obj_source_eval.data.polygons[face_index]
-			pol_target.material_index = pol_source.material_index
-			pol_target.use_smooth = pol_source.use_smooth
+		if not corr:
+			corr = CorrespondenceCache().get(obj_source, obj_target)
+		if corr:
+			# Take face data from the source polygon nearest to each target polygon
+			material_index = read_array(obj_source.data.polygons, "material_index", 1, np.int32)
+			use_smooth = read_array(obj_source.data.polygons, "use_smooth", 1, bool)
+			obj_target.data.polygons.foreach_set("material_index", material_index[corr.poly_face])
+			obj_target.data.polygons.foreach_set("use_smooth", use_smooth[corr.poly_face])
 
 	# Transfer UV Seams
-	if topo_match:
-		for edge_from, edge_to in zip(obj_source.data.edges, obj_target.data.edges):
-			edge_to.use_seam = edge_from.use_seam
+	if by_index:
+		use_seam = read_array(obj_source.data.edges, "use_seam", 1, bool)
+		obj_target.data.edges.foreach_set("use_seam", use_seam[edges])
 	else:
+		# Generate new transfer source object, required to fix raycasting issues
+		obj_source_original = bpy.data.objects.new(f"{obj_source.name}.original", obj_source.data)
+		bpy.context.scene.collection.objects.link(obj_source_original)
 		bpy.ops.object.data_transfer(
 			{
 				"object": obj_source_original,
@@ -444,15 +553,15 @@ def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Objec
 		obj_target.data.uv_layers.remove(obj_target.data.uv_layers[0])
 
 	# Transfer UV layers
-	if topo_match:
+	if by_index:
 		for uv_from in obj_source.data.uv_layers:
 			uv_to = obj_target.data.uv_layers.new(name=uv_from.name, do_init=False)
-			for loop in obj_target.data.loops:
-				uv_to.data[loop.index].uv = uv_from.data[loop.index].uv
+			uvs = read_array(uv_from.data, "uv", 2, np.float32)
+			uv_to.data.foreach_set("uv", uvs[loops].ravel())
 	else:
 		for uv_from in obj_source.data.uv_layers:
 			uv_to = obj_target.data.uv_layers.new(name=uv_from.name, do_init=False)
-			transfer_corner_data(obj_source, obj_target, uv_from.data, uv_to.data, data_suffix="uv")
+			transfer_corner_data(obj_source, obj_target, uv_from.data, uv_to.data, data_suffix="uv", corr=corr)
 
 	# Make sure correct layer is active
 	for uv_l in obj_source.data.uv_layers:
@@ -465,15 +574,15 @@ def transfer_surfacing(obj_source: bpy.types.Object, obj_target: bpy.types.Objec
 		obj_target.data.vertex_colors.remove(obj_target.data.vertex_colors[0])
 
 	# Transfer vertex colors
-	if topo_match:
+	if by_index:
 		for vcol_from in obj_source.data.vertex_colors:
 			vcol_to = obj_target.data.vertex_colors.new(name=vcol_from.name, do_init=False)
-			for loop in obj_target.data.loops:
-				vcol_to.data[loop.index].color = vcol_from.data[loop.index].color
+			colors = read_array(vcol_from.data, "color", 4, np.float32)
+			vcol_to.data.foreach_set("color", colors[loops].ravel())
 	else:
 		for vcol_from in obj_source.data.vertex_colors:
 			vcol_to = obj_target.data.vertex_colors.new(name=vcol_from.name, do_init=False)
-			transfer_corner_data(obj_source, obj_target, vcol_from.data, vcol_to.data, data_suffix="color")
+			transfer_corner_data(obj_source, obj_target, vcol_from.data, vcol_to.data, data_suffix="color", corr=corr)
 
 	# Set 'PREVIEW' vertex color layer as active
 	for idx, vcol in enumerate(obj_target.data.vertex_colors):
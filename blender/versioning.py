@@ -0,0 +1,184 @@
+from typing import Callable, Optional
+import getpass, os, re, threading, time, uuid
+
+# Files are named "asset_v001.blend", versions are parsed rather than trusting name order,
+# so "v1000" still sorts after "v999" and gaps don't shift later versions.
+version_pattern = re.compile(r"_v(\d+)\.blend$")
+
+# Many artists and farm machines write versions at once. Versions are claimed by creating
+# a reservation file with O_EXCL, which is atomic on local disks, NFS and SMB shares.
+# Files are written under a temporary name and renamed, so a version either exists fully or not at all.
+# A crashed writer leaves its reservation behind, that version is skipped rather than reused.
+reservation_suffix = ".reserved"
+
+def parse_version(path: str) -> Optional[int]:
+	"""Returns the version in a file name, or None if it doesn't have one"""
+	match = version_pattern.search(path)
+	return int(match.group(1)) if match else None
+
+def list_versions(folder: str) -> "list[str]":
+	"""Returns every .blend file in a folder, oldest version first"""
+	if not os.path.isdir(folder):
+		return []
+	paths = [entry.path for entry in os.scandir(folder) if entry.name.endswith(".blend")]
+	return sorted(paths, key=lambda path: (parse_version(path) or 0, path))
+
+def find_version(versions: "list[str]", version: int) -> Optional[str]:
+	"""
+	Finds a specific version in a list from `list_versions`.\n
+	Zero or negative returns the latest version.
+	"""
+	if not versions:
+		return None
+	if version <= 0:
+		return versions[-1]
+	for path in versions:
+		if parse_version(path) == version:
+			return path
+	# Older files might not follow the naming, versions start at 1
+	if version <= len(versions) and parse_version(versions[version - 1]) is None:
+		return versions[version - 1]
+	return None
+
+def build_versions(database: str, assets: "list[str]") -> "dict[str, list[str]]":
+	"""Lists builds of many assets at once, keyed by asset name"""
+	build_folder = os.path.join(database, "build")
+	return {asset: list_versions(os.path.join(build_folder, asset)) for asset in set(assets)}
+
+def latest_published(folder: str) -> int:
+	"""Returns the latest version written to a folder, zero if there's none"""
+	versions = list_versions(folder)
+	if not versions:
+		return 0
+	return parse_version(versions[-1]) or len(versions)
+
+def latest_reserved(folder: str) -> int:
+	"""Returns the latest version written or reserved in a folder, zero if there's none"""
+	latest = 0
+	if not os.path.isdir(folder):
+		return latest
+	for entry in os.scandir(folder):
+		name = entry.name
+		if name.endswith(reservation_suffix):
+			name = name[:-len(reservation_suffix)]
+		latest = max(latest, parse_version(name) or 0)
+	return latest
+
+def reserve_version(folder: str, prefix: str) -> "tuple[int, str]":
+	"""
+	Claims the next version in a folder, returns it and the path to write.\n
+	Files are named "prefix_v001.blend". Call `release_version` once the file exists.
+	"""
+	os.makedirs(folder, exist_ok=True)
+	version = latest_reserved(folder) + 1
+	while True:
+		path = os.path.join(folder, f"{prefix}_v{version:03d}.blend")
+		try:
+			fd = os.open(path + reservation_suffix, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+		except FileExistsError:
+			# Someone else got there first
+			version += 1
+			continue
+		os.write(fd, f"{getpass.getuser()} {os.getpid()} {time.time()}".encode())
+		os.close(fd)
+		if os.path.exists(path):
+			# Written by something which doesn't reserve versions
+			os.remove(path + reservation_suffix)
+			version += 1
+			continue
+		return (version, path)
+
+def release_version(path: str) -> None:
+	"""Removes the reservation of a written version"""
+	try:
+		os.remove(path + reservation_suffix)
+	except FileNotFoundError:
+		pass
+
+def write_atomic(path: str, write: Callable[[str], None]) -> None:
+	"""Calls `write` with a temporary path, then renames it to `path`"""
+	temp_path = f"{path}.{os.getpid()}.tmp"
+	try:
+		write(temp_path)
+		os.replace(temp_path, path)
+	finally:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+class FileLock:
+	"""
+	Lock shared between machines, held by creating a lock file with O_EXCL.\n
+	Holders touch the lock file every few seconds, locks untouched for `stale` seconds
+	are assumed to belong to a crashed writer and are broken.
+	"""
+	def __init__(self, path: str, timeout: float=30.0, stale: float=120.0):
+		self.path = path
+		self.timeout = timeout
+		self.stale = stale
+		# Written into the lock file, tells our lock apart from a newer one
+		self.token = f"{getpass.getuser()} {os.getpid()} {uuid.uuid4().hex}"
+		self.__stop = threading.Event()
+		self.__heartbeat: Optional[threading.Thread] = None
+
+	def __read(self, path: str) -> str:
+		with open(path) as file:
+			return file.read()
+
+	def __break_stale(self) -> None:
+		"""Removes the lock file if it's stale, safe while others try the same"""
+		try:
+			if time.time() - os.path.getmtime(self.path) <= self.stale:
+				return
+			token = self.__read(self.path)
+			# Only one waiter can rename it, a unique name means nobody else removes ours
+			stale_path = f"{self.path}.{uuid.uuid4().hex}.stale"
+			os.rename(self.path, stale_path)
+		except FileNotFoundError:
+			# Released or broken while we were checking
+			return
+		try:
+			if self.__read(stale_path) != token:
+				# Someone broke it and took the lock in between, give theirs back
+				try:
+					os.link(stale_path, self.path)
+				except OSError:
+					pass
+		finally:
+			os.remove(stale_path)
+
+	def __touch(self) -> None:
+		"""Keeps the lock fresh while it's held"""
+		while not self.__stop.wait(self.stale / 4):
+			try:
+				os.utime(self.path)
+			except OSError:
+				pass
+
+	def __enter__(self):
+		start = time.monotonic()
+		while True:
+			try:
+				fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+				break
+			except FileExistsError:
+				pass
+			self.__break_stale()
+			if time.monotonic() - start > self.timeout:
+				raise TimeoutError(f"Couldn't lock {self.path} within {self.timeout:.0f}s")
+			time.sleep(0.05)
+		os.write(fd, self.token.encode())
+		os.close(fd)
+		self.__stop.clear()
+		self.__heartbeat = threading.Thread(target=self.__touch, daemon=True)
+		self.__heartbeat.start()
+		return self
+
+	def __exit__(self, *args):
+		self.__stop.set()
+		self.__heartbeat.join()
+		try:
+			# Never remove a lock someone else holds
+			if self.__read(self.path) == self.token:
+				os.remove(self.path)
+		except FileNotFoundError:
+			pass
@@ -0,0 +1,81 @@
+from typing import Optional
+import bpy
+import numpy as np
+
+from .utils import *
+from .correspondence import Correspondence
+from .topology import TopologyRemap
+
+# Vertex group weights are stored sparsely, as (vertex indices, weights) per group name.
+# Blender can't read weights in bulk, so reading loops vertices once for all groups.
+# Writing batches vertices sharing a weight, since `VertexGroup.add` takes many indices per weight.
+
+# Interpolated weights below this are dropped to keep groups sparse
+min_weight = 1e-6
+
+def read_vertex_groups(obj: bpy.types.Object) -> "dict[str, tuple[np.ndarray, np.ndarray]]":
+	"""Reads all vertex group weights of a mesh object, keyed by group name"""
+	entries = [(v.index, g.group, g.weight) for v in obj.data.vertices for g in v.groups]
+	names = [vg.name for vg in obj.vertex_groups]
+	groups = {name: (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for name in names}
+	if not entries:
+		return groups
+
+	indices, group_ids, weights = zip(*entries)
+	indices = np.array(indices, dtype=np.int64)
+	group_ids = np.array(group_ids, dtype=np.int64)
+	weights = np.array(weights, dtype=np.float32)
+
+	# Split entries per group
+	order = np.argsort(group_ids, kind="stable")
+	bounds = np.searchsorted(group_ids[order], np.arange(len(names) + 1))
+	for i, name in enumerate(names):
+		group = order[bounds[i]:bounds[i + 1]]
+		groups[name] = (indices[group], weights[group])
+	return groups
+
+def write_vertex_group(obj: bpy.types.Object, name: str, indices: np.ndarray, weights: np.ndarray) -> None:
+	"""Replaces the weights of a vertex group, creating it by name if needed"""
+	vg = obj.vertex_groups.get(name)
+	if not vg:
+		vg = obj.vertex_groups.new(name=name)
+	vg.remove(list(range(len(obj.data.vertices))))
+	if not len(indices):
+		return
+
+	# One call per unique weight, rig weights are mostly 0 or 1 so this is usually tiny
+	unique, inverse = np.unique(weights, return_inverse=True)
+	order = np.argsort(inverse, kind="stable")
+	bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+	for i, weight in enumerate(unique.tolist()):
+		vg.add(indices[order[bounds[i]:bounds[i + 1]]].tolist(), weight, "REPLACE")
+
+def transfer_vertex_groups(obj_source: bpy.types.Object, obj_target: bpy.types.Object,
+		remap: Optional[TopologyRemap]=None, corr: Optional[Correspondence]=None) -> None:
+	"""
+	Transfers vertex group weights by group name.\n
+	Matching topology copies by index, `remap` handles reordered meshes.\n
+	Mismatching topology interpolates weights with `corr`, see `CorrespondenceCache`.
+	"""
+	source_groups = read_vertex_groups(obj_source)
+	if not source_groups:
+		return
+
+	# Source index to target index, remap goes the other way
+	inverse = None
+	if remap:
+		inverse = np.empty(len(remap.verts), dtype=np.int64)
+		inverse[remap.verts] = np.arange(len(remap.verts))
+
+	source_count = len(obj_source.data.vertices)
+	for name, (indices, weights) in source_groups.items():
+		if corr:
+			# Interpolate a dense column, then drop empty weights again
+			column = np.zeros(source_count, dtype=np.float32)
+			column[indices] = weights
+			target_weights = corr.vertex_values(column)
+			indices = np.flatnonzero(target_weights > min_weight)
+			weights = target_weights[indices]
+		elif inverse is not None:
+			indices = inverse[indices]
+		write_vertex_group(obj_target, name, indices, weights)
@@ -0,0 +1,338 @@
+"""
+Watches the database for publishes and rebuilds only what they affect.\n
+Run with plain Python next to the addon: `python watcher.py --database D:/master --shots D:/shots`\n
+`python watcher.py --database D:/master --status` shows the queue of a running watcher.\n
+This runs outside Blender, so it only uses the standard library and modules which don't import bpy.
+"""
+from typing import Any, Optional
+import argparse, json, os, subprocess, sys, time
+
+# These are standalone and sit next to this script
+from versioning import *
+from blend_reader import read_tags
+from update_shots import worker_command
+
+# Someone used to type asset names into build.bat after every publish. The watcher polls
+# layer folders, cheaply since a folder's mtime only changes when files are added or renamed.
+# Bursts of publishes are debounced per asset. Builds and shot files are indexed by the
+# layer versions they contain, so only files using an older version are queued.
+# Builds of other assets instancing a published asset are rebuilt once its own build is done.
+
+script_folder = os.path.dirname(os.path.abspath(__file__))
+
+def watcher_folder(database: str) -> str:
+	"""Folder holding the index and queue status"""
+	folder = os.path.join(database, "watcher")
+	os.makedirs(folder, exist_ok=True)
+	return folder
+
+def write_json(path: str, data: Any) -> None:
+	"""Writes JSON through a temporary file, readers never see half a file"""
+	def write(temp_path: str) -> None:
+		with open(temp_path, "w") as file:
+			json.dump(data, file, indent="\t")
+	write_atomic(path, write)
+
+def used_versions(path: str) -> "dict[str, int]":
+	"""Returns the newest version of each "asset/layer" a .blend file contains"""
+	uses = {}
+	for block in read_tags(path):
+		asset = block.tags.get("sg_asset")
+		layer = block.tags.get("sg_layer")
+		version = block.tags.get("sg_version")
+		if not asset or not layer or not isinstance(version, int):
+			continue
+		key = f"{asset}/{layer}"
+		uses[key] = max(uses.get(key, 0), version)
+	return uses
+
+class DependencyIndex:
+	"""
+	Maps files to the layer versions they use, and layers back to the files using them.\n
+	Saved between runs, files are only read again when their mtime changes.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		# Path -> {"mtime": float, "uses": {"asset/layer": version}}
+		self.files: "dict[str, dict[str, Any]]" = {}
+		# "asset/layer" -> paths
+		self.users: "dict[str, set[str]]" = {}
+		if os.path.isfile(path):
+			with open(path) as file:
+				self.files = json.load(file)
+		self.__index_users()
+
+	def __index_users(self) -> None:
+		self.users.clear()
+		for path, info in self.files.items():
+			for key in info["uses"]:
+				self.users.setdefault(key, set()).add(path)
+
+	def refresh(self, paths: "list[str]") -> int:
+		"""Reads new or changed files, forgets missing ones, returns how many were read"""
+		read = 0
+		files = {}
+		for path in paths:
+			try:
+				mtime = os.path.getmtime(path)
+			except OSError:
+				continue
+			info = self.files.get(path)
+			if not info or info["mtime"] != mtime:
+				try:
+					info = {"mtime": mtime, "uses": used_versions(path)}
+				except Exception as err:
+					print(f"WARNING: Couldn't read {path}: {err}")
+					continue
+				read += 1
+			files[path] = info
+		changed = read or len(files) != len(self.files)
+		self.files = files
+		if changed:
+			self.__index_users()
+			write_json(self.path, self.files)
+		return read
+
+	def affected(self, asset: str, layer: str, version: int) -> "list[str]":
+		"""Files using an older version of a layer"""
+		key = f"{asset}/{layer}"
+		return sorted(path for path in self.users.get(key, ()) if self.files[path]["uses"][key] < version)
+
+class Job:
+	"""Rebuild or shot update waiting in the queue"""
+	def __init__(self, kind: str, target: str, asset: str, command: "list[str]"):
+		self.kind = kind
+		self.target = target
+		self.assets = [asset]
+		self.command = command
+		self.state = "Queued"
+		self.queued = time.time()
+		self.finished = 0.0
+		self.process: Optional[subprocess.Popen] = None
+		# Jobs which must finish first, eg. builds of assets this build instances
+		self.after: "list[Job]" = []
+
+	def depends_on(self, job: "Job") -> bool:
+		"""Whether this waits for `job`, directly or through other jobs"""
+		return any(dep is job or dep.depends_on(job) for dep in self.after)
+
+	def wait_for(self, job: "Job") -> None:
+		"""Starts this after `job` finishes, never waits on something waiting on us"""
+		if job is not self and job not in self.after and not job.depends_on(self):
+			self.after.append(job)
+
+	def to_dict(self) -> dict:
+		return {
+			"kind": self.kind, "target": self.target, "assets": self.assets, "state": self.state,
+			"queued": self.queued, "finished": self.finished, "after": [dep.target for dep in self.after],
+		}
+
+class Watcher:
+	"""Polls layer folders, debounces publishes and runs the affected jobs"""
+	def __init__(self, database: str, shots: "list[str]", blender: str, debounce: float=10.0, workers: int=1):
+		self.database = database
+		self.shots = shots
+		self.blender = blender
+		self.debounce = debounce
+		self.workers = workers
+		self.folder = watcher_folder(database)
+		# Shot update reports, see update_shots.py
+		self.reports = os.path.join(self.folder, "reports")
+		os.makedirs(self.reports, exist_ok=True)
+		self.index = DependencyIndex(os.path.join(self.folder, "index.json"))
+		# Layer folder -> (mtime, latest version)
+		self.folders: "dict[str, tuple[float, int]]" = {}
+		# Asset -> (time of last publish, {layer: version})
+		self.pending: "dict[str, tuple[float, dict[str, int]]]" = {}
+		self.queue: "list[Job]" = []
+
+	def scan_folders(self) -> "list[tuple[str, str, int]]":
+		"""Returns (asset, layer, version) for every layer published since the last scan"""
+		published = []
+		wip_folder = os.path.join(self.database, "wip")
+		if not os.path.isdir(wip_folder):
+			return published
+		for asset in os.scandir(wip_folder):
+			if not asset.is_dir():
+				continue
+			for layer in os.scandir(asset.path):
+				if not layer.is_dir():
+					continue
+				mtime = layer.stat().st_mtime
+				old = self.folders.get(layer.path)
+				if old and old[0] == mtime:
+					continue
+				version = latest_published(layer.path)
+				self.folders[layer.path] = (mtime, version)
+				# The first scan only learns what exists
+				if old and version > old[1]:
+					published.append((asset.name, layer.name, version))
+		return published
+
+	def indexed_files(self) -> "list[str]":
+		"""Latest build of each asset and every shot file"""
+		paths = []
+		build_folder = os.path.join(self.database, "build")
+		if os.path.isdir(build_folder):
+			for entry in os.scandir(build_folder):
+				if entry.is_dir():
+					versions = list_versions(entry.path)
+					if versions:
+						paths.append(versions[-1])
+		for folder in self.shots:
+			for root, _, names in os.walk(folder):
+				paths.extend(os.path.join(root, name) for name in names if name.endswith(".blend"))
+		return paths
+
+	def enqueue(self, kind: str, target: str, asset: str, command: "list[str]", after: "Optional[list[Job]]"=None) -> Job:
+		"""Queues a job, merging it with a queued job for the same file"""
+		for job in self.queue:
+			if job.state == "Queued" and job.kind == kind and job.target == target:
+				if asset not in job.assets:
+					job.assets.append(asset)
+				break
+		else:
+			job = Job(kind, target, asset, command)
+			self.queue.append(job)
+		for dep in after or []:
+			job.wait_for(dep)
+		return job
+
+	def build_command(self, asset: str) -> "list[str]":
+		"""Command rebuilding an asset in a headless Blender"""
+		return [
+			self.blender, "-b", "--python-use-system-env",
+			"-P", os.path.join(script_folder, "clean.py"), "-P", os.path.join(script_folder, "build.py"),
+			"--", "--asset", asset,
+		]
+
+	def flush_pending(self) -> None:
+		"""Queues jobs for assets which stopped publishing for `debounce` seconds"""
+		now = time.time()
+		for asset, (last, layers) in list(self.pending.items()):
+			if now - last < self.debounce:
+				continue
+			del self.pending[asset]
+			print(f"{asset} published {', '.join(f'{layer} v{version:03d}' for layer, version in layers.items())}")
+
+			build = self.enqueue("Build", asset, asset, self.build_command(asset))
+			affected = set()
+			for layer, version in layers.items():
+				affected.update(self.index.affected(asset, layer, version))
+
+			# Builds are named "build/asset/asset_v001.blend", other assets instancing this one are rebuilt after it
+			build_folder = os.path.normpath(os.path.join(self.database, "build"))
+			users: "dict[str, str]" = {}
+			for path in sorted(affected):
+				if os.path.normpath(os.path.dirname(os.path.dirname(path))) == build_folder:
+					user = os.path.basename(os.path.dirname(path))
+					if user != asset:
+						users[user] = path
+				else:
+					self.enqueue("Update", path, asset, worker_command(self.blender, [path], self.reports))
+
+			jobs = {user: self.enqueue("Build", user, asset, self.build_command(user), [build]) for user in users}
+			# Builds instancing other affected builds wait for those too
+			for user, path in users.items():
+				uses = self.index.files[path]["uses"]
+				for other, job in jobs.items():
+					if other != user and any(key.startswith(f"{other}/") for key in uses):
+						jobs[user].wait_for(job)
+
+	def run_jobs(self) -> None:
+		"""Starts queued jobs while workers are free, finishes ended ones"""
+		for job in self.queue:
+			if job.state == "Running" and job.process.poll() is not None:
+				job.state = "Done" if job.process.returncode == 0 else f"Failed ({job.process.returncode})"
+				job.finished = time.time()
+				print(f"{job.kind} {job.target}: {job.state}")
+
+		running = len([job for job in self.queue if job.state == "Running"])
+		for job in self.queue:
+			if running >= self.workers:
+				break
+			if job.state != "Queued" or any(not dep.finished for dep in job.after):
+				continue
+			failed = [dep.target for dep in job.after if dep.state != "Done"]
+			if failed:
+				# Rebuilding would pick up the old data again
+				job.state = f"Skipped ({', '.join(failed)} failed)"
+				job.finished = time.time()
+				print(f"{job.kind} {job.target}: {job.state}")
+				continue
+			job.process = subprocess.Popen(job.command)
+			job.state = "Running"
+			running += 1
+
+		# Keep finished jobs for an hour so the status view shows them
+		self.queue = [job for job in self.queue if not job.finished or time.time() - job.finished < 3600]
+
+	def write_status(self) -> None:
+		"""Writes the queue for `--status`"""
+		write_json(os.path.join(self.folder, "status.json"), {
+			"time": time.time(),
+			"pending": {asset: {"last": last, "layers": layers} for asset, (last, layers) in self.pending.items()},
+			"jobs": [job.to_dict() for job in self.queue],
+		})
+
+	def tick(self) -> None:
+		"""One poll of the database"""
+		for asset, layer, version in self.scan_folders():
+			_, layers = self.pending.get(asset, (0.0, {}))
+			layers[layer] = max(layers.get(layer, 0), version)
+			self.pending[asset] = (time.time(), layers)
+		if self.pending:
+			# Shots might have been saved since, only changed files are read
+			self.index.refresh(self.indexed_files())
+		self.flush_pending()
+		self.run_jobs()
+		self.write_status()
+
+	def run(self, interval: float) -> None:
+		"""Polls until interrupted"""
+		read = self.index.refresh(self.indexed_files())
+		print(f"Indexed {len(self.index.files)} files ({read} read), watching {self.database}")
+		self.scan_folders()
+		while True:
+			self.tick()
+			time.sleep(interval)
+
+def print_status(database: str) -> None:
+	"""Prints the queue written by a running watcher"""
+	path = os.path.join(watcher_folder(database), "status.json")
+	if not os.path.isfile(path):
+		print("The watcher hasn't run yet")
+		return
+	with open(path) as file:
+		status = json.load(file)
+	age = time.time() - status["time"]
+	print(f"Last update {age:.0f}s ago" + (" (the watcher might have stopped)" if age > 60 else ""))
+	for asset, info in status["pending"].items():
+		layers = ", ".join(f"{layer} v{version:03d}" for layer, version in info["layers"].items())
+		print(f"\tWaiting\t{asset} ({layers})")
+	for job in status["jobs"]:
+		after = f", after {', '.join(job['after'])}" if job["after"] and job["state"] == "Queued" else ""
+		print(f"\t{job['state']}\t{job['kind']} {job['target']} ({', '.join(job['assets'])}{after})")
+
+def get_args():
+	"""Gets arguments from the terminal"""
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--database", required=True, help="Database folder holding wip and build")
+	parser.add_argument("--shots", nargs="*", default=[], help="Folders with shot files to keep updated")
+	parser.add_argument("--blender", default="blender", help="Blender executable running the jobs")
+	parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls")
+	parser.add_argument("--debounce", type=float, default=10.0, help="Seconds without publishes before an asset is rebuilt")
+	parser.add_argument("--workers", type=int, default=1, help="Jobs running at once")
+	parser.add_argument("--status", action="store_true", help="Show the queue of a running watcher and exit")
+	return parser.parse_args()
+
+if __name__ == "__main__":
+	args = get_args()
+	if args.status:
+		print_status(args.database)
+		sys.exit(0)
+	watcher = Watcher(args.database, args.shots, args.blender, args.debounce, args.workers)
+	try:
+		watcher.run(args.interval)
+	except KeyboardInterrupt:
+		print("Stopped watching")